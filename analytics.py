@@ -0,0 +1,311 @@
+"""
+流量分析模块 - 按监听群组统计消息速率、媒体类型占比、独立发送者数和最活跃的发送者/关键词
+
+每个群组使用固定大小的概率结构，内存不随发送者和关键词数量增长:
+    - 消息速率: 指数衰减的滑动平均（条/分钟）及峰值
+    - 独立发送者: HyperLogLog（2^HLL_PRECISION 个寄存器，误差约 2%）
+    - 最活跃的发送者、关键词: Count-Min Sketch 估计计数 + 最多 top_k 个候选
+
+统计结果包含在定期统计日志中，也可以随时导出为 JSON: kill -USR2 <pid>
+"""
+import json
+import logging
+import math
+import os
+import re
+import signal
+import time
+from array import array
+from hashlib import blake2b
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# HyperLogLog 寄存器数 = 2^HLL_PRECISION（11 → 2048 字节，标准误差约 2.3%）
+HLL_PRECISION = 11
+# Count-Min Sketch 每行的计数器数和行数（估计值偏高不超过 总数×e/宽度 的概率为 1-e^-行数）
+SKETCH_WIDTH = 1024
+SKETCH_DEPTH = 4
+# 每条消息最多统计的关键词数
+MAX_KEYWORDS_PER_MESSAGE = 30
+
+_WORD_RE = re.compile(r'#?\w+')
+_CJK_RE = re.compile(r'[\u4e00-\u9fff]+')
+
+STOPWORDS = frozenset({
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'any', 'can', 'had', 'her', 'was', 'one',
+    'our', 'out', 'has', 'have', 'his', 'how', 'its', 'let', 'who', 'did', 'get', 'may', 'him', 'she',
+    'this', 'that', 'with', 'from', 'they', 'will', 'what', 'when', 'your', 'been', 'were', 'there',
+    'http', 'https', 'www', 'com',
+})
+# 含有这些字的中文二元组不作为关键词
+CJK_STOP_CHARS = frozenset('的了是在我你他她它们这那就也都和与及或而有没不吗呢吧啊呀哦')
+
+
+def _hash(key) -> int:
+    """64位哈希（整数ID和字符串均可）"""
+    data = key.to_bytes(8, 'little', signed=True) if isinstance(key, int) else key.encode('utf-8')
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+
+def extract_keywords(text: str, limit: int = MAX_KEYWORDS_PER_MESSAGE) -> List[str]:
+    """提取关键词（去重）：英文等按词（至少3个字符，去掉常见虚词和纯数字），中文按相邻两字"""
+    words = {}
+    for token in _WORD_RE.findall(text.lower()):
+        runs = _CJK_RE.findall(token)
+        if runs:
+            for run in runs:
+                for i in range(len(run) - 1):
+                    pair = run[i:i + 2]
+                    if not CJK_STOP_CHARS.intersection(pair):
+                        words[pair] = None
+        elif len(token.lstrip('#')) >= 3 and not token.isdigit() and token not in STOPWORDS:
+            words[token] = None
+        if len(words) >= limit:
+            break
+    return list(words)[:limit]
+
+
+class HyperLogLog:
+    """基数估计（独立元素个数）"""
+
+    __slots__ = ('p', 'registers')
+
+    def __init__(self, p: int = HLL_PRECISION):
+        self.p = p
+        self.registers = bytearray(1 << p)
+
+    def add(self, key):
+        h = _hash(key)
+        index = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog'):
+        """合并另一个相同精度的 HyperLogLog（结果为两者并集的估计）"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        registers = self.registers
+        z = sum(registers.count(rank) * 2.0 ** -rank for rank in range(max(registers) + 1))
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / z
+        zeros = registers.count(0)
+        # 基数较小时改用线性计数，误差更小
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """计数估计（只会偏高，不会偏低）"""
+
+    __slots__ = ('width', 'rows')
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.width = width
+        self.rows = [array('I', bytes(4 * width)) for _ in range(depth)]
+
+    def _indexes(self, h: int):
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + i * h2) % self.width for i in range(len(self.rows))]
+
+    def add(self, key) -> int:
+        """计数加一，返回新的估计值"""
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(_hash(key))):
+            row[index] += 1
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        return estimate
+
+    def estimate(self, key) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(_hash(key))))
+
+
+class TopK:
+    """最频繁的 k 个元素：Count-Min Sketch 估计所有元素的计数，只保留估计值最大的 k 个候选"""
+
+    __slots__ = ('k', 'sketch', 'items', 'labels', '_floor')
+
+    def __init__(self, k: int):
+        self.k = k
+        self.sketch = CountMinSketch()
+        self.items: Dict[object, int] = {}
+        # 候选的显示名称（如发送者名称），随候选一起淘汰
+        self.labels: Dict[object, str] = {}
+        # 候选中的最小计数（可能偏小，只用于跳过明显进不了前 k 的元素）
+        self._floor = 0
+
+    def add(self, key, label: Optional[str] = None):
+        count = self.sketch.add(key)
+        items = self.items
+        if key not in items and len(items) >= self.k:
+            if count <= self._floor:
+                return
+            victim = min(items, key=items.get)
+            self._floor = items[victim]
+            if count <= self._floor:
+                return
+            del items[victim]
+            self.labels.pop(victim, None)
+        items[key] = count
+        if label is not None:
+            self.labels[key] = label
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[object, str, int]]:
+        """按计数从大到小返回 (键, 显示名称, 估计计数)"""
+        ranked = sorted(self.items.items(), key=lambda item: item[1], reverse=True)[:n or self.k]
+        return [(key, self.labels.get(key, str(key)), count) for key, count in ranked]
+
+
+class RateMeter:
+    """指数衰减的消息速率（时间常数 window 秒）"""
+
+    __slots__ = ('window', 'rate', 'updated', 'peak')
+
+    def __init__(self, window: float):
+        self.window = window
+        self.rate = 0.0
+        self.updated = 0.0
+        self.peak = 0.0
+
+    def add(self, now: float):
+        self.rate = self.current(now) + 1.0 / self.window
+        self.updated = now
+        self.peak = max(self.peak, self.rate)
+
+    def current(self, now: float) -> float:
+        """当前速率（条/秒）"""
+        return self.rate * math.exp(-(now - self.updated) / self.window) if self.rate else 0.0
+
+
+class GroupTraffic:
+    """单个群组的流量统计"""
+
+    __slots__ = ('chat_id', 'title', 'messages', 'media', 'rate', 'senders', 'top_senders', 'keywords')
+
+    def __init__(self, chat_id: int, title: str, top_k: int, rate_window: float):
+        self.chat_id = chat_id
+        self.title = title
+        self.messages = 0
+        # 媒体类型 -> 消息数（纯文本记为 text）
+        self.media: Dict[str, int] = {}
+        self.rate = RateMeter(rate_window)
+        self.senders = HyperLogLog()
+        self.top_senders = TopK(top_k)
+        self.keywords = TopK(top_k)
+
+    def add(self, record, now: float):
+        self.title = record.chat_title
+        self.messages += 1
+        kind = record.media_kind or 'text'
+        self.media[kind] = self.media.get(kind, 0) + 1
+        self.rate.add(now)
+        if record.sender_id is not None:
+            self.senders.add(record.sender_id)
+            self.top_senders.add(record.sender_id, record.sender_name)
+        if record.text:
+            for word in extract_keywords(record.text):
+                self.keywords.add(word)
+
+    def snapshot(self, now: float) -> Dict:
+        return {
+            'chat_id': self.chat_id,
+            'title': self.title,
+            'messages': self.messages,
+            'rate_per_min': round(self.rate.current(now) * 60, 2),
+            'peak_per_min': round(self.rate.peak * 60, 2),
+            'unique_senders': self.senders.count(),
+            'media_mix': dict(sorted(self.media.items(), key=lambda item: item[1], reverse=True)),
+            'top_senders': [{'id': key, 'name': name, 'messages': count}
+                            for key, name, count in self.top_senders.top()],
+            'keywords': [{'keyword': key, 'count': count} for key, _, count in self.keywords.top()],
+        }
+
+
+class TrafficAnalytics:
+    """所有监听群组的流量统计"""
+
+    def __init__(self, top_k: int = 10, rate_window: float = 300, dump_file: str = 'analytics.json'):
+        """
+        top_k: 每个群组保留的活跃发送者/关键词个数
+        rate_window: 消息速率的平滑时间常数(秒)
+        dump_file: 导出统计结果的 JSON 文件
+        """
+        self.top_k = top_k
+        self.rate_window = rate_window
+        self.dump_file = dump_file
+        self.groups: Dict[int, GroupTraffic] = {}
+        self.started = time.time()
+
+    def observe(self, record):
+        """统计一条消息（过滤之前，包含所有收到的消息）"""
+        group = self.groups.get(record.chat_id)
+        if group is None:
+            group = self.groups[record.chat_id] = GroupTraffic(
+                record.chat_id, record.chat_title, self.top_k, self.rate_window)
+        group.add(record, time.monotonic())
+
+    def install(self, loop):
+        """注册 SIGUSR2 信号，收到时导出统计结果"""
+        dump_signal = getattr(signal, 'SIGUSR2', None)
+        if dump_signal is None:
+            return
+        try:
+            loop.add_signal_handler(dump_signal, self.dump)
+            logger.info(f"📈 流量分析已启用: kill -USR2 {os.getpid()} 导出到 {self.dump_file}")
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def unique_senders(self) -> int:
+        """所有群组合计的独立发送者数"""
+        merged = HyperLogLog()
+        for group in self.groups.values():
+            merged.merge(group.senders)
+        return merged.count()
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        groups = sorted(self.groups.values(), key=lambda g: g.messages, reverse=True)
+        return {
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started)),
+            'messages': sum(group.messages for group in groups),
+            'unique_senders': self.unique_senders(),
+            'groups': [group.snapshot(now) for group in groups],
+        }
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """导出统计结果为 JSON 文件，返回文件路径"""
+        path = path or self.dump_file
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.error(f"❌ 导出流量分析失败: {e}")
+            return None
+        logger.info(f"📈 流量分析已导出: {path} ({len(self.groups)} 个群组)")
+        return path
+
+    def format_stats(self, groups: int = 3) -> str:
+        """格式化流量统计（按当前速率列出最活跃的几个群组），用于定期日志"""
+        now = time.monotonic()
+        active = sorted(self.groups.values(), key=lambda g: g.rate.current(now), reverse=True)[:groups]
+        parts = []
+        for group in active:
+            media = ', '.join(f"{kind} {count * 100 // group.messages}%"
+                              for kind, count in sorted(group.media.items(), key=lambda item: item[1],
+                                                        reverse=True)[:3])
+            senders = '/'.join(name for _, name, _ in group.top_senders.top(2))
+            keywords = '/'.join(key for key, _, _ in group.keywords.top(3))
+            parts.append(f"{group.title} {group.rate.current(now) * 60:.1f}条/分 "
+                         f"(发送者≈{group.senders.count()}, {media}"
+                         + (f", 最活跃 {senders}" if senders else "")
+                         + (f", 关键词 {keywords}" if keywords else "") + ")")
+        return (f"📈 群组流量: {len(self.groups)} 个群组, "
+                f"{sum(group.messages for group in self.groups.values())} 条, "
+                f"独立发送者≈{self.unique_senders()}"
+                + ("; " + "; ".join(parts) if parts else ""))
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+消息归档模块 - 将处理过的每条消息（群组、发送者、时间、文本、媒体信息、转发状态）
+记录到 SQLite，并用 FTS5 建立全文索引
+
+转发流程只把记录放入内存队列，由后台线程按批在单个事务中写入，热路径不等待磁盘。
+直接运行本文件即为查询工具:
+    python archive.py search 关键词 --chat -1001234567890 --since 2025-10-01
+    python archive.py stats
+"""
+import argparse
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 转发状态
+FORWARDED = 'forwarded'
+FILTERED = 'filtered'
+DIGESTED = 'digested'
+SHED = 'shed'
+FAILED = 'failed'
+
+# trigram 分词支持中文等无空格文字的子串检索（SQLite 3.34+），否则按词分词
+TOKENIZER = 'trigram' if sqlite3.sqlite_version_info >= (3, 34, 0) else 'unicode61'
+
+COLUMNS = ('chat_id', 'message_id', 'chat_title', 'sender_id', 'sender_name', 'date',
+           'text', 'media', 'file_name', 'file_size', 'status', 'mode')
+
+# 一条归档记录，字段顺序与 COLUMNS 一致
+ArchiveRow = Tuple
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    chat_title TEXT,
+    sender_id INTEGER,
+    sender_name TEXT,
+    date REAL NOT NULL,
+    text TEXT,
+    media TEXT,
+    file_name TEXT,
+    file_size INTEGER,
+    status TEXT NOT NULL,
+    mode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(date);
+CREATE INDEX IF NOT EXISTS idx_messages_chat_date ON messages(chat_id, date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, sender_name, chat_title, file_name,
+    content='messages', content_rowid='id', tokenize='{TOKENIZER}'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, text, sender_name, chat_title, file_name)
+    VALUES (new.id, new.text, new.sender_name, new.chat_title, new.file_name);
+END;
+"""
+
+INSERT_SQL = f"INSERT INTO messages ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+_STOP = object()
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """打开归档数据库（WAL 模式，写入时读取不受阻塞）并确保表结构存在"""
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+class MessageArchive:
+    """后台线程批量写入的消息归档"""
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0,
+                 max_queue_size: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+
+        self.rows_written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.write_time = 0.0
+        self.errors = 0
+
+        # 在主线程中建表，数据库路径有误时启动即报错
+        connect(path).close()
+        self._thread = threading.Thread(target=self._run, name='message-archive', daemon=True)
+        self._thread.start()
+        logger.info(f"🗄️ 消息归档已启用: {path} (分词: {TOKENIZER})")
+
+    def add(self, row: ArchiveRow):
+        """放入写入队列（不阻塞）；队列已满时丢弃并计数"""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                first = self._queue.get()
+                if first is _STOP:
+                    break
+                batch = [first]
+                stop = self._collect(batch)
+                self._write(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _collect(self, batch: List) -> bool:
+        """收集一批记录：直到达到批量大小或距第一条记录超过刷盘间隔。返回是否收到停止信号"""
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    def _write(self, conn: sqlite3.Connection, batch: List[ArchiveRow]):
+        started = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany(INSERT_SQL, batch)
+            self.rows_written += len(batch)
+            self.batches += 1
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.error(f"❌ 写入归档失败 ({len(batch)} 条): {e}")
+        self.write_time += time.perf_counter() - started
+
+    def close(self):
+        """写入队列中剩余的记录并停止后台线程"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def format_stats(self) -> str:
+        """格式化归档统计，用于定期日志"""
+        average = self.write_time / self.batches * 1000 if self.batches else 0.0
+        return (f"🗄️ 消息归档: 已写入 {self.rows_written} 条 ({self.batches} 批, 平均每批 {average:.1f}ms), "
+                f"队列 {self._queue.qsize()}"
+                + (f", 丢弃 {self.dropped}" if self.dropped else "")
+                + (f", 失败 {self.errors}" if self.errors else ""))
+
+
+def build_match(terms: Sequence[str]) -> Optional[str]:
+    """将查询词转为 FTS5 MATCH 表达式（每个词作为短语，多个词之间为 AND）"""
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms if term]
+    return ' AND '.join(phrases) if phrases else None
+
+
+def parse_date(value: str) -> float:
+    """解析 YYYY-MM-DD 或 YYYY-MM-DD HH:MM 为时间戳"""
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError(f"无法解析日期: {value}")
+
+
+def search(conn: sqlite3.Connection, terms: Sequence[str], chat_id: Optional[int] = None,
+           since: Optional[float] = None, until: Optional[float] = None,
+           status: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+    """按关键词、群组、时间范围和状态查询，按时间倒序返回"""
+    conditions, params = [], []
+    short_terms = [term for term in terms if TOKENIZER == 'trigram' and len(term) < 3]
+    match = build_match([term for term in terms if term not in short_terms])
+
+    if match:
+        source = "messages_fts JOIN messages m ON m.id = messages_fts.rowid"
+        conditions.append("messages_fts MATCH ?")
+        params.append(match)
+    else:
+        source = "messages m"
+    # trigram 分词无法检索少于3个字符的词，改用子串匹配（在其他条件筛选后的结果上进行）
+    for term in short_terms:
+        conditions.append("(m.text LIKE ? OR m.sender_name LIKE ? OR m.file_name LIKE ?)")
+        params.extend([f"%{term}%"] * 3)
+    if chat_id is not None:
+        conditions.append("m.chat_id = ?")
+        params.append(chat_id)
+    if since is not None:
+        conditions.append("m.date >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("m.date < ?")
+        params.append(until)
+    if status:
+        conditions.append("m.status = ?")
+        params.append(status)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    sql = f"SELECT m.* FROM {source} {where} ORDER BY m.date DESC LIMIT ?"
+    conn.row_factory = sqlite3.Row
+    return conn.execute(sql, params + [limit]).fetchall()
+
+
+def format_row(row: sqlite3.Row, width: int = 100) -> str:
+    when = datetime.fromtimestamp(row['date']).strftime('%Y-%m-%d %H:%M:%S')
+    text = ' '.join((row['text'] or '').split())
+    if len(text) > width:
+        text = text[:width - 1] + '…'
+    media = f"[{row['media']}{' ' + row['file_name'] if row['file_name'] else ''}] " if row['media'] else ''
+    status = row['status'] + (f"/{row['mode']}" if row['mode'] else '')
+    return (f"{when}  [{row['chat_title'] or row['chat_id']}] {row['sender_name'] or ''} "
+            f"#{row['message_id']} ({status})\n    {media}{text}")
+
+
+def print_stats(conn: sqlite3.Connection):
+    total, first, last = conn.execute("SELECT COUNT(*), MIN(date), MAX(date) FROM messages").fetchone()
+    print(f"📦 归档消息: {total} 条")
+    if not total:
+        return
+    fmt = '%Y-%m-%d %H:%M'
+    print(f"   时间范围: {datetime.fromtimestamp(first).strftime(fmt)} ~ {datetime.fromtimestamp(last).strftime(fmt)}")
+    print("   转发状态: " + ", ".join(
+        f"{status} {count}" for status, count in
+        conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status ORDER BY 2 DESC")))
+    print("   消息最多的群组:")
+    for chat_id, title, count in conn.execute(
+            "SELECT chat_id, MAX(chat_title), COUNT(*) FROM messages GROUP BY chat_id ORDER BY 3 DESC LIMIT 10"):
+        print(f"     {title or chat_id} ({chat_id}): {count}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='查询本地消息归档')
+    parser.add_argument('--db', default=None, help='归档数据库 (默认: ARCHIVE_FILE 配置)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search_parser = commands.add_parser('search', help='全文检索')
+    search_parser.add_argument('terms', nargs='*', help='关键词（多个词同时匹配），可省略只按条件筛选')
+    search_parser.add_argument('--chat', type=int, help='群组ID')
+    search_parser.add_argument('--since', type=parse_date, help='起始日期 YYYY-MM-DD[ HH:MM]')
+    search_parser.add_argument('--until', type=parse_date, help='截止日期 YYYY-MM-DD[ HH:MM]')
+    search_parser.add_argument('--status', choices=(FORWARDED, FILTERED, DIGESTED, SHED, FAILED), help='转发状态')
+    search_parser.add_argument('--limit', type=int, default=20, help='最多返回条数 (默认: 20)')
+
+    commands.add_parser('stats', help='归档统计')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """查询工具主函数"""
+    args = parse_args(argv)
+    path = args.db
+    if path is None:
+        from config import Config
+        path = Config.ARCHIVE_FILE
+    if not os.path.exists(path):
+        print(f"❌ 归档数据库不存在: {path}")
+        sys.exit(1)
+
+    conn = sqlite3.connect(path)
+    if args.command == 'stats':
+        print_stats(conn)
+        return
+
+    started = time.perf_counter()
+    rows = search(conn, args.terms, args.chat, args.since, args.until, args.status, args.limit)
+    elapsed = (time.perf_counter() - started) * 1000
+    for row in rows:
+        print(format_row(row))
+    print(f"\n🔍 {len(rows)} 条结果 ({elapsed:.1f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+事件循环对比压测
+在独立子进程中用 replay.py 以不同的事件循环实现回放同一份消息日志，
+多轮取中位数，对比转发流程的吞吐量(条/秒)和 p50/p99 送达延迟
+
+用法:
+    python bench_event_loop.py                              # 生成合成日志，对比所有可用的事件循环
+    python bench_event_loop.py updates_record.jsonl.gz --rounds 5
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from event_loop import available_loops
+
+REPLAY_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replay.py')
+
+# 合成日志中的媒体类型及占比
+SYNTHETIC_MEDIA = (('photo', 0.15), ('document', 0.05), ('sticker', 0.05))
+
+
+def write_synthetic_log(path: str, messages: int, groups: int, rate: float, seed: int = 1):
+    """生成与 update_log 录制格式一致的合成日志（文本为主，夹杂小尺寸媒体）"""
+    rng = random.Random(seed)
+    started = time.time()
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for i in range(messages):
+            chat_index = rng.randrange(groups)
+            record = {
+                't': started + i / rate,
+                'c': -1001000000000 - chat_index,
+                'ct': f'Bench Group {chat_index}',
+                'i': i + 1,
+                's': 1000 + rng.randrange(200),
+                'sf': f'User{rng.randrange(200)}',
+                'm': ' '.join(rng.choice(('hello', 'world', 'price', 'update', 'news', '测试', '消息'))
+                              for _ in range(rng.randint(3, 60))),
+            }
+            roll = rng.random()
+            for kind, share in SYNTHETIC_MEDIA:
+                if roll < share:
+                    record['md'] = kind
+                    record['sz'] = rng.randint(20_000, 300_000)
+                    break
+                roll -= share
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def run_once(log: str, loop: str, args, workdir: str) -> Dict:
+    """在子进程中回放一次，返回 replay.py 输出的统计结果"""
+    command = [
+        sys.executable, REPLAY_SCRIPT, log,
+        '--loop', loop, '--json', '--quiet',
+        '--speed', str(args.speed),
+        '--api-latency', str(args.api_latency),
+        '--bandwidth', '0',
+        '--forward-delay', '0',
+    ]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(REPLAY_SCRIPT), env.get('PYTHONPATH')]))
+    # 子进程在临时目录运行，日志和会话文件不写入项目目录
+    completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{loop} 回放失败:\n{completed.stderr.strip()}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(results: List[Dict]) -> Dict:
+    return {
+        'loop': results[0]['loop'],
+        'throughput': statistics.median(r['throughput'] for r in results),
+        'best': max(r['throughput'] for r in results),
+        'latency_p50': statistics.median(r['latency_p50'] for r in results),
+        'latency_p99': statistics.median(r['latency_p99'] for r in results),
+    }
+
+
+def print_table(rows: List[Dict]):
+    print(f"\n{'事件循环':<10}{'吞吐量(条/秒)':>16}{'最佳':>12}{'p50(ms)':>12}{'p99(ms)':>12}")
+    baseline = rows[0]['throughput']
+    for row in rows:
+        ratio = f" ({row['throughput'] / baseline:.2f}×)" if baseline else ''
+        print(f"{row['loop']:<14}{row['throughput']:>14.1f}{row['best']:>12.1f}"
+              f"{row['latency_p50'] * 1000:>12.1f}{row['latency_p99'] * 1000:>12.1f}{ratio}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='对比不同事件循环下转发流程的吞吐量和延迟')
+    parser.add_argument('log', nargs='?', help='录制日志文件，省略时生成合成日志')
+    parser.add_argument('--loops', default=','.join(available_loops()),
+                        help='参与对比的事件循环，逗号分隔 (默认: 所有可用的)')
+    parser.add_argument('--rounds', type=int, default=3, help='每种事件循环回放的轮数 (默认: 3)')
+    parser.add_argument('--speed', type=float, default=0, help='回放速度倍数，0=最大速度 (默认: 0)')
+    parser.add_argument('--api-latency', type=float, default=5, help='模拟的API调用延迟(毫秒，默认: 5)')
+    parser.add_argument('--messages', type=int, default=5000, help='合成日志的消息数 (默认: 5000)')
+    parser.add_argument('--groups', type=int, default=20, help='合成日志的群组数 (默认: 20)')
+    parser.add_argument('--rate', type=float, default=500, help='合成日志的消息速率(条/秒，默认: 500)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+    loops = [name.strip() for name in args.loops.split(',') if name.strip()]
+    missing = [name for name in loops if name not in available_loops()]
+    if missing:
+        print(f"⚠️ 跳过不可用的事件循环: {', '.join(missing)}")
+        loops = [name for name in loops if name not in missing]
+
+    with tempfile.TemporaryDirectory(prefix='bench_loop_') as workdir:
+        log = args.log and os.path.abspath(args.log)
+        if not log:
+            log = os.path.join(workdir, 'synthetic.jsonl.gz')
+            write_synthetic_log(log, args.messages, args.groups, args.rate)
+            print(f"🧪 已生成合成日志: {args.messages} 条消息，{args.groups} 个群组")
+
+        results: Dict[str, List[Dict]] = {name: [] for name in loops}
+        for round_index in range(args.rounds):
+            # 每轮轮换顺序，减少预热和系统负载变化带来的偏差
+            order = loops[round_index % len(loops):] + loops[:round_index % len(loops)]
+            for name in order:
+                result = run_once(log, name, args, workdir)
+                results[name].append(result)
+                print(f"   第{round_index + 1}轮 {name}: {result['throughput']:.1f} 条/秒, "
+                      f"p99 {result['latency_p99'] * 1000:.1f} ms")
+
+    print_table([summarize(results[name]) for name in loops])
+
+
+if __name__ == "__main__":
+    main()
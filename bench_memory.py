@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+消息内存占用压测
+生成合成的群组消息更新（文本、带链接的文本、图片、文件按比例混合），按 Telethon
+收到更新时的方式反序列化并构造 NewMessage 事件，用 tracemalloc 对比排队时
+持有完整事件与只持有 MessageRecord 时每条消息的内存占用
+
+用法:
+    python bench_memory.py
+    python bench_memory.py --messages 20000 --users 500
+"""
+import argparse
+import asyncio
+import gc
+import random
+import tracemalloc
+from datetime import datetime, timezone
+
+from telethon import TelegramClient, events, utils
+from telethon.extensions import BinaryReader
+from telethon.sessions import MemorySession
+from telethon.tl import types
+
+from records import MessageRecord
+
+# 合成消息的类型及占比
+MESSAGE_MIX = (('text', 0.6), ('link', 0.15), ('photo', 0.15), ('document', 0.1))
+
+WORDS = ('hello', 'world', 'price', 'update', 'news', 'market', 'today', '测试', '消息', '价格', '更新')
+
+
+def random_bytes(rng: random.Random, n: int) -> bytes:
+    """n 个随机字节（random.Random.randbytes 需要 Python 3.9）"""
+    return rng.getrandbits(8 * n).to_bytes(n, 'little')
+
+
+def make_user(rng: random.Random, user_id: int) -> types.User:
+    """群组成员（带头像和在线状态，与 Telegram 下发的用户对象结构一致）"""
+    return types.User(
+        id=user_id,
+        access_hash=rng.getrandbits(63),
+        first_name=f'User{user_id}',
+        last_name=rng.choice([None, 'Smith', '王']),
+        username=f'user_{user_id}' if rng.random() < 0.7 else None,
+        photo=types.UserProfilePhoto(
+            photo_id=rng.getrandbits(63), dc_id=rng.randint(1, 5),
+            stripped_thumb=random_bytes(rng, rng.randint(80, 200))
+        ),
+        status=types.UserStatusRecently(),
+        lang_code='en',
+    )
+
+
+def make_channel(rng: random.Random, channel_id: int) -> types.Channel:
+    """超级群组"""
+    return types.Channel(
+        id=channel_id,
+        title=f'Bench Group {channel_id}',
+        photo=types.ChatPhoto(photo_id=rng.getrandbits(63), dc_id=rng.randint(1, 5),
+                              stripped_thumb=random_bytes(rng, 150)),
+        date=datetime.now(timezone.utc),
+        megagroup=True,
+        access_hash=rng.getrandbits(63),
+        username=f'bench_group_{channel_id}',
+        default_banned_rights=types.ChatBannedRights(until_date=None, send_media=False),
+        participants_count=rng.randint(1000, 50000),
+    )
+
+
+def make_media(rng: random.Random, kind: str):
+    now = datetime.now(timezone.utc)
+    if kind == 'photo':
+        photo = types.Photo(
+            id=rng.getrandbits(63), access_hash=rng.getrandbits(63), file_reference=random_bytes(rng, 30),
+            date=now, dc_id=rng.randint(1, 5),
+            sizes=[
+                types.PhotoStrippedSize(type='i', bytes=random_bytes(rng, rng.randint(300, 900))),
+                types.PhotoSize(type='m', w=320, h=240, size=rng.randint(10_000, 30_000)),
+                types.PhotoSize(type='x', w=800, h=600, size=rng.randint(40_000, 90_000)),
+                types.PhotoSizeProgressive(type='y', w=1280, h=960,
+                                           sizes=sorted(rng.randint(10_000, 300_000) for _ in range(5))),
+            ],
+        )
+        return types.MessageMediaPhoto(photo=photo)
+
+    document = types.Document(
+        id=rng.getrandbits(63), access_hash=rng.getrandbits(63), file_reference=random_bytes(rng, 30),
+        date=now, mime_type='application/pdf', size=rng.randint(50_000, 5_000_000), dc_id=rng.randint(1, 5),
+        attributes=[types.DocumentAttributeFilename(file_name=f'report_{rng.randrange(1000)}.pdf')],
+        thumbs=[types.PhotoStrippedSize(type='i', bytes=random_bytes(rng, 400)),
+                types.PhotoSize(type='m', w=320, h=320, size=12_000)],
+    )
+    return types.MessageMediaDocument(document=document)
+
+
+def make_update(rng: random.Random, message_id: int, users, channel) -> bytes:
+    """一条群组新消息的原始更新（序列化后的字节，与网络上收到的一致）"""
+    user = rng.choice(users)
+    roll, kind = rng.random(), 'text'
+    for name, share in MESSAGE_MIX:
+        if roll < share:
+            kind = name
+            break
+        roll -= share
+
+    text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(5, 60)))
+    entities = [types.MessageEntityBold(offset=0, length=5)]
+    media = None
+    if kind == 'link':
+        text += ' https://example.com/article'
+        entities.append(types.MessageEntityUrl(offset=len(text) - 27, length=27))
+        media = types.MessageMediaWebPage(webpage=types.WebPage(
+            id=rng.getrandbits(63), url='https://example.com/article', display_url='example.com/article',
+            hash=0, type='article', site_name='Example', title='Example article',
+            description=' '.join(rng.choice(WORDS) for _ in range(40)),
+        ))
+    elif kind in ('photo', 'document'):
+        media = make_media(rng, kind)
+        if rng.random() < 0.5:
+            text, entities = '', None
+
+    message = types.Message(
+        id=message_id,
+        peer_id=types.PeerChannel(channel.id),
+        date=datetime.now(timezone.utc),
+        message=text,
+        from_id=types.PeerUser(user.id),
+        reply_to=types.MessageReplyHeader(reply_to_msg_id=message_id - 1) if rng.random() < 0.3 else None,
+        media=media,
+        entities=entities,
+        grouped_id=None,
+    )
+    update = types.Updates(
+        updates=[types.UpdateNewChannelMessage(message=message, pts=message_id, pts_count=1)],
+        users=[user],
+        chats=[channel],
+        date=datetime.now(timezone.utc),
+        seq=0,
+    )
+    return bytes(update)
+
+
+def build_event(client: TelegramClient, data: bytes):
+    """与 Telethon 分发更新时相同：反序列化、附带实体表、关联客户端"""
+    updates = BinaryReader(data).tgread_object()
+    entities = {utils.get_peer_id(x): x for x in updates.users + updates.chats}
+    event = events.NewMessage.build(updates.updates[0])
+    event._entities = entities
+    event._set_client(client)
+    return event
+
+
+def measure(build) -> int:
+    """构造对象并保持引用，返回新增的内存(字节)"""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    held = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    del held
+    return size
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='对比排队消息持有完整事件与 MessageRecord 的内存占用')
+    parser.add_argument('--messages', type=int, default=10000, help='消息数 (默认: 10000)')
+    parser.add_argument('--users', type=int, default=200, help='发送者数 (默认: 200)')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子 (默认: 1)')
+    return parser.parse_args(argv)
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    client = TelegramClient(MemorySession(), 1, 'bench')
+    channel = make_channel(rng, 1000000001)
+    users = [make_user(rng, 5000 + i) for i in range(args.users)]
+    raw = [make_update(rng, i + 1, users, channel) for i in range(args.messages)]
+    print(f"🧪 已生成 {args.messages} 条消息更新（原始大小平均 {sum(map(len, raw)) / len(raw):.0f} 字节）")
+
+    tracemalloc.start()
+
+    def hold_events():
+        return [build_event(client, data) for data in raw]
+
+    def hold_records():
+        records = []
+        for data in raw:
+            event = build_event(client, data)
+            message = event.message
+            records.append(MessageRecord.from_message(message, event.chat_id, message.sender, message.chat))
+        return records
+
+    event_bytes = measure(hold_events)
+    record_bytes = measure(hold_records)
+    tracemalloc.stop()
+
+    count = args.messages
+    print(f"\n{'持有对象':<16}{'总计(MB)':>12}{'每条(字节)':>14}")
+    print(f"{'NewMessage 事件':<14}{event_bytes / 1024 / 1024:>14.2f}{event_bytes / count:>14.0f}")
+    print(f"{'MessageRecord':<16}{record_bytes / 1024 / 1024:>12.2f}{record_bytes / count:>14.0f}")
+    print(f"\n📉 每条排队消息的内存减少到 1/{event_bytes / record_bytes:.1f}")
+
+
+def main(argv=None):
+    """主函数"""
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
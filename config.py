@@ -2,15 +2,47 @@
 配置文件加载模块
 """
 import os
-from dotenv import load_dotenv
+import importlib.util
+from dotenv import load_dotenv, find_dotenv, dotenv_values
 import logging
 
+def env_file_keys(path: str) -> set:
+    """.env 文件中设置了值的变量名"""
+    if not path:
+        return set()
+    return {key for key, value in dotenv_values(path).items() if value is not None}
+
+# 加载 .env 之前的环境变量（热加载时 .env 中删除的项恢复为这里的值，没有则删除）
+_BASE_ENV = dict(os.environ)
+
 # 加载环境变量
-load_dotenv()
+ENV_FILE = find_dotenv()
+load_dotenv(ENV_FILE)
+_ENV_FILE_KEYS = env_file_keys(ENV_FILE)
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+def parse_group_map(value: str, cast=str, default=None) -> dict:
+    """解析按群组配置的值，格式: 群组ID或@用户名:值,群组ID:值
+    
+    未写值的群组使用 default（default 为None时忽略该项）
+    """
+    result = {}
+    for item in value.split(','):
+        if ':' not in item:
+            if default is not None and item.strip():
+                key = item.strip()
+                result[key.lower() if key.startswith('@') else key] = default
+            continue
+        key, raw = item.rsplit(':', 1)
+        key = key.strip()
+        if key.startswith('@'):
+            key = key.lower()
+        if key and raw.strip():
+            result[key] = cast(raw.strip())
+    return result
+
 class Config:
     """Telegram API配置"""
     
@@ -36,6 +68,8 @@ class Config:
     # 监听群组配置
     groups_str = os.getenv('MONITOR_GROUPS', '')
     MONITOR_GROUPS = [g.strip() for g in groups_str.split(',') if g.strip()]
+    # 配置中的原始写法（MONITOR_GROUPS 在验证群组后替换为实际ID，热加载时与原始写法比较）
+    MONITOR_GROUPS_RAW = list(MONITOR_GROUPS)
     
     # 转发过滤配置
     FORWARD_MEDIA = os.getenv('FORWARD_MEDIA', 'true').lower() == 'true'
@@ -47,6 +81,15 @@ class Config:
     # 转发模式配置 - 简化版
     DOWNLOAD_AND_RESEND = os.getenv('DOWNLOAD_AND_RESEND', 'false').lower() == 'true'
     MAX_DOWNLOAD_SIZE = int(os.getenv('MAX_DOWNLOAD_SIZE', '20'))  # MB
+    # 下载重发流水线：获取信息/下载/上传/发送分阶段并行，按顺序送达
+    RESEND_PIPELINE = os.getenv('RESEND_PIPELINE', 'false').lower() == 'true'
+    PIPELINE_BUFFER_SIZE = int(os.getenv('PIPELINE_BUFFER_SIZE', '4'))
+    
+    # 自适应转发：按实测开销逐条选择 直接转发 / 引用重发 / 下载重发（启用时忽略 DOWNLOAD_AND_RESEND）
+    ADAPTIVE_FORWARD = os.getenv('ADAPTIVE_FORWARD', 'false').lower() == 'true'
+    RESEND_TIMEOUT = float(os.getenv('RESEND_TIMEOUT', '60'))  # 秒
+    BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '3'))
+    BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', '300'))  # 秒
     
     # 媒体类型转发控制
     FORWARD_PHOTOS = os.getenv('FORWARD_PHOTOS', 'true').lower() == 'true'
@@ -58,13 +101,150 @@ class Config:
     MESSAGE_PREFIX = os.getenv('MESSAGE_PREFIX', '📢 [{chat_title}] {sender_name}:')
     SHOW_MESSAGE_TIME = os.getenv('SHOW_MESSAGE_TIME', 'true').lower() == 'true'
     TIME_FORMAT = os.getenv('TIME_FORMAT', '%Y-%m-%d %H:%M:%S')
+    # 直接转发模式下将前缀合并进消息正文一次发送（false = 先发前缀再转发原消息）
+    MERGE_PREFIX = os.getenv('MERGE_PREFIX', 'true').lower() == 'true'
     
     # 高级配置
     MAX_MESSAGE_LENGTH = int(os.getenv('MAX_MESSAGE_LENGTH', '4000'))
+    MAX_CAPTION_LENGTH = int(os.getenv('MAX_CAPTION_LENGTH', '1024'))
     ENABLE_DEDUPLICATION = os.getenv('ENABLE_DEDUPLICATION', 'true').lower() == 'true'
     DEDUP_WINDOW = int(os.getenv('DEDUP_WINDOW', '60'))
     FORWARD_DELAY = float(os.getenv('FORWARD_DELAY', '1'))
     
+    # 群组公平调度配置（每个群组一个队列，按优先级和权重轮流转发）
+    ENABLE_FAIR_SCHEDULER = os.getenv('ENABLE_FAIR_SCHEDULER', 'false').lower() == 'true'
+    GROUP_WEIGHTS = parse_group_map(os.getenv('GROUP_WEIGHTS', ''), float)
+    GROUP_PRIORITIES = parse_group_map(os.getenv('GROUP_PRIORITIES', ''), int)
+    GROUP_QUEUE_SIZE = int(os.getenv('GROUP_QUEUE_SIZE', '1000'))
+    
+    # 摘要模式配置（这些群组的消息定期合并为一条摘要发送，不逐条转发）
+    DIGEST_INTERVAL = float(os.getenv('DIGEST_INTERVAL', '300'))  # 秒
+    DIGEST_GROUPS = parse_group_map(os.getenv('DIGEST_GROUPS', ''), float, default=DIGEST_INTERVAL)
+    DIGEST_MAX_MESSAGES = int(os.getenv('DIGEST_MAX_MESSAGES', '50'))
+    DIGEST_SNIPPET_LENGTH = int(os.getenv('DIGEST_SNIPPET_LENGTH', '80'))
+    
+    # 更新录制配置（录制监听群组的消息，供 replay.py 回放压测）
+    RECORD_UPDATES = os.getenv('RECORD_UPDATES', 'false').lower() == 'true'
+    RECORD_FILE = os.getenv('RECORD_FILE', 'updates_record.jsonl.gz')
+    RECORD_ANONYMIZE = os.getenv('RECORD_ANONYMIZE', 'false').lower() == 'true'
+    
+    # 负载调节：端到端延迟超过阈值时逐级降级（丢弃贴纸 → 媒体直接转发 → 仅文字 → 仅摘要）
+    ENABLE_LOAD_SHEDDING = os.getenv('ENABLE_LOAD_SHEDDING', 'false').lower() == 'true'
+    SHED_LAG_THRESHOLDS = [float(x) for x in os.getenv('SHED_LAG_THRESHOLDS', '30,60,120,300').split(',') if x.strip()]
+    SHED_RECOVERY_RATIO = float(os.getenv('SHED_RECOVERY_RATIO', '0.5'))
+    SHED_MIN_DWELL = float(os.getenv('SHED_MIN_DWELL', '30'))  # 秒
+    
+    # 消息归档配置（SQLite + FTS5 全文检索，后台批量写入）
+    ENABLE_ARCHIVE = os.getenv('ENABLE_ARCHIVE', 'false').lower() == 'true'
+    ARCHIVE_FILE = os.getenv('ARCHIVE_FILE', 'archive.db')
+    ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '500'))
+    ARCHIVE_FLUSH_INTERVAL = float(os.getenv('ARCHIVE_FLUSH_INTERVAL', '1'))
+    ARCHIVE_QUEUE_SIZE = int(os.getenv('ARCHIVE_QUEUE_SIZE', '10000'))
+    
+    # 媒体DC连接池（下载其他数据中心的文件时复用常驻连接，不反复握手和导出授权）
+    ENABLE_DC_POOL = os.getenv('ENABLE_DC_POOL', 'false').lower() == 'true'
+    DC_POOL_SIZE = int(os.getenv('DC_POOL_SIZE', '2'))  # 每个DC最多保持的连接数
+    DC_POOL_KEEPALIVE = float(os.getenv('DC_POOL_KEEPALIVE', '60'))  # 秒
+    
+    # 输出端（通过过滤的消息以 NDJSON 推送给下游: unix:路径 / file:路径 / http(s)://地址，逗号分隔）
+    OUTPUT_SINKS = [x.strip() for x in os.getenv('OUTPUT_SINKS', '').split(',') if x.strip()]
+    SINK_BATCH_SIZE = int(os.getenv('SINK_BATCH_SIZE', '100'))
+    SINK_FLUSH_INTERVAL = float(os.getenv('SINK_FLUSH_INTERVAL', '1'))  # 秒
+    SINK_QUEUE_SIZE = int(os.getenv('SINK_QUEUE_SIZE', '10000'))
+    SINK_TIMEOUT = float(os.getenv('SINK_TIMEOUT', '10'))  # 秒
+    SINK_FILE_MAX_MB = float(os.getenv('SINK_FILE_MAX_MB', '100'))
+    SINK_FILE_BACKUPS = int(os.getenv('SINK_FILE_BACKUPS', '5'))
+    
+    # 流量分析（按群组统计速率、媒体占比、独立发送者、活跃发送者和关键词，内存固定）
+    ENABLE_ANALYTICS = os.getenv('ENABLE_ANALYTICS', 'false').lower() == 'true'
+    ANALYTICS_TOP_K = int(os.getenv('ANALYTICS_TOP_K', '10'))
+    ANALYTICS_RATE_WINDOW = float(os.getenv('ANALYTICS_RATE_WINDOW', '300'))  # 秒
+    ANALYTICS_DUMP_FILE = os.getenv('ANALYTICS_DUMP_FILE', 'analytics.json')
+    
+    # 启动期间（转发就绪之前）最多缓冲的消息数
+    STARTUP_BUFFER_SIZE = int(os.getenv('STARTUP_BUFFER_SIZE', '1000'))
+    
+    # 诊断配置（慢回调检测、按需剖析、阶段耗时统计）
+    ENABLE_DIAGNOSTICS = os.getenv('ENABLE_DIAGNOSTICS', 'false').lower() == 'true'
+    SLOW_CALLBACK_MS = float(os.getenv('SLOW_CALLBACK_MS', '100'))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile').lower()  # cprofile / sampling
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_DURATION = float(os.getenv('PROFILE_DURATION', '30'))
+    
+    # 会话存储配置
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'sqlite').lower()  # sqlite / buffered
+    SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', '30'))
+    
+    # 事件循环实现：auto / asyncio / uvloop（uvloop 未安装时回退到 asyncio）
+    EVENT_LOOP = os.getenv('EVENT_LOOP', 'auto').lower()
+    
+    # 配置热加载：发送 SIGHUP 或检测到 .env 修改时重新加载（0 = 不监视文件）
+    CONFIG_WATCH_INTERVAL = float(os.getenv('CONFIG_WATCH_INTERVAL', '0'))
+    
+    # 修改后需要重启才能生效的配置项（连接、登录和启动时创建的资源）
+    RESTART_REQUIRED = frozenset({
+        'API_ID', 'API_HASH', 'PHONE_NUMBER', 'SESSION_NAME',
+        'ENABLE_PROXY', 'HTTP_PROXY_HOST', 'HTTP_PROXY_PORT', 'SOCKS_PROXY_HOST', 'SOCKS_PROXY_PORT',
+        'ENABLE_GROUP_FORWARD', 'BOT_TOKEN',
+        'RECORD_UPDATES', 'RECORD_FILE', 'RECORD_ANONYMIZE',
+        'ENABLE_ARCHIVE', 'ARCHIVE_FILE', 'ARCHIVE_BATCH_SIZE', 'ARCHIVE_FLUSH_INTERVAL', 'ARCHIVE_QUEUE_SIZE',
+        'ENABLE_DC_POOL', 'DC_POOL_SIZE', 'DC_POOL_KEEPALIVE',
+        'OUTPUT_SINKS', 'SINK_BATCH_SIZE', 'SINK_FLUSH_INTERVAL', 'SINK_QUEUE_SIZE', 'SINK_TIMEOUT',
+        'SINK_FILE_MAX_MB', 'SINK_FILE_BACKUPS',
+        'ENABLE_ANALYTICS', 'ANALYTICS_TOP_K', 'ANALYTICS_RATE_WINDOW', 'ANALYTICS_DUMP_FILE',
+        'ENABLE_DIAGNOSTICS', 'SLOW_CALLBACK_MS', 'PROFILE_MODE', 'PROFILE_DIR', 'PROFILE_DURATION',
+        'SESSION_BACKEND', 'SESSION_FLUSH_INTERVAL',
+        'CONFIG_WATCH_INTERVAL', 'ENABLE_FAIR_SCHEDULER', 'PIPELINE_BUFFER_SIZE', 'EVENT_LOOP',
+    })
+    
+    @classmethod
+    def reload(cls, validate=None) -> set:
+        """重新读取 .env 和环境变量，原地更新可热加载的配置项，返回发生变化的配置项名称
+        
+        validate(新配置类) 在修改任何配置项之前调用，抛出异常时当前配置保持不变
+        """
+        global _ENV_FILE_KEYS
+        
+        # load_dotenv 只会添加或覆盖，.env 中已删除的项需要先从环境变量中移除
+        keys = env_file_keys(ENV_FILE)
+        for key in _ENV_FILE_KEYS - keys:
+            if key in _BASE_ENV:
+                os.environ[key] = _BASE_ENV[key]
+            else:
+                os.environ.pop(key, None)
+        load_dotenv(ENV_FILE, override=True)
+        _ENV_FILE_KEYS = keys
+        
+        # 在独立的模块对象中重新执行本文件，得到一份新的配置，不影响已导入的 Config
+        spec = importlib.util.spec_from_file_location('_config_reload', __file__)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        fresh = module.Config
+        if validate is not None:
+            validate(fresh)
+        
+        changed = set()
+        for name in vars(fresh):
+            if not name.isupper() or name == 'RESTART_REQUIRED':
+                continue
+            new_value = getattr(fresh, name)
+            if name == 'MONITOR_GROUPS_RAW':
+                continue
+            if name == 'MONITOR_GROUPS':
+                # 只更新原始写法，由接收器解析新增的群组后再替换 MONITOR_GROUPS
+                if cls.MONITOR_GROUPS_RAW != new_value:
+                    cls.MONITOR_GROUPS_RAW = new_value
+                    changed.add(name)
+                continue
+            if getattr(cls, name, None) == new_value:
+                continue
+            if name in cls.RESTART_REQUIRED:
+                logger.warning(f"⚠️ 配置项 {name} 已修改，需要重启才能生效")
+                continue
+            setattr(cls, name, new_value)
+            changed.add(name)
+        return changed
+    
     @classmethod
     def validate(cls):
         """验证配置是否完整"""
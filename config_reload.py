@@ -0,0 +1,69 @@
+"""
+配置热加载模块 - 响应 SIGHUP 或 .env 文件修改，在运行中的事件循环上重新加载配置
+"""
+import asyncio
+import logging
+import os
+import signal
+from typing import Callable, Optional, Set
+
+from config import Config, ENV_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class ConfigReloader:
+    """触发配置重新加载，并将变化的配置项交给回调重建相关结构"""
+
+    def __init__(self, on_change: Callable[[Set[str]], None], validate: Optional[Callable] = None):
+        """
+        on_change: 配置生效后调用，参数为变化的配置项名称
+        validate: 应用新配置之前调用，参数为新配置类；抛出 ValueError 时整体保留当前配置
+        """
+        self.on_change = on_change
+        self.validate = validate
+        self.reload_count = 0
+        self._env_mtime = self._get_mtime()
+
+    @staticmethod
+    def _get_mtime() -> float:
+        try:
+            return os.path.getmtime(ENV_FILE) if ENV_FILE else 0.0
+        except OSError:
+            return 0.0
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """注册 SIGHUP 处理器，并按 CONFIG_WATCH_INTERVAL 启动文件监视"""
+        reload_signal = getattr(signal, 'SIGHUP', None)
+        if reload_signal is not None:
+            try:
+                loop.add_signal_handler(reload_signal, self.reload)
+                logger.info(f"🔄 配置热加载已就绪: kill -HUP {os.getpid()}")
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        if Config.CONFIG_WATCH_INTERVAL > 0 and ENV_FILE:
+            loop.create_task(self._watch_env_file())
+            logger.info(f"🔄 监视配置文件修改: {ENV_FILE} (每 {Config.CONFIG_WATCH_INTERVAL:g} 秒)")
+
+    async def _watch_env_file(self):
+        while True:
+            await asyncio.sleep(Config.CONFIG_WATCH_INTERVAL)
+            mtime = self._get_mtime()
+            if mtime != self._env_mtime:
+                self._env_mtime = mtime
+                self.reload()
+
+    def reload(self):
+        """重新加载配置；在事件循环线程中同步执行，回调中的替换对所有协程是原子的"""
+        try:
+            changed = Config.reload(self.validate)
+            self.reload_count += 1
+            if not changed:
+                logger.info("🔄 配置已重新加载，没有变化")
+                return
+            logger.info(f"🔄 配置已重新加载，变化项: {', '.join(sorted(changed))}")
+            self.on_change(changed)
+        except Exception as e:
+            # 新配置有误时保留当前配置继续运行
+            logger.error(f"❌ 重新加载配置失败，继续使用当前配置: {e}")
@@ -0,0 +1,238 @@
+"""
+媒体DC连接池模块 - 为存放在其他数据中心(DC)的文件维护常驻的导出授权连接
+
+Telethon 下载其他DC的文件时按需创建导出授权连接（每次都要握手、导出并导入授权），
+空闲约一分钟后断开，下一条媒体消息再重新建立。连接池接管客户端的
+_borrow_exported_sender / _return_exported_sender / _clean_exported_senders:
+    - 每个DC最多保持 size 条连接，并发下载时按需扩容，空闲时不断开
+    - 同一DC的第一条连接导出授权后，后续连接复用其授权密钥，不再重复握手和导入授权
+    - 启动时预热监听群组所在的DC
+    - 定期对空闲连接发送 ping，超时或断开的连接自动重建
+"""
+import asyncio
+import copy
+import logging
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+from telethon import errors, functions
+from telethon.crypto import AuthKey
+from telethon.network import MTProtoSender
+from telethon.tl.alltlobjects import LAYER
+
+logger = logging.getLogger(__name__)
+
+# 健康检查 ping 的超时时间(秒)
+PING_TIMEOUT = 10
+
+
+class PooledSender:
+    """连接池中的一条连接"""
+
+    __slots__ = ('sender', 'dc_id', 'borrows', 'last_used', 'created')
+
+    def __init__(self, sender, dc_id: int):
+        self.sender = sender
+        self.dc_id = dc_id
+        self.borrows = 0
+        self.last_used = time.monotonic()
+        self.created = self.last_used
+
+
+class MediaSenderPool:
+    """按DC管理导出授权连接的连接池"""
+
+    def __init__(self, client, size: int = 2, keepalive: float = 60):
+        """
+        client: 用于下载媒体的 TelegramClient
+        size: 每个DC最多保持的连接数
+        keepalive: 空闲连接健康检查的间隔(秒)
+        """
+        self.client = client
+        self.size = max(1, size)
+        self.keepalive = keepalive
+
+        self.senders: Dict[int, List[PooledSender]] = {}
+        # DC -> 已导入授权的密钥（同一DC的新连接直接复用）
+        self._auth_keys: Dict[int, object] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._health_task: Optional[asyncio.Task] = None
+
+        self.borrowed = 0
+        self.reused = 0
+        self.created = 0
+        self.exported = 0
+        self.reconnects = 0
+        self.health_failures = 0
+        self.connect_time = 0.0
+
+    @staticmethod
+    def supported(client) -> bool:
+        """客户端是否为支持导出连接的 Telethon 客户端（回放客户端等不支持）"""
+        return all(hasattr(client, name) for name in
+                   ('_create_exported_sender', '_borrow_exported_sender', '_get_dc', '_connection'))
+
+    def install(self):
+        """接管客户端的导出连接管理，并启动健康检查"""
+        self.client._borrow_exported_sender = self.borrow
+        self.client._return_exported_sender = self.give_back
+        self.client._clean_exported_senders = self.clean
+        self._health_task = asyncio.get_running_loop().create_task(self._health_loop())
+        logger.info(f"🔌 媒体DC连接池已启用 (每个DC最多 {self.size} 条连接, 健康检查间隔 {self.keepalive:.0f}s)")
+
+    async def warm_up(self, dc_ids: Iterable[int]):
+        """为给定DC各建立一条连接（跳过客户端所在的DC）"""
+        home = self.client.session.dc_id
+        targets = sorted({dc_id for dc_id in dc_ids if dc_id and dc_id != home})
+        for dc_id in targets:
+            try:
+                async with self._lock(dc_id):
+                    if not self.senders.get(dc_id):
+                        await self._add_sender(dc_id)
+            except Exception as e:
+                logger.warning(f"⚠️ 预热 DC{dc_id} 连接失败: {e}")
+        if targets:
+            logger.info(f"🔌 已预热媒体DC连接: {', '.join(f'DC{dc_id}' for dc_id in targets)}")
+
+    def _lock(self, dc_id: int) -> asyncio.Lock:
+        lock = self._locks.get(dc_id)
+        if lock is None:
+            lock = self._locks[dc_id] = asyncio.Lock()
+        return lock
+
+    async def borrow(self, dc_id: int):
+        """借出一条连接：优先使用空闲连接，全部忙碌且未满时新建，已满时与借出最少的连接共用"""
+        async with self._lock(dc_id):
+            pool = self.senders.setdefault(dc_id, [])
+            pooled = min(pool, key=lambda p: p.borrows, default=None)
+            if pooled is None or (pooled.borrows and len(pool) < self.size):
+                pooled = await self._add_sender(dc_id)
+            else:
+                self.reused += 1
+                # 其他下载仍在使用的连接不能断开重建（MTProtoSender 会自行重连），只重建空闲的连接
+                if not pooled.borrows and not pooled.sender.is_connected():
+                    await self._reconnect(pooled)
+
+            pooled.borrows += 1
+            pooled.last_used = time.monotonic()
+            self.borrowed += 1
+            return pooled.sender
+
+    async def give_back(self, sender):
+        """归还连接（连接保持打开，留给后续下载）"""
+        for pooled in self.senders.get(getattr(sender, 'dc_id', None), ()):
+            if pooled.sender is sender:
+                pooled.borrows = max(0, pooled.borrows - 1)
+                pooled.last_used = time.monotonic()
+                return
+
+    async def clean(self):
+        """替代 Telethon 的定期清理：池中的连接不因空闲而断开"""
+
+    async def _add_sender(self, dc_id: int) -> PooledSender:
+        pooled = PooledSender(await self._open_sender(dc_id), dc_id)
+        self.senders.setdefault(dc_id, []).append(pooled)
+        self.created += 1
+        return pooled
+
+    async def _open_sender(self, dc_id: int):
+        """建立到 dc_id 的连接；该DC已有导入授权的密钥时直接复用，否则导出授权"""
+        started = time.perf_counter()
+        auth_key = self._auth_keys.get(dc_id)
+        if auth_key is None:
+            sender = await self.client._create_exported_sender(dc_id)
+            self._auth_keys[dc_id] = AuthKey(sender.auth_key.key)
+            self.exported += 1
+        else:
+            # 每条连接使用独立的 AuthKey 对象，一条连接更换密钥不影响其他连接
+            sender = MTProtoSender(AuthKey(auth_key.key), loggers=self.client._log)
+            await sender.connect(await self._connection(dc_id))
+            await self._init_connection(sender)
+        sender.dc_id = dc_id
+        self.connect_time += time.perf_counter() - started
+        return sender
+
+    async def _connection(self, dc_id: int):
+        client = self.client
+        dc = await client._get_dc(dc_id)
+        return client._connection(
+            dc.ip_address,
+            dc.port,
+            dc.id,
+            loggers=client._log,
+            proxy=client._proxy,
+            local_addr=client._local_addr
+        )
+
+    async def _init_connection(self, sender):
+        """新会话的第一个请求需要带上 initConnection（与 Telethon 创建导出连接时一致）"""
+        init = copy.copy(self.client._init_request)
+        init.query = functions.help.GetConfigRequest()
+        await sender.send(functions.InvokeWithLayerRequest(LAYER, init))
+
+    async def _reconnect(self, pooled: PooledSender):
+        """断开并用同一授权密钥重新连接；密钥失效时重新导出授权
+
+        只在连接没有被借出时调用（调用方持有该DC的锁），替换 pooled.sender 不会影响正在进行的下载
+        """
+        await pooled.sender.disconnect()
+        self.reconnects += 1
+        try:
+            await pooled.sender.connect(await self._connection(pooled.dc_id))
+            await self._init_connection(pooled.sender)
+        except errors.AuthKeyUnregisteredError:
+            logger.info(f"🔌 DC{pooled.dc_id} 的导出授权已失效，重新导出")
+            await pooled.sender.disconnect()
+            self._auth_keys.pop(pooled.dc_id, None)
+            pooled.sender = await self._open_sender(pooled.dc_id)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.keepalive)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"❌ 媒体DC连接健康检查出错: {e}")
+
+    async def check_health(self):
+        """对空闲连接发送 ping，无响应或已断开的连接重建"""
+        for dc_id, pool in list(self.senders.items()):
+            for pooled in list(pool):
+                if pooled.borrows:
+                    continue
+                try:
+                    await asyncio.wait_for(
+                        pooled.sender.send(functions.PingRequest(random.getrandbits(63))), PING_TIMEOUT)
+                    continue
+                except Exception as e:
+                    self.health_failures += 1
+                    logger.warning(f"⚠️ DC{dc_id} 连接健康检查失败，重新连接: {str(e) or type(e).__name__}")
+
+                try:
+                    async with self._lock(dc_id):
+                        if not pooled.borrows:
+                            await self._reconnect(pooled)
+                except Exception as e:
+                    logger.error(f"❌ DC{dc_id} 重新连接失败，移出连接池: {e}")
+                    pool.remove(pooled)
+                    await pooled.sender.disconnect()
+
+    async def close(self):
+        """停止健康检查并断开所有连接"""
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        for pool in self.senders.values():
+            for pooled in pool:
+                await pooled.sender.disconnect()
+        self.senders.clear()
+
+    def format_stats(self) -> str:
+        """格式化连接池统计，用于定期日志"""
+        dcs = ", ".join(f"DC{dc_id} {sum(1 for p in pool if p.borrows)}/{len(pool)}"
+                        for dc_id, pool in sorted(self.senders.items()) if pool)
+        average = self.connect_time / self.created * 1000 if self.created else 0.0
+        return (f"🔌 媒体DC连接池: [{dcs or '无连接'}] 借出 {self.borrowed} 次 (复用 {self.reused}), "
+                f"新建 {self.created} 条 (导出授权 {self.exported}, 平均 {average:.0f}ms), "
+                f"重连 {self.reconnects}, 健康检查失败 {self.health_failures}")
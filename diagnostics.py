@@ -0,0 +1,269 @@
+"""
+诊断模块 - 事件循环卡顿检测、按需性能剖析和转发流程各阶段耗时统计
+
+未启用时不安装任何钩子，转发流程不受影响
+"""
+import asyncio
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import re
+import signal
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# asyncio 慢回调日志中的协程名称，例如 coro=<TelegramMessageReceiver.handle_new_message() ...>
+_CORO_NAME_RE = re.compile(r"coro=<(.+?)\(\)")
+# 慢回调日志中的任务名称，例如 <Task pending name='Task-12' coro=<...>>
+_TASK_NAME_RE = re.compile(r"<Task \w+ name='(.+?)'")
+
+# 查找卡顿位置时跳过的库代码（Telethon 的更新分发任务、asyncio 内部）
+_LIBRARY_DIRS = tuple(os.sep + name + os.sep for name in ('asyncio', 'telethon'))
+
+
+class _StageTiming:
+    """单个协程的耗时统计"""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+
+class _SlowCallbackFilter(logging.Filter):
+    """截获 asyncio 调试模式输出的慢回调警告，归类到具体的处理函数后由诊断模块重新输出"""
+
+    def __init__(self, diagnostics: 'Diagnostics'):
+        super().__init__()
+        self.diagnostics = diagnostics
+
+    def filter(self, record):
+        if not (isinstance(record.msg, str) and record.msg.startswith('Executing ')):
+            return True
+        try:
+            handle, duration = record.args
+        except (TypeError, ValueError):
+            return True
+        self.diagnostics.report_slow_callback(str(handle), duration)
+        return False
+
+
+class _SamplingProfiler:
+    """采样剖析器：后台线程定期采集主线程调用栈，输出折叠栈格式（可直接生成火焰图）"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._target_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Diagnostics:
+    """诊断工具集合"""
+
+    def __init__(self, slow_callback_ms: float, profile_dir: str,
+                 profile_mode: str = 'cprofile', profile_duration: float = 30,
+                 sample_interval_ms: float = 5):
+        self.slow_callback_duration = slow_callback_ms / 1000
+        self.profile_dir = profile_dir
+        self.profile_mode = profile_mode
+        self.profile_duration = profile_duration
+        self.sample_interval = sample_interval_ms / 1000
+
+        self.timings: Dict[str, _StageTiming] = defaultdict(_StageTiming)
+        # 各任务当前所在的流程函数（由内到外），以及最近退出的流程函数，用于定位慢回调
+        self._task_stages: 'weakref.WeakKeyDictionary[asyncio.Task, List[str]]' = weakref.WeakKeyDictionary()
+        self._task_last_stage: 'weakref.WeakKeyDictionary[asyncio.Task, str]' = weakref.WeakKeyDictionary()
+        self.slow_callbacks: Counter = Counter()
+        self._profiler = None
+        self._profile_stop_handle: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def instrument(self, obj, names: Iterable[str]):
+        """用计时包装器替换对象上的协程方法，记录每个流程函数的墙钟耗时"""
+        for name in names:
+            method = getattr(obj, name)
+            setattr(obj, name, self._timed(name, method))
+
+    def _timed(self, name: str, method):
+        timing = self.timings[name]
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            task = asyncio.current_task()
+            stages = self._task_stages.setdefault(task, []) if task is not None else []
+            stages.append(name)
+            started = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                timing.add(time.perf_counter() - started)
+                stages.pop()
+                if task is not None:
+                    self._task_last_stage[task] = name
+        return wrapper
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        """在运行中的事件循环上启用慢回调检测和剖析信号"""
+        self._loop = loop
+        loop.set_debug(True)
+        loop.slow_callback_duration = self.slow_callback_duration
+
+        logging.getLogger('asyncio').addFilter(_SlowCallbackFilter(self))
+
+        profile_signal = getattr(signal, 'SIGUSR1', None)
+        if profile_signal is not None:
+            try:
+                loop.add_signal_handler(profile_signal, self.toggle_profile)
+                logger.info(f"🩺 诊断已启用: 慢回调阈值 {self.slow_callback_duration*1000:.0f}ms, "
+                            f"发送 SIGUSR1 (kill -USR1 {os.getpid()}) 开始/停止{self.profile_mode}剖析")
+                return
+            except (NotImplementedError, RuntimeError):
+                pass
+        logger.info(f"🩺 诊断已启用: 慢回调阈值 {self.slow_callback_duration*1000:.0f}ms (当前平台不支持剖析信号)")
+
+    def report_slow_callback(self, handle: str, duration: float):
+        """记录一次事件循环卡顿"""
+        name = self._slow_task_location(handle)
+        if name is None:
+            match = _CORO_NAME_RE.search(handle)
+            name = match.group(1) if match else handle[:120]
+        self.slow_callbacks[name] += 1
+        logger.warning(f"🐢 事件循环卡顿 {duration*1000:.0f}ms: {name}")
+
+    def _slow_task_location(self, handle: str) -> Optional[str]:
+        """定位卡顿发生在哪个处理函数中
+
+        Telethon 在 _dispatch_update 任务中调用每个事件处理器，日志中的协程名称总是它，
+        因此按任务名称找到任务：优先使用计时包装器记录的当前（或最近退出的）流程函数，
+        否则沿任务的 await 链找到最内层的非库代码协程
+        """
+        match = _TASK_NAME_RE.search(handle)
+        if not match:
+            return None
+        task_name = match.group(1)
+
+        for task, stages in list(self._task_stages.items()):
+            if task.get_name() == task_name:
+                return stages[-1] if stages else self._task_last_stage.get(task)
+
+        for task in asyncio.all_tasks(self._loop):
+            if task.get_name() == task_name:
+                return self._innermost_coroutine(task)
+        return None
+
+    @staticmethod
+    def _innermost_coroutine(task: asyncio.Task) -> Optional[str]:
+        """任务 await 链上最内层的非库代码协程名称"""
+        name = None
+        coro = task.get_coro()
+        while coro is not None and hasattr(coro, 'cr_code'):
+            code = coro.cr_code
+            if not any(part in code.co_filename for part in _LIBRARY_DIRS):
+                name = getattr(coro, '__qualname__', code.co_name)
+            coro = coro.cr_await
+        return name
+
+    def toggle_profile(self):
+        """开始或停止一次剖析（由信号触发）"""
+        if self._profiler is None:
+            self.start_profile()
+        else:
+            self.stop_profile()
+
+    def start_profile(self):
+        if self._profiler is not None:
+            return
+        if self.profile_mode == 'sampling':
+            self._profiler = _SamplingProfiler(self.sample_interval)
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+        if self._loop and self.profile_duration > 0:
+            self._profile_stop_handle = self._loop.call_later(self.profile_duration, self.stop_profile)
+        logger.info(f"🔬 开始{self.profile_mode}剖析，最长 {self.profile_duration:g} 秒")
+
+    def stop_profile(self) -> Optional[str]:
+        """停止剖析并写入 PROFILE_DIR，返回文件路径"""
+        profiler, self._profiler = self._profiler, None
+        if profiler is None:
+            return None
+        if self._profile_stop_handle:
+            self._profile_stop_handle.cancel()
+            self._profile_stop_handle = None
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+
+        if isinstance(profiler, _SamplingProfiler):
+            profiler.stop()
+            path = os.path.join(self.profile_dir, f'sample-{stamp}.folded')
+            profiler.dump(path)
+        else:
+            profiler.disable()
+            path = os.path.join(self.profile_dir, f'profile-{stamp}.prof')
+            profiler.dump_stats(path)
+            # 同时写一份可直接阅读的摘要
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(30)
+            with open(path[:-5] + '.txt', 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+
+        logger.info(f"🔬 剖析结果已保存: {path}")
+        return path
+
+    def format_report(self) -> str:
+        """格式化各阶段耗时和慢回调统计，用于定期日志"""
+        parts = []
+        for name, timing in sorted(self.timings.items(), key=lambda item: -item[1].total):
+            if timing.count:
+                parts.append(f"{name} 平均{timing.total/timing.count*1000:.1f}ms/"
+                             f"最大{timing.max*1000:.0f}ms×{timing.count}")
+        report = "🩺 阶段耗时: " + (", ".join(parts) if parts else "无")
+        if self.slow_callbacks:
+            slow = ", ".join(f"{name}×{count}" for name, count in self.slow_callbacks.most_common(5))
+            report += f" | 慢回调: {slow}"
+        return report
@@ -0,0 +1,152 @@
+"""
+摘要模式模块 - 低优先级群组的消息不逐条转发，在内存中收集后定期合并为一条摘要发送
+
+每个群组单独计时：收到第一条消息后开始计时，到达间隔或条数上限时发送摘要。
+摘要头部沿用 MESSAGE_PREFIX 的格式，每条消息一行（时间、发送者、内容片段和原消息链接）
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 无文字或带说明文字的媒体消息在摘要中的标记
+MEDIA_LABELS = {
+    'photo': '[图片]',
+    'video': '[视频]',
+    'document': '[文件]',
+    'audio': '[音频]',
+    'voice': '[语音]',
+    'sticker': '[贴纸]',
+    'geo': '[位置]',
+    'contact': '[联系人]',
+    'poll': '[投票]',
+}
+
+
+def message_link(chat_id: int, message_id: int, username: Optional[str] = None) -> str:
+    """原消息的链接；普通群组没有消息链接，返回消息ID"""
+    chat_key = str(chat_id)
+    if chat_key.startswith('-100'):
+        return f"https://t.me/c/{chat_key[4:]}/{message_id}"
+    if username:
+        return f"https://t.me/{username.lstrip('@')}/{message_id}"
+    return f"#{message_id}"
+
+
+def make_snippet(kind: Optional[str], text: str, length: int) -> str:
+    """消息内容片段：媒体标记 + 截断后的单行文本（kind 为媒体类型，无媒体时为None）"""
+    label = MEDIA_LABELS.get(kind, '[媒体]') if kind else ''
+
+    text = ' '.join(text.split())
+    if len(text) > length:
+        text = text[:length - 1] + '…'
+    return f"{label} {text}".strip() if label else text
+
+
+class DigestEntry:
+    """摘要中的一条消息（只保留生成摘要所需的字段）"""
+
+    __slots__ = ('message_id', 'date', 'sender_name', 'snippet')
+
+    def __init__(self, message_id: int, date, sender_name: str, snippet: str):
+        self.message_id = message_id
+        self.date = date
+        self.sender_name = sender_name
+        self.snippet = snippet
+
+
+class GroupDigest:
+    """单个群组待发送的摘要"""
+
+    __slots__ = ('chat_id', 'chat_title', 'username', 'entries', 'timer')
+
+    def __init__(self, chat_id: int, chat_title: str, username: Optional[str]):
+        self.chat_id = chat_id
+        self.chat_title = chat_title
+        self.username = username
+        self.entries: List[DigestEntry] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class DigestCollector:
+    """按群组收集消息，到达时间间隔或条数上限时通过 send 发送摘要文本"""
+
+    def __init__(self, send: Callable[[str], Awaitable[None]],
+                 render_header: Callable[[GroupDigest, List[DigestEntry]], str],
+                 time_format: str = '%H:%M'):
+        self.send = send
+        self.render_header = render_header
+        self.time_format = time_format
+        self.groups: Dict[int, GroupDigest] = {}
+        self._flushing = set()
+
+        self.collected = 0
+        self.digests_sent = 0
+        self.errors = 0
+
+    def add(self, chat_id: int, chat_title: str, username: Optional[str],
+            entry: DigestEntry, interval: float, max_messages: int):
+        """加入一条消息；该群组的第一条消息开始计时，达到条数上限时立即发送"""
+        group = self.groups.get(chat_id)
+        if group is None:
+            group = GroupDigest(chat_id, chat_title, username)
+            self.groups[chat_id] = group
+        group.chat_title = chat_title
+        group.entries.append(entry)
+        self.collected += 1
+
+        loop = asyncio.get_running_loop()
+        if len(group.entries) == max_messages:
+            self._schedule_flush(chat_id)
+        elif group.timer is None:
+            group.timer = loop.call_later(interval, self._schedule_flush, chat_id)
+
+    def _schedule_flush(self, chat_id: int):
+        task = asyncio.get_running_loop().create_task(self.flush(chat_id))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    def format_digest(self, group: GroupDigest, entries: List[DigestEntry]) -> str:
+        """生成摘要文本：前缀格式的头部 + 每条消息一行"""
+        lines = [self.render_header(group, entries)]
+        for entry in entries:
+            time_text = entry.date.strftime(self.time_format) if entry.date else ''
+            link = message_link(group.chat_id, entry.message_id, group.username)
+            parts = ('•', time_text, f"{entry.sender_name}:", entry.snippet, link)
+            lines.append(' '.join(part for part in parts if part))
+        return '\n'.join(lines)
+
+    async def flush(self, chat_id: int):
+        """发送一个群组当前收集的摘要"""
+        group = self.groups.get(chat_id)
+        if group is None or not group.entries:
+            return
+        if group.timer is not None:
+            group.timer.cancel()
+            group.timer = None
+
+        # 先取出已收集的消息，发送期间到达的消息进入下一份摘要
+        entries, group.entries = group.entries, []
+        try:
+            await self.send(self.format_digest(group, entries))
+            self.digests_sent += 1
+            logger.info(f"🗞️ 已发送摘要: {group.chat_title} ({len(entries)} 条消息)")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"❌ 发送摘要失败 ({group.chat_title}, {len(entries)} 条消息): {e}")
+
+    async def flush_all(self):
+        """立即发送所有群组的摘要（停止时调用，避免丢失已收集的消息）"""
+        for chat_id in list(self.groups):
+            await self.flush(chat_id)
+        if self._flushing:
+            await asyncio.gather(*list(self._flushing), return_exceptions=True)
+
+    def pending(self) -> int:
+        return sum(len(group.entries) for group in self.groups.values())
+
+    def format_stats(self) -> str:
+        """格式化摘要统计，用于定期日志"""
+        return (f"🗞️ 摘要模式: 收集 {self.collected} 条, 发送 {self.digests_sent} 份摘要, "
+                f"待发 {self.pending()} 条" + (f", 失败 {self.errors}" if self.errors else ""))
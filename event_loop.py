@@ -0,0 +1,43 @@
+"""
+事件循环选择模块 - 按 EVENT_LOOP 配置使用 uvloop 或标准 asyncio 事件循环
+
+uvloop 为可选依赖（不支持 Windows），未安装时自动回退到标准事件循环
+"""
+import asyncio
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# auto = 已安装 uvloop 时使用 uvloop，否则使用标准事件循环
+LOOP_CHOICES = ('auto', 'asyncio', 'uvloop')
+
+
+def available_loops() -> List[str]:
+    """当前环境可用的事件循环实现"""
+    return ['asyncio', 'uvloop'] if uvloop is not None else ['asyncio']
+
+
+def install_event_loop(name: str) -> str:
+    """在 asyncio.run 之前调用，设置事件循环策略，返回实际使用的实现名称"""
+    name = (name or 'auto').lower()
+    if name not in LOOP_CHOICES:
+        logger.warning(f"⚠️ 未知的 EVENT_LOOP: {name}，使用标准 asyncio 事件循环")
+        name = 'asyncio'
+
+    if name == 'asyncio':
+        asyncio.set_event_loop_policy(None)
+        return 'asyncio'
+
+    if uvloop is None:
+        if name == 'uvloop':
+            logger.warning("⚠️ 未安装 uvloop (pip install uvloop)，回退到标准 asyncio 事件循环")
+        return 'asyncio'
+
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return 'uvloop'
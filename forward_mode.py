@@ -0,0 +1,187 @@
+"""
+自适应转发模式模块 - 根据实测的网络开销为每条消息选择转发方式
+
+可选方式:
+    direct    - 直接转发（前缀 + 转发 / 合并发送）
+    reference - 引用重发：用原消息的媒体引用重新发送，无需下载，内容纯净
+    resend    - 下载重发：下载后重新上传，内容纯净
+
+按最近的API往返时间、下载/上传吞吐量和 FloodWait 压力预测每种方式的送达延迟，
+选择预测延迟最低的方式；重发连续失败或超时时，熔断器会暂时固定使用直接转发
+"""
+import logging
+import time
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+DIRECT = 'direct'
+REFERENCE = 'reference'
+RESEND = 'resend'
+MODES = (DIRECT, REFERENCE, RESEND)
+
+MODE_NAMES = {DIRECT: '直接转发', REFERENCE: '引用重发', RESEND: '下载重发'}
+
+# 指数加权平均的平滑系数
+EWMA_ALPHA = 0.2
+
+# 未被选中的重发方式每次选择后失败率的衰减系数，使失败过的方式之后仍有机会被重新尝试
+FAILURE_RECOVERY = 0.98
+
+# 限流压力（近期累计的 FloodWait 秒数）折算到每次API调用的额外等待比例
+FLOOD_COST_FACTOR = 0.1
+
+
+class _Ewma:
+    """指数加权移动平均"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, initial: float):
+        self.value = initial
+
+    def add(self, sample: float):
+        self.value += EWMA_ALPHA * (sample - self.value)
+
+
+class _FloodWaitFilter(logging.Filter):
+    """截获 Telethon 自动等待 FloodWait 时的日志，累计限流压力（不影响日志输出）"""
+
+    def __init__(self, selector: 'AdaptiveModeSelector'):
+        super().__init__()
+        self.selector = selector
+
+    def filter(self, record):
+        if isinstance(record.msg, str) and 'flood wait' in record.msg and record.args:
+            try:
+                self.selector.record_flood_wait(float(record.args[1]))
+            except (IndexError, TypeError, ValueError):
+                pass
+        return True
+
+
+class AdaptiveModeSelector:
+    """按预测送达延迟选择转发方式，带重发熔断器"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 300,
+                 flood_decay: float = 60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.flood_decay = flood_decay
+
+        # 初始估计值：50ms 往返，1MB/s 下载/上传
+        self.rtt = _Ewma(0.05)
+        self.download_bps = _Ewma(1024 * 1024)
+        self.upload_bps = _Ewma(1024 * 1024)
+        # 各方式的失败率
+        self.failure_rate: Dict[str, _Ewma] = {mode: _Ewma(0.0) for mode in MODES}
+
+        self.flood_pressure = 0.0
+        self._flood_updated = time.monotonic()
+
+        # 熔断器
+        self.consecutive_failures = 0
+        self.breaker_open_until = 0.0
+        self.breaker_trips = 0
+
+        self.choices: Dict[str, int] = {mode: 0 for mode in MODES}
+
+    def install_flood_monitor(self):
+        """监听 Telethon 的 FloodWait 自动等待日志"""
+        logging.getLogger('telethon.client.users').addFilter(_FloodWaitFilter(self))
+
+    # 观测数据
+
+    def record_api_call(self, elapsed: float):
+        self.rtt.add(elapsed)
+
+    def record_transfer(self, direction: str, size: int, elapsed: float):
+        """记录一次下载('download')或上传('upload')，扣除一次往返时间后计算吞吐量"""
+        if size <= 0 or elapsed <= 0:
+            return
+        transfer_time = max(elapsed - self.rtt.value, elapsed * 0.1)
+        target = self.download_bps if direction == 'download' else self.upload_bps
+        target.add(size / transfer_time)
+
+    def record_flood_wait(self, seconds: float):
+        self._decay_flood()
+        self.flood_pressure += seconds
+
+    def _decay_flood(self):
+        now = time.monotonic()
+        elapsed = now - self._flood_updated
+        self._flood_updated = now
+        if self.flood_pressure and elapsed > 0:
+            self.flood_pressure *= 0.5 ** (elapsed / self.flood_decay)
+
+    def record_result(self, mode: str, ok: bool):
+        """记录一次转发结果；重发类方式连续失败达到阈值时打开熔断器"""
+        self.failure_rate[mode].add(0.0 if ok else 1.0)
+        if mode == DIRECT:
+            return
+        if ok:
+            if self.consecutive_failures >= self.failure_threshold:
+                logger.info("✅ 重发恢复正常，熔断器关闭")
+            self.consecutive_failures = 0
+            return
+
+        self.consecutive_failures += 1
+        if self.consecutive_failures == self.failure_threshold:
+            self.breaker_open_until = time.monotonic() + self.cooldown
+            self.breaker_trips += 1
+            logger.warning(f"⚡ 重发连续失败 {self.consecutive_failures} 次，"
+                           f"{self.cooldown:g} 秒内固定使用直接转发")
+        elif self.consecutive_failures > self.failure_threshold:
+            # 半开状态下的试探仍然失败，重新计时
+            self.breaker_open_until = time.monotonic() + self.cooldown
+
+    @property
+    def breaker_open(self) -> bool:
+        return time.monotonic() < self.breaker_open_until
+
+    # 预测与选择
+
+    def predict(self, mode: str, size: int, direct_calls: int) -> float:
+        """预测某种方式的送达延迟(秒)；重发类方式计入失败后回退到直接转发的期望开销"""
+        self._decay_flood()
+        call_cost = self.rtt.value + self.flood_pressure * FLOOD_COST_FACTOR
+        direct = direct_calls * call_cost
+        if mode == DIRECT:
+            return direct
+
+        if mode == REFERENCE:
+            latency = call_cost
+        elif size:
+            # 下载 + 上传发送
+            latency = 2 * call_cost + size / self.download_bps.value + size / self.upload_bps.value
+        else:
+            # 纯文本重发只需一次发送
+            latency = call_cost
+        return latency + min(self.failure_rate[mode].value, 1.0) * direct
+
+    def choose(self, size: int, can_reference: bool, can_resend: bool, direct_calls: int = 2) -> str:
+        """为一条消息选择预测延迟最低的转发方式"""
+        candidates = [DIRECT]
+        if not self.breaker_open:
+            if can_reference:
+                candidates.append(REFERENCE)
+            if can_resend:
+                candidates.append(RESEND)
+
+        mode = min(candidates, key=lambda m: self.predict(m, size, direct_calls))
+        self.choices[mode] += 1
+        for other in (REFERENCE, RESEND):
+            if other != mode:
+                self.failure_rate[other].value *= FAILURE_RECOVERY
+        return mode
+
+    def format_stats(self) -> str:
+        """格式化自适应模式统计，用于定期日志"""
+        self._decay_flood()
+        choices = ", ".join(f"{mode} {count}" for mode, count in self.choices.items())
+        failures = ", ".join(f"{mode} {rate.value:.0%}" for mode, rate in self.failure_rate.items())
+        breaker = "打开" if self.breaker_open else "关闭"
+        return (f"🧭 自适应转发: 选择 [{choices}], 失败率 [{failures}], "
+                f"RTT {self.rtt.value*1000:.0f}ms, 下载 {self.download_bps.value/1024/1024:.2f}MB/s, "
+                f"上传 {self.upload_bps.value/1024/1024:.2f}MB/s, 限流压力 {self.flood_pressure:.1f}s, "
+                f"熔断器 {breaker} (累计 {self.breaker_trips} 次)")
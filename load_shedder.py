@@ -0,0 +1,114 @@
+"""
+负载调节模块 - 根据端到端延迟（消息发出时间到处理/送达的时间）逐级降级，延迟恢复后逐级回到正常
+
+降级级别:
+    0 正常
+    1 丢弃贴纸
+    2 媒体改为直接转发（不下载重发）
+    3 只发送文字（丢弃媒体）
+    4 只进入摘要
+"""
+import logging
+import time
+from collections import Counter
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+NORMAL = 0
+DROP_STICKERS = 1
+MEDIA_DIRECT = 2
+TEXT_ONLY = 3
+DIGEST_ONLY = 4
+
+LEVEL_NAMES = {
+    NORMAL: '正常',
+    DROP_STICKERS: '丢弃贴纸',
+    MEDIA_DIRECT: '媒体直接转发',
+    TEXT_ONLY: '仅文字',
+    DIGEST_ONLY: '仅摘要',
+}
+
+# 延迟的指数加权平均平滑系数
+LAG_ALPHA = 0.3
+
+
+class LoadShedder:
+    """按延迟阈值决定降级级别；进入下一级立即生效，回退需延迟低于阈值×恢复比例并停留足够时间"""
+
+    def __init__(self, thresholds: Sequence[float], recovery_ratio: float = 0.5,
+                 min_dwell: float = 30):
+        """
+        thresholds: 进入第 1~4 级的延迟阈值(秒)，需递增
+        recovery_ratio: 延迟低于 当前级阈值×该比例 时回退一级
+        min_dwell: 每一级至少保持的时间(秒)，避免来回切换
+        """
+        self.thresholds: List[float] = list(thresholds)[:DIGEST_ONLY]
+        self.recovery_ratio = recovery_ratio
+        self.min_dwell = min_dwell
+
+        self.level = NORMAL
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._last_sample = 0.0
+        self._level_since = time.monotonic()
+
+        self.transitions = 0
+        self.time_in_level: Dict[int, float] = {level: 0.0 for level in LEVEL_NAMES}
+        # 各降级动作的执行次数
+        self.actions: Counter = Counter()
+
+    def set_thresholds(self, thresholds: Sequence[float]):
+        """更新延迟阈值（配置热加载）；阈值个数减少时当前级别降到最高的有效级别"""
+        self.thresholds = list(thresholds)[:DIGEST_ONLY]
+        if self.level > len(self.thresholds):
+            self._set_level(len(self.thresholds), time.monotonic())
+
+    def observe(self, lag: float) -> int:
+        """记录一次延迟样本，返回更新后的级别"""
+        self.lag = lag if not self._last_sample else self.lag + LAG_ALPHA * (lag - self.lag)
+        self._last_sample = time.monotonic()
+        if lag > self.max_lag:
+            self.max_lag = lag
+        return self._update()
+
+    def current_level(self) -> int:
+        """当前级别；长时间没有新样本（没有积压）时视为延迟已恢复"""
+        if self.level and time.monotonic() - self._last_sample > self.min_dwell:
+            self.lag = 0.0
+        return self._update()
+
+    def _update(self) -> int:
+        now = time.monotonic()
+        target = sum(1 for threshold in self.thresholds if self.lag >= threshold)
+
+        if target > self.level:
+            self._set_level(target, now)
+        elif (self.level > NORMAL and now - self._level_since >= self.min_dwell
+              and self.lag < self.thresholds[self.level - 1] * self.recovery_ratio):
+            self._set_level(self.level - 1, now)
+        return self.level
+
+    def _set_level(self, level: int, now: float):
+        self.time_in_level[self.level] += now - self._level_since
+        previous = self.level
+        self.level = level
+        self._level_since = now
+        self.transitions += 1
+        if level > previous:
+            logger.warning(f"🚦 处理延迟 {self.lag:.0f}s，降级: {LEVEL_NAMES[previous]} → {LEVEL_NAMES[level]}")
+        else:
+            logger.info(f"🚦 处理延迟 {self.lag:.0f}s，恢复: {LEVEL_NAMES[previous]} → {LEVEL_NAMES[level]}")
+
+    def count(self, action: str):
+        self.actions[action] += 1
+
+    def format_stats(self) -> str:
+        """格式化负载调节统计，用于定期日志"""
+        level = self.current_level()
+        durations = dict(self.time_in_level)
+        durations[level] += time.monotonic() - self._level_since
+        spent = ", ".join(f"{LEVEL_NAMES[lv]} {seconds:.0f}s" for lv, seconds in durations.items() if seconds >= 1)
+        actions = ", ".join(f"{action} {count}" for action, count in self.actions.most_common())
+        return (f"🚦 负载调节: 当前 {LEVEL_NAMES[level]} (延迟 {self.lag:.1f}s, 最大 {self.max_lag:.1f}s), "
+                f"切换 {self.transitions} 次, 各级时长 [{spent or '无'}], 降级动作 [{actions or '无'}]")
@@ -0,0 +1,191 @@
+"""
+下载重发流水线模块 - 将下载重发拆分为 准备 → 下载 → 上传 → 发送 四个阶段
+
+各阶段由独立的工作协程处理，阶段之间用有界队列衔接：上一条消息在上传时，
+下一条消息已经开始下载，网络的上下行可以同时利用。每个阶段只有一个工作协程、
+队列先进先出，因此消息送达目标的顺序与进入流水线的顺序一致
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (阶段名, 处理函数)
+Stage = Tuple[str, Callable[[Any], Awaitable[None]]]
+
+
+class ResendJob:
+    """一条消息在下载重发流水线中的状态，由各阶段依次填充"""
+
+    __slots__ = ('record', 'received_at', 'text', 'entities',
+                 'notice', 'download', 'file_name', 'data', 'file', 'fallback', 'text_only', 'delivered', 'error')
+
+    def __init__(self, record):
+        # 接收时提取的消息记录（records.MessageRecord）
+        self.record = record
+        self.received_at = time.monotonic()
+        # 要发送的原始文本及格式实体（有文件时作为说明文字）
+        self.text = ''
+        self.entities = None
+        # 替代内容的提示文本（位置、投票、文件过大等）
+        self.notice: Optional[str] = None
+        # 是否需要下载媒体，以及上传时使用的文件名（决定发送为图片还是文件）
+        self.download = False
+        self.file_name: Optional[str] = None
+        self.data: Optional[bytes] = None
+        # 上传后的文件句柄
+        self.file = None
+        # 不适合下载重发（如文件过大），在发送阶段回退到直接转发
+        self.fallback = False
+        # 负载调节要求只发送文字（不下载媒体），在发送阶段发送前缀和文字
+        self.text_only = False
+        # 是否已有内容送达机器人（此后失败不能再回退到直接转发，否则会重复发送）
+        self.delivered = False
+        # 某个阶段出错时记录异常，后续阶段跳过，由最后一个阶段报告
+        self.error: Optional[BaseException] = None
+
+
+class PipelineStage:
+    """单个阶段的输入队列及统计"""
+
+    __slots__ = ('name', 'handler', 'queue', 'processed', 'failed', 'busy', 'blocked', 'worker')
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], buffer_size: int):
+        self.name = name
+        self.handler = handler
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.processed = 0
+        self.failed = 0
+        # 处理耗时，以及因下游队列已满而等待的时间
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.worker: Optional[asyncio.Task] = None
+
+
+class StagePipeline:
+    """多阶段流水线：每个阶段一个工作协程，阶段之间为有界队列
+
+    任务对象需要有 error 属性：阶段抛出异常时记录到 error，后续阶段跳过该任务，
+    最后一个阶段总会执行（负责送达或报告错误）
+    """
+
+    def __init__(self, stages: Sequence[Stage], buffer_size: int = 4):
+        self.stages = [PipelineStage(name, handler, buffer_size) for name, handler in stages]
+        self.started_at: Optional[float] = None
+        self.completed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _start(self):
+        self.started_at = time.monotonic()
+        for index in range(len(self.stages)):
+            self._start_worker(index)
+
+    def _start_worker(self, index: int):
+        self.stages[index].worker = asyncio.get_running_loop().create_task(self._run(index))
+
+    def _restart_dead_workers(self):
+        """只重启意外退出的阶段，每个阶段始终只有一个工作协程，保证送达顺序"""
+        for index, stage in enumerate(self.stages):
+            if stage.worker.done():
+                error = None if stage.worker.cancelled() else stage.worker.exception()
+                logger.warning(f"⚠️ 流水线阶段 {stage.name} 的工作协程已退出，重新启动: {error or '已取消'}")
+                self._start_worker(index)
+
+    async def submit(self, item):
+        """放入流水线；第一个阶段的队列已满时等待（向上游施加背压）"""
+        if self.started_at is None:
+            self._start()
+        else:
+            self._restart_dead_workers()
+        self._pending += 1
+        self._idle.clear()
+        await self.stages[0].queue.put(item)
+
+    async def _run(self, index: int):
+        stage = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        downstream = None if is_last else self.stages[index + 1].queue
+
+        while True:
+            item = await stage.queue.get()
+            if item.error is None or is_last:
+                started = time.monotonic()
+                try:
+                    await stage.handler(item)
+                    stage.processed += 1
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    stage.failed += 1
+                    if is_last:
+                        logger.error(f"❌ 流水线阶段 {stage.name} 处理失败: {e}")
+                    else:
+                        item.error = e
+                stage.busy += time.monotonic() - started
+
+            if downstream is not None:
+                started = time.monotonic()
+                await downstream.put(item)
+                stage.blocked += time.monotonic() - started
+            else:
+                self._complete(item)
+
+    def _complete(self, item):
+        latency = time.monotonic() - getattr(item, 'received_at', time.monotonic())
+        self.completed += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+        self._pending -= 1
+        if not self._pending:
+            self._idle.set()
+
+    async def join(self):
+        """等待所有已提交的任务完成"""
+        await self._idle.wait()
+
+    def depth(self) -> int:
+        return self._pending
+
+    async def stop(self, timeout: float = 10.0):
+        """等待已提交的任务完成（最多 timeout 秒），然后取消各阶段的工作协程；超时未完成的任务被丢弃"""
+        if self.started_at is not None and self._pending:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ 重发流水线停止超时，丢弃 {self._pending} 条未完成的消息")
+        workers = [stage.worker for stage in self.stages if stage.worker]
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self.started_at = None
+
+    def stats(self) -> List[Dict]:
+        """各阶段的处理数、利用率（处理耗时占运行时间的比例）和阻塞时间"""
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return [{
+            'stage': stage.name,
+            'processed': stage.processed,
+            'failed': stage.failed,
+            'queued': stage.queue.qsize(),
+            'utilization': stage.busy / elapsed if elapsed else 0.0,
+            'blocked': stage.blocked,
+        } for stage in self.stages]
+
+    def format_stats(self) -> str:
+        """格式化流水线统计，用于定期日志"""
+        parts = [
+            f"{s['stage']} 利用率{s['utilization']:.0%} 已处理{s['processed']} 排队{s['queued']}"
+            + (f" 阻塞{s['blocked']:.1f}s" if s['blocked'] >= 0.05 else "")
+            + (f" 失败{s['failed']}" if s['failed'] else "")
+            for s in self.stats()
+        ]
+        average = self.total_latency / self.completed if self.completed else 0.0
+        return (f"🏭 重发流水线: {'; '.join(parts)}; "
+                f"完成 {self.completed}, 端到端平均 {average:.2f}s 最长 {self.max_latency:.2f}s")
@@ -0,0 +1,193 @@
+"""
+消息记录模块 - 接收消息时从 Telethon 事件中一次性提取转发所需的字段
+
+事件和 Message 对象引用整个实体图（发送者、群组、原始TL对象、完整的媒体结构），
+排队、缓存和批处理中的消息只保留紧凑的 MessageRecord：群组/发送者ID、消息ID、时间、
+文本、媒体ID/大小/类型和 grouped_id，以及按引用发送或下载媒体所需的最少信息。
+下游各阶段（调度队列、流水线、摘要、归档）只使用记录，不再持有原始事件。
+格式实体以 TL 序列化字节保存，发送时再还原；群组标题、发送者名称等重复出现的字符串驻留共享
+"""
+import sys
+from typing import List, Optional
+
+from telethon import TelegramClient
+from telethon.extensions import BinaryReader
+from telethon.tl.types import (
+    User, MessageMediaWebPage, PhotoSizeProgressive,
+    InputPhoto, InputDocument, InputMediaPhoto, InputMediaDocument,
+    InputPhotoFileLocation, InputDocumentFileLocation,
+)
+
+from update_log import media_kind
+
+# 文档类媒体（Telethon 中 message.document 不为空的类型）
+DOCUMENT_KINDS = frozenset({'document', 'video', 'voice', 'audio', 'sticker'})
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def pack_entities(entities) -> Optional[bytes]:
+    """格式实体序列化为紧凑的字节串（每个实体十几个字节）"""
+    return b''.join(bytes(entity) for entity in entities) if entities else None
+
+
+def unpack_entities(data: Optional[bytes]) -> Optional[List]:
+    """还原 pack_entities 序列化的格式实体"""
+    if not data:
+        return None
+    reader = BinaryReader(data)
+    entities = []
+    while reader.tell_position() < len(data):
+        entities.append(reader.tgread_object())
+    return entities
+
+
+def sender_display_name(sender) -> str:
+    """发送者显示名称：用户为姓名（无姓名时用用户名或ID），频道为标题"""
+    if isinstance(sender, User):
+        name = sender.first_name or ""
+        if sender.last_name:
+            name += f" {sender.last_name}"
+        if not name.strip():
+            name = sender.username or f"User_{sender.id}"
+        return name
+    if hasattr(sender, 'title'):
+        return sender.title
+    return "Unknown"
+
+
+def media_notice(message) -> str:
+    """无法下载重发的媒体（位置、联系人、投票等）转换为的提示文本"""
+    if message.geo:
+        return f"📍 位置: {message.geo.lat}, {message.geo.long}"
+    if message.contact:
+        contact = message.contact
+        return f"👤 {contact.first_name} {contact.last_name or ''} {contact.phone_number}"
+    if message.poll:
+        poll = message.poll
+        poll_text = f"📊 {poll.question}\n"
+        for i, answer in enumerate(poll.answers, 1):
+            poll_text += f"{i}. {answer.text}\n"
+        return poll_text
+    return "[不支持的消息类型]"
+
+
+class MessageRecord:
+    """转发流程中的一条消息，只包含转发所需的字段"""
+
+    __slots__ = ('chat_id', 'message_id', 'date', 'sender_id', 'sender_name', 'chat_title',
+                 'text', '_entities', 'grouped_id', 'is_forward', 'is_bot',
+                 'web_preview', 'media_kind', 'media_id', 'access_hash', 'file_reference',
+                 'dc_id', 'thumb_size', 'media_size', 'file_name', 'file_ext', 'notice')
+
+    def __init__(self, chat_id: int, message_id: int, date, sender_id: Optional[int] = None,
+                 sender_name: str = 'Unknown', chat_title: str = 'Unknown Group'):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.date = date
+        self.sender_id = sender_id
+        self.sender_name = sender_name
+        self.chat_title = chat_title
+        # 原始文本及序列化的格式实体
+        self.text = ''
+        self._entities: Optional[bytes] = None
+        self.grouped_id: Optional[int] = None
+        self.is_forward = False
+        self.is_bot = False
+        # 带网页预览的文本消息
+        self.web_preview = False
+        # 媒体类型（photo/video/document/...，网页预览不算媒体），无媒体时为None
+        self.media_kind: Optional[str] = None
+        # 图片/文件的引用信息（按引用发送和下载时使用）
+        self.media_id: Optional[int] = None
+        self.access_hash = 0
+        self.file_reference = b''
+        self.dc_id = 0
+        # 图片下载的尺寸类型（文件为空字符串）
+        self.thumb_size = ''
+        self.media_size = 0
+        self.file_name: Optional[str] = None
+        self.file_ext = ''
+        # 位置、联系人、投票等媒体的文字描述
+        self.notice: Optional[str] = None
+
+    @classmethod
+    def from_message(cls, message, chat_id: int, sender, chat) -> 'MessageRecord':
+        """从 Message（及已获取的发送者、群组）中提取记录"""
+        record = cls(
+            chat_id, message.id, message.date, message.sender_id,
+            _intern(sender_display_name(sender)), _intern(getattr(chat, 'title', None) or 'Unknown Group')
+        )
+        record.text = message.message or ''
+        record._entities = pack_entities(message.entities)
+        record.grouped_id = message.grouped_id
+        record.is_forward = message.fwd_from is not None
+        record.is_bot = isinstance(sender, User) and bool(sender.bot)
+
+        media = message.media
+        if media is None:
+            return record
+        if isinstance(media, MessageMediaWebPage):
+            record.web_preview = True
+            return record
+
+        record.media_kind = media_kind(message)
+        if message.photo:
+            photo = message.photo
+            size = TelegramClient._get_thumb(getattr(photo, 'sizes', None), None)
+            record.thumb_size = _intern(getattr(size, 'type', ''))
+            record.media_size = (max(size.sizes) if isinstance(size, PhotoSizeProgressive)
+                                 else getattr(size, 'size', 0) or 0)
+            record.file_ext = '.jpg'
+            record._set_file(photo)
+        elif message.document:
+            document = message.document
+            record.media_size = document.size or 0
+            record.file_name = message.file.name
+            record.file_ext = _intern(message.file.ext or '')
+            record._set_file(document)
+        else:
+            record.notice = media_notice(message)
+        return record
+
+    def _set_file(self, file):
+        self.media_id = file.id
+        self.access_hash = getattr(file, 'access_hash', 0)
+        self.file_reference = getattr(file, 'file_reference', b'')
+        self.dc_id = getattr(file, 'dc_id', 0)
+
+    @property
+    def entities(self) -> Optional[List]:
+        """格式实体（每次访问时还原为新的TL对象）"""
+        return unpack_entities(self._entities)
+
+    @property
+    def has_media(self) -> bool:
+        return self.media_kind is not None
+
+    @property
+    def has_file(self) -> bool:
+        """是否为可下载或按引用发送的图片/文件"""
+        return self.media_id is not None
+
+    @property
+    def is_document(self) -> bool:
+        return self.media_kind in DOCUMENT_KINDS
+
+    def input_media(self):
+        """按引用重新发送图片/文件（无需下载）使用的 InputMedia"""
+        if self.media_kind == 'photo':
+            return InputMediaPhoto(InputPhoto(self.media_id, self.access_hash, self.file_reference))
+        return InputMediaDocument(InputDocument(self.media_id, self.access_hash, self.file_reference))
+
+    def file_location(self):
+        """下载图片/文件使用的位置（与 Telethon 下载消息媒体时相同）"""
+        if self.media_kind == 'photo':
+            return InputPhotoFileLocation(self.media_id, self.access_hash, self.file_reference, self.thumb_size)
+        return InputDocumentFileLocation(self.media_id, self.access_hash, self.file_reference, '')
+
+    def upload_name(self) -> str:
+        """重新上传时使用的文件名（扩展名决定发送为图片还是文件）"""
+        return self.file_name or f"media{self.file_ext}"
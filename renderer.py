@@ -0,0 +1,232 @@
+"""
+消息渲染模块 - 预编译 MESSAGE_PREFIX 模板、缓存群组/发送者片段，并按实体安全的边界拆分长消息
+"""
+import logging
+import string
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from telethon.helpers import add_surrogate, del_surrogate
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 模板支持的字段
+CHAT_FIELDS = frozenset({'chat_title', 'chat_id', 'sender_name'})
+MESSAGE_FIELDS = frozenset({'message_time', 'message_id'})
+
+# 前缀与正文之间的分隔符
+PREFIX_SEPARATOR = '\n'
+
+# 句末标点（作为最后一级切分边界）
+SENTENCE_ENDS = frozenset('.!?;。！？；')
+
+# 单条消息最多携带的格式实体数
+MAX_ENTITIES = 100
+
+# (文本, 格式实体列表)
+TextChunk = Tuple[str, list]
+
+
+def _shift_entity(entity, **updates):
+    """复制格式实体并修改 offset/length"""
+    kwargs = entity.to_dict()
+    del kwargs['_']
+    kwargs.update(updates)
+    return entity.__class__(**kwargs)
+
+
+def _find_cut(text: str, entities: list, limit: int, rest_limit: int) -> int:
+    """在 limit 之内选择切分位置（text 为 UTF-16 代理对形式）
+
+    优先级：换行 > 空白 > 句末标点，且不落在格式实体（链接、代码等）内部。
+    先在后半段窗口内查找，保证每段尽量填满；后半段没有边界时，只接受
+    不会增加消息条数的边界（剩余部分一条消息能放下），否则直接硬切
+    """
+    spans = [(e.offset, e.offset + e.length) for e in entities if e.offset < limit]
+
+    def inside_entity(pos):
+        return any(start < pos < end for start, end in spans)
+
+    windows = [limit // 2]
+    if len(text) - rest_limit < limit // 2:
+        windows.append(max(1, len(text) - rest_limit))
+
+    for low in windows:
+        for is_boundary in (_is_newline, str.isspace, _is_sentence_end):
+            for i in range(limit - 1, low - 1, -1):
+                if is_boundary(text[i]) and not inside_entity(i + 1):
+                    return i + 1
+
+    # 没有合适的边界时硬切，但不拆开代理对
+    cut = limit
+    if '\ud800' <= text[cut - 1] <= '\udbff':
+        cut -= 1
+    return cut
+
+
+def _cut_at(text: str, entities: list, cut: int):
+    """在 cut 处切开文本，跨越切分点的实体在两侧各保留一段"""
+    head_entities, rest_entities = [], []
+    for entity in entities:
+        end = entity.offset + entity.length
+        if entity.offset >= cut:
+            rest_entities.append(_shift_entity(entity, offset=entity.offset - cut))
+        elif end > cut:
+            head_entities.append(_shift_entity(entity, length=cut - entity.offset))
+            rest_entities.append(_shift_entity(entity, offset=0, length=end - cut))
+        else:
+            head_entities.append(entity)
+    return text[:cut], head_entities, text[cut:], rest_entities
+
+
+def _is_newline(ch: str) -> bool:
+    return ch == '\n'
+
+
+def _is_sentence_end(ch: str) -> bool:
+    return ch in SENTENCE_ENDS
+
+
+def _format_field(value, conversion: Optional[str], spec: str) -> str:
+    if conversion == 'r':
+        value = repr(value)
+    elif conversion == 'a':
+        value = ascii(value)
+    elif conversion == 's':
+        value = str(value)
+    return format(value, spec)
+
+
+class MessageRenderer:
+    """按配置预编译的消息渲染器；配置热加载时整体替换"""
+
+    def __init__(self, template: str, show_time: bool, time_format: str, cache_size: int = 1024):
+        self.template = template
+        self.show_time = show_time
+        self.time_format = time_format
+        self.cache_size = cache_size
+        self._parts = self._compile(template)
+
+        # (chat_id, chat_title, sender_name) -> 只剩消息级字段待填的片段
+        self._fragments: OrderedDict = OrderedDict()
+        # 同一秒内的消息共用格式化后的时间
+        self._time_key = None
+        self._time_text = ''
+        self._check()
+
+    def _check(self):
+        """用示例消息试渲染一次，格式说明有误（如 {chat_title:>d}）时抛出 ValueError"""
+        try:
+            self.render_prefix(-1001234567890, 'Sample Group', 'Sample User', datetime.now(timezone.utc), 1)
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            raise ValueError(f"MESSAGE_PREFIX 无法渲染: {e}") from e
+        finally:
+            self._fragments.clear()
+            self._time_key = None
+
+    @classmethod
+    def from_config(cls) -> 'MessageRenderer':
+        return cls(Config.MESSAGE_PREFIX, Config.SHOW_MESSAGE_TIME, Config.TIME_FORMAT)
+
+    @staticmethod
+    def _compile(template: str) -> list:
+        """解析模板为 [(字面文本, 字段名, 转换, 格式)]，字段名有误时抛出 ValueError"""
+        parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(template):
+            if field is not None and field not in CHAT_FIELDS and field not in MESSAGE_FIELDS:
+                raise ValueError(f"MESSAGE_PREFIX 包含未知字段: {{{field}}}")
+            if conversion not in (None, 'r', 's', 'a'):
+                raise ValueError(f"MESSAGE_PREFIX 包含未知的转换: !{conversion}")
+            parts.append((literal, field, conversion, spec or ''))
+        return parts
+
+    def _fragment(self, chat_id, chat_title: str, sender_name: str) -> tuple:
+        """渲染群组和发送者相关的部分，消息级字段保留为 (字段, 转换, 格式) 占位"""
+        key = (chat_id, chat_title, sender_name)
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            return fragment
+
+        values = {'chat_title': chat_title, 'chat_id': str(chat_id), 'sender_name': sender_name}
+        pieces = []
+        buffer = ''
+        for literal, field, conversion, spec in self._parts:
+            buffer += literal
+            if field is None:
+                continue
+            if field in MESSAGE_FIELDS:
+                if buffer:
+                    pieces.append(buffer)
+                    buffer = ''
+                pieces.append((field, conversion, spec))
+            else:
+                buffer += _format_field(values[field], conversion, spec)
+        if buffer:
+            pieces.append(buffer)
+
+        fragment = tuple(pieces)
+        self._fragments[key] = fragment
+        if len(self._fragments) > self.cache_size:
+            self._fragments.popitem(last=False)
+        return fragment
+
+    def format_time(self, date) -> str:
+        """格式化消息时间（未开启 SHOW_MESSAGE_TIME 时为空）"""
+        if not self.show_time or date is None:
+            return ''
+        key = int(date.timestamp())
+        if key != self._time_key:
+            self._time_text = date.strftime(self.time_format)
+            self._time_key = key
+        return self._time_text
+
+    def render_prefix(self, chat_id, chat_title: str, sender_name: str, date, message_id) -> str:
+        """渲染消息前缀"""
+        fragment = self._fragment(chat_id, chat_title, sender_name)
+        if len(fragment) == 1 and isinstance(fragment[0], str):
+            return fragment[0]
+
+        values = {'message_time': self.format_time(date), 'message_id': str(message_id)}
+        return ''.join(
+            piece if isinstance(piece, str) else _format_field(values[piece[0]], piece[1], piece[2])
+            for piece in fragment
+        )
+
+    @staticmethod
+    def compose(prefix: str, text: str, entities: Optional[list]) -> TextChunk:
+        """将前缀合并到正文之前，正文的格式实体按前缀长度（UTF-16）平移"""
+        entities = entities or []
+        if not text:
+            return prefix, []
+        head = prefix + PREFIX_SEPARATOR
+        offset = len(add_surrogate(head))
+        return head + text, [_shift_entity(e, offset=e.offset + offset) for e in entities]
+
+    @staticmethod
+    def split(text: str, entities: Optional[list], limit: int,
+              first_limit: Optional[int] = None) -> List[TextChunk]:
+        """将长文本拆分为尽量少的消息，每段长度（UTF-16）不超过 limit
+
+        first_limit 用于首段长度限制不同的情况（如媒体说明文字）
+        """
+        remaining = add_surrogate(text)
+        entities = sorted(entities or [], key=lambda e: e.offset)
+        chunks = []
+        cur_limit = first_limit or limit
+        while True:
+            if len(entities) > MAX_ENTITIES:
+                # 单条消息的格式实体数量有限制
+                last = entities[MAX_ENTITIES - 1]
+                cur_limit = min(cur_limit, last.offset + last.length)
+            if len(remaining) <= cur_limit:
+                break
+            cut = _find_cut(remaining, entities, cur_limit, limit)
+            head, head_entities, remaining, entities = _cut_at(remaining, entities, cut)
+            chunks.append((del_surrogate(head), head_entities))
+            cur_limit = limit
+        chunks.append((del_surrogate(remaining), entities))
+        return chunks
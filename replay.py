@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+更新回放工具
+将 update_log 录制的消息日志按 1×、N× 或最大速度重新送入完整的转发流程，
+发送端使用本地替身客户端（不连接Telegram），用于复现生产突发流量并测量吞吐量
+
+用法:
+    python replay.py updates_record.jsonl.gz --speed 10
+    python replay.py updates_record.jsonl.gz --speed 0 --quiet   # 最大速度
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from telethon import events
+from telethon.tl.types import User, PhotoSize
+
+from config import Config
+from event_loop import LOOP_CHOICES, install_event_loop
+from update_log import read_records
+
+logger = logging.getLogger(__name__)
+
+# 带文件名属性的文档类媒体
+DOCUMENT_KINDS = ('document', 'video', 'voice', 'audio', 'sticker')
+
+
+class ReplayClient:
+    """本地替身客户端：模拟 TelegramClient 的接口，统计API调用并模拟网络延迟"""
+
+    def __init__(self, api_latency: float = 0.05, bandwidth: float = 10.0):
+        """
+        api_latency: 每次API调用的往返延迟(秒)
+        bandwidth: 模拟的上传/下载带宽(MB/s)，0 表示不限
+        """
+        self.api_latency = api_latency
+        self.bandwidth = bandwidth * 1024 * 1024
+        self.handlers = []
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.bytes_downloaded = 0
+        self.bytes_uploaded = 0
+        self._connected = True
+        self._bot_user = User(id=1, bot=True, first_name='Replay Bot', username='replay_bot')
+
+    def on(self, event_builder):
+        """与 TelegramClient.on 相同的装饰器接口，记录注册的事件处理器"""
+        def decorator(handler):
+            self.handlers.append((event_builder, handler))
+            return handler
+        return decorator
+
+    async def dispatch(self, event):
+        """将事件分发给 NewMessage 处理器"""
+        for event_builder, handler in self.handlers:
+            if event_builder is events.NewMessage or isinstance(event_builder, events.NewMessage):
+                await handler(event)
+
+    async def _api_call(self, method: str, payload_size: int = 0):
+        """模拟一次API调用的耗时"""
+        self.calls[method] += 1
+        delay = self.api_latency
+        if payload_size and self.bandwidth:
+            delay += payload_size / self.bandwidth
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_message(self, entity, message='', **kwargs):
+        await self._api_call('send_message')
+
+    async def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        await self._api_call('forward_messages')
+
+    async def upload_file(self, file, file_name=None, **kwargs):
+        size = len(file)
+        self.bytes_uploaded += size
+        await self._api_call('upload_file', size)
+        return SimpleNamespace(name=file_name, size=size)
+
+    async def send_file(self, entity, file, caption=None, **kwargs):
+        size = len(file) if isinstance(file, (bytes, bytearray)) else 0
+        self.bytes_uploaded += size
+        await self._api_call('send_file', size)
+
+    async def download_file(self, input_location, file=None, file_size=None, **kwargs):
+        size = file_size or 0
+        self.bytes_downloaded += size
+        await self._api_call('download_file', size)
+        return bytes(size)
+
+    async def get_entity(self, entity):
+        await self._api_call('get_entity')
+        return self._bot_user
+
+    async def get_me(self):
+        return self._bot_user
+
+    async def start(self, *args, **kwargs):
+        return self
+
+    def is_connected(self):
+        return self._connected
+
+    async def disconnect(self):
+        self._connected = False
+
+
+class ReplayMessage:
+    """根据录制记录重建的消息对象，提供转发流程用到的 Message 属性"""
+
+    def __init__(self, record: Dict, client: ReplayClient):
+        self._client = client
+        self.id = record['i']
+        self.sender_id = record.get('s')
+        self.date = datetime.fromtimestamp(record['t'], tz=timezone.utc)
+        self.message = record.get('m', '')
+        self.text = self.message
+        self.raw_text = self.message
+        self.entities = None
+        self.fwd_from = SimpleNamespace() if record.get('f') else None
+        self.grouped_id = record.get('g')
+
+        self.media = None
+        self.file = None
+        self.photo = self.document = self.video = self.voice = None
+        self.audio = self.sticker = self.geo = self.contact = self.poll = None
+
+        kind = record.get('md')
+        if not kind:
+            return
+
+        size = record.get('sz', 0)
+        file_name = record.get('fn')
+        self.file = SimpleNamespace(size=size, name=file_name, ext='.jpg' if kind == 'photo' else '')
+
+        if kind == 'photo':
+            self.photo = SimpleNamespace(id=self.id, sizes=[PhotoSize(type='y', w=0, h=0, size=size)])
+            self.media = SimpleNamespace(photo=self.photo)
+        elif kind in DOCUMENT_KINDS:
+            attributes = [SimpleNamespace(file_name=file_name)] if file_name else []
+            self.document = SimpleNamespace(id=self.id, size=size, attributes=attributes)
+            self.media = SimpleNamespace(document=self.document)
+            if kind != 'document':
+                setattr(self, kind, self.document)
+        elif kind == 'geo':
+            self.geo = SimpleNamespace(lat=0.0, long=0.0)
+            self.media = SimpleNamespace(geo=self.geo)
+        elif kind == 'contact':
+            self.contact = SimpleNamespace(first_name='Contact', last_name='', phone_number='+0')
+            self.media = self.contact
+        elif kind == 'poll':
+            self.poll = SimpleNamespace(question='Poll', answers=[])
+            self.media = SimpleNamespace(poll=self.poll)
+        else:
+            self.media = SimpleNamespace()
+
+
+class ReplayEvent:
+    """根据录制记录重建的 NewMessage 事件"""
+
+    def __init__(self, record: Dict, client: ReplayClient):
+        self.chat_id = record['c']
+        self.message = ReplayMessage(record, client)
+        self.date = self.message.date
+        self._chat = SimpleNamespace(id=self.chat_id, title=record.get('ct'), username=record.get('cu'))
+
+        if 'st' in record:
+            self._sender = SimpleNamespace(id=record.get('s'), title=record['st'])
+        elif 's' in record:
+            self._sender = User(
+                id=record['s'],
+                first_name=record.get('sf'),
+                last_name=record.get('sl'),
+                username=record.get('su'),
+                bot=bool(record.get('sb'))
+            )
+        else:
+            self._sender = None
+
+    async def get_chat(self):
+        return self._chat
+
+    async def get_sender(self):
+        return self._sender
+
+
+def prepare_config(records: List[Dict], forward_delay: Optional[float], archive: Optional[str] = None,
+                   sinks: Optional[List[str]] = None):
+    """为回放准备配置：使用占位凭据，监听录制中出现的所有群组，关闭录制；
+    归档只写入 archive 指定的文件，输出端只使用 sinks 指定的，不写入正式的归档数据库和下游系统"""
+    if not Config.API_ID:
+        Config.API_ID = 1
+    if not Config.API_HASH:
+        Config.API_HASH = 'replay'
+    if not Config.PHONE_NUMBER:
+        Config.PHONE_NUMBER = '+0'
+    if ':' not in Config.BOT_TOKEN:
+        Config.BOT_TOKEN = '1:replay'
+    Config.ENABLE_GROUP_FORWARD = True
+    Config.RECORD_UPDATES = False
+    Config.ENABLE_ARCHIVE = archive is not None
+    if archive is not None:
+        Config.ARCHIVE_FILE = archive
+    Config.OUTPUT_SINKS = list(sinks or [])
+    Config.MONITOR_GROUPS = sorted({str(record['c']) for record in records})
+    Config.MONITOR_GROUPS_RAW = list(Config.MONITOR_GROUPS)
+    if forward_delay is not None:
+        Config.FORWARD_DELAY = forward_delay
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def replay(records: List[Dict], speed: float, client: ReplayClient) -> Dict:
+    """按录制时间间隔（除以速度倍数）回放记录，返回统计结果"""
+    # 延迟导入，确保在 prepare_config 之后再创建接收器
+    from telegram_client import TelegramMessageReceiver
+
+    receiver = TelegramMessageReceiver(client=client, bot_client=client)
+    await receiver.ensure_bot_entity()
+    if receiver.diagnostics:
+        receiver.diagnostics.install(asyncio.get_running_loop())
+
+    # 送达延迟：从消息进入处理流程到送达机器人。启用公平调度或流水线重发时处理器只负责入队，
+    # 因此在转发完成时（record_forwarded）按消息计时，而不是在分发返回时
+    latencies: List[float] = []
+    scheduled: Dict[tuple, float] = {}
+    record_forwarded = receiver.record_forwarded
+
+    def record_delivery(record, mode):
+        scheduled_at = scheduled.pop((record.chat_id, record.message_id), None)
+        if scheduled_at is not None:
+            latencies.append(time.perf_counter() - scheduled_at)
+        record_forwarded(record, mode)
+
+    receiver.record_forwarded = record_delivery
+
+    async def run_one(event, scheduled_at):
+        scheduled[(event.chat_id, event.message.id)] = scheduled_at
+        await client.dispatch(event)
+
+    tasks = []
+    first_ts = records[0]['t']
+    started = time.perf_counter()
+    for index, record in enumerate(records):
+        if speed > 0:
+            target = started + (record['t'] - first_ts) / speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        elif index % 100 == 0:
+            # 最大速度模式下定期让出事件循环，避免饿死已创建的任务
+            await asyncio.sleep(0)
+
+        # 与Telethon一致：每个更新作为独立任务并发处理
+        event = ReplayEvent(record, client)
+        # 消息时间改为回放时刻，使端到端延迟（负载调节）反映回放中的积压
+        event.date = event.message.date = datetime.now(timezone.utc)
+        tasks.append(asyncio.create_task(run_one(event, time.perf_counter())))
+
+    await asyncio.gather(*tasks)
+    # 启用公平调度时处理器只负责入队，需要等待队列清空
+    if receiver.scheduler:
+        await receiver.scheduler.join()
+    # 流水线重发时同样需要等待流水线送达完毕
+    if receiver.resend_pipeline:
+        await receiver.resend_pipeline.join()
+    # 摘要模式：回放结束时发送尚未到时间的摘要
+    await receiver.digest.flush_all()
+    elapsed = time.perf_counter() - started
+    # 第一行为转发统计，单独输出
+    module_reports = receiver.format_stats_report()[1:]
+    await receiver.stop()
+
+    return {
+        'messages': len(records),
+        'elapsed': elapsed,
+        'throughput': len(records) / elapsed if elapsed else 0.0,
+        'latency_p50': percentile(latencies, 50),
+        'latency_p99': percentile(latencies, 99),
+        'delivered': len(latencies),
+        'forward_stats': dict(getattr(receiver, 'forward_stats', {})),
+        'api_calls': dict(client.calls),
+        'bytes_downloaded': client.bytes_downloaded,
+        'bytes_uploaded': client.bytes_uploaded,
+        'module_reports': module_reports,
+    }
+
+
+def print_report(result: Dict):
+    """打印回放统计"""
+    print(f"\n{'='*50}")
+    print("📊 回放结果")
+    print(f"   消息数: {result['messages']}")
+    print(f"   耗时: {result['elapsed']:.2f} 秒")
+    print(f"   吞吐量: {result['throughput']:.1f} 条/秒")
+    print(f"   送达延迟: p50 {result['latency_p50']*1000:.1f} ms, p99 {result['latency_p99']*1000:.1f} ms "
+          f"({result['delivered']} 条已送达)")
+    print(f"   转发统计: {result['forward_stats']}")
+    print(f"   API调用: {result['api_calls']}")
+    print(f"   下载/上传: {result['bytes_downloaded']/1024/1024:.1f} MB / "
+          f"{result['bytes_uploaded']/1024/1024:.1f} MB")
+    for line in result['module_reports']:
+        print(f"   {line}")
+    print(f"{'='*50}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='回放录制的更新日志，测量转发流程吞吐量')
+    parser.add_argument('log', help='录制日志文件 (RECORD_FILE)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='回放速度倍数，1=原速，0=最大速度 (默认: 1)')
+    parser.add_argument('--limit', type=int, default=0, help='最多回放的消息数，0=全部')
+    parser.add_argument('--api-latency', type=float, default=50,
+                        help='模拟的API调用延迟(毫秒，默认: 50)')
+    parser.add_argument('--bandwidth', type=float, default=10,
+                        help='模拟的上传/下载带宽(MB/s，0=不限，默认: 10)')
+    parser.add_argument('--forward-delay', type=float, default=None,
+                        help='覆盖 FORWARD_DELAY 配置(秒)')
+    parser.add_argument('--quiet', action='store_true', help='屏蔽逐条消息的控制台输出')
+    parser.add_argument('--log-level', default='WARNING', help='回放期间的日志级别 (默认: WARNING)')
+    parser.add_argument('--archive', default=None, help='同时将消息归档到指定的数据库文件（测量归档开销）')
+    parser.add_argument('--sink', action='append', default=[],
+                        help='同时推送到指定输出端，可重复（如 file:/tmp/out.ndjson、http://127.0.0.1:8080/）')
+    parser.add_argument('--loop', choices=LOOP_CHOICES, default=None,
+                        help='事件循环实现 (默认: EVENT_LOOP 配置)')
+    parser.add_argument('--json', action='store_true',
+                        help='以单行JSON输出结果（供 bench_event_loop.py 汇总）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """主函数"""
+    args = parse_args(argv)
+
+    if not os.path.exists(args.log):
+        print(f"❌ 录制日志不存在: {args.log}")
+        sys.exit(1)
+
+    records = list(read_records(args.log))
+    if args.limit:
+        records = records[:args.limit]
+    if not records:
+        print("❌ 录制日志为空")
+        sys.exit(1)
+
+    prepare_config(records, args.forward_delay, args.archive, args.sink)
+    client = ReplayClient(api_latency=args.api_latency / 1000, bandwidth=args.bandwidth)
+
+    loop_name = install_event_loop(args.loop or Config.EVENT_LOOP)
+    if not args.json:
+        speed_text = '最大速度' if args.speed <= 0 else f'{args.speed:g}×'
+        print(f"▶️ 回放 {len(records)} 条消息 ({speed_text})，来自 {len(Config.MONITOR_GROUPS)} 个群组，"
+              f"事件循环: {loop_name}")
+
+    # telegram_client 导入时会配置日志，这里在其之后调整级别
+    import telegram_client  # noqa: F401
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    with contextlib.ExitStack() as stack:
+        if args.quiet:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        result = asyncio.run(replay(records, args.speed, client))
+    result['loop'] = loop_name
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ import asyncio
 import sys
 from telethon import TelegramClient
 from config import Config
+from session_store import create_session
 
 async def request_verification_code():
     """请求验证码"""
@@ -21,7 +22,7 @@ async def request_verification_code():
             proxy = (Config.SOCKS_PROXY_HOST, Config.SOCKS_PROXY_PORT)
         
         client = TelegramClient(
-            Config.SESSION_NAME,
+            create_session(Config.SESSION_NAME),
             Config.API_ID,
             Config.API_HASH,
             proxy=proxy
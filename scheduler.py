@@ -0,0 +1,195 @@
+"""
+群组公平调度模块 - 每个来源群组一个队列，按优先级 + 加权差额轮询(DRR)送入转发流程
+
+高优先级群组有消息时优先处理；同一优先级内按权重分配发送机会，
+单个刷屏群组只会占满自己的队列，不会拖慢其他群组
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class GroupQueue:
+    """单个来源群组的队列及统计"""
+
+    __slots__ = ('key', 'weight', 'priority', 'items', 'deficit',
+                 'enqueued', 'served', 'dropped', 'total_wait', 'max_wait')
+
+    def __init__(self, key: str, weight: float, priority: int):
+        self.key = key
+        self.weight = weight
+        self.priority = priority
+        self.items: deque = deque()  # (入队时间, 任务)
+        self.deficit = 0.0
+        self.enqueued = 0
+        self.served = 0
+        self.dropped = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+
+class FairScheduler:
+    """按优先级和权重在各群组队列之间调度，由单个工作协程依次调用 handler"""
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]],
+                 max_queue_size: int = 1000, quantum: float = 1.0):
+        self.handler = handler
+        self.max_queue_size = max_queue_size
+        self.quantum = quantum
+        self.queues: Dict[str, GroupQueue] = {}
+        self.weights: Dict[str, float] = {}
+        self.priorities: Dict[str, int] = {}
+
+        # 每个优先级一个活跃队列环（只包含非空队列）
+        self._rings: Dict[int, deque] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._has_work = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker: Optional[asyncio.Task] = None
+
+    def configure(self, weights: Dict[str, float], priorities: Dict[str, int],
+                  resolve: Callable[[str, Dict], Any] = None):
+        """设置权重和优先级；resolve(key, mapping) 用于按群组的多种ID格式查找配置"""
+        self.weights = weights
+        self.priorities = priorities
+        if resolve is not None:
+            self._resolve = resolve
+        for queue in self.queues.values():
+            self._apply_settings(queue)
+        # 优先级可能变化，重建活跃环
+        self._rings = {}
+        for queue in self.queues.values():
+            if queue.items:
+                self._rings.setdefault(queue.priority, deque()).append(queue.key)
+
+    @staticmethod
+    def _resolve(key: str, mapping: Dict):
+        return mapping.get(key)
+
+    def _apply_settings(self, queue: GroupQueue):
+        weight = self._resolve(queue.key, self.weights)
+        priority = self._resolve(queue.key, self.priorities)
+        queue.weight = weight if weight and weight > 0 else 1.0
+        queue.priority = priority if priority is not None else 0
+
+    def submit(self, key: str, item) -> bool:
+        """将任务放入群组队列；队列已满时丢弃最旧的任务。返回是否发生了丢弃"""
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = GroupQueue(key, 1.0, 0)
+            self._apply_settings(queue)
+            self.queues[key] = queue
+
+        dropped = False
+        if len(queue.items) >= self.max_queue_size:
+            queue.items.popleft()
+            queue.dropped += 1
+            self._pending -= 1
+            dropped = True
+            logger.warning(f"⚠️ 群组 {key} 队列已满({self.max_queue_size})，丢弃最旧的消息")
+
+        if not queue.items:
+            self._rings.setdefault(queue.priority, deque()).append(key)
+        queue.items.append((time.monotonic(), item))
+        queue.enqueued += 1
+        self._pending += 1
+        self._idle.clear()
+        self._has_work.set()
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        return dropped
+
+    def _next(self):
+        """取出下一个任务：最高优先级的非空环内做差额轮询"""
+        level = max(priority for priority, ring in self._rings.items() if ring)
+        ring = self._rings[level]
+        while True:
+            queue = self.queues[ring[0]]
+            if queue.deficit < 1:
+                queue.deficit += self.quantum * queue.weight
+            if queue.deficit >= 1:
+                queue.deficit -= 1
+                enqueued_at, item = queue.items.popleft()
+                if not queue.items:
+                    # 队列清空后不保留差额，避免积攒突发配额
+                    queue.deficit = 0.0
+                    ring.popleft()
+                elif queue.deficit < 1:
+                    ring.rotate(-1)
+                return queue, enqueued_at, item
+            ring.rotate(-1)
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._has_work.clear()
+                self._idle.set()
+                await self._has_work.wait()
+                continue
+
+            queue, enqueued_at, item = self._next()
+            self._pending -= 1
+            wait = time.monotonic() - enqueued_at
+            queue.served += 1
+            queue.total_wait += wait
+            if wait > queue.max_wait:
+                queue.max_wait = wait
+
+            self._in_flight += 1
+            try:
+                await self.handler(item)
+            except Exception as e:
+                logger.error(f"❌ 调度任务处理失败 ({queue.key}): {e}")
+            finally:
+                self._in_flight -= 1
+
+    async def join(self):
+        """等待所有已提交的任务处理完成"""
+        while self._pending or self._in_flight:
+            await self._idle.wait()
+            await asyncio.sleep(0)
+
+    def depth(self) -> int:
+        return self._pending
+
+    async def stop(self, timeout: float = 10.0):
+        """等待已提交的任务处理完成（最多 timeout 秒），然后停止工作协程；超时未处理的任务被丢弃"""
+        if self._worker is None:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ 群组调度停止超时，丢弃 {self._pending + self._in_flight} 条未转发的消息")
+        self._worker.cancel()
+        await asyncio.gather(self._worker, return_exceptions=True)
+        self._worker = None
+
+    def stats(self) -> List[Dict]:
+        """各群组队列深度、等待时间等统计"""
+        return [{
+            'group': queue.key,
+            'weight': queue.weight,
+            'priority': queue.priority,
+            'depth': len(queue.items),
+            'served': queue.served,
+            'dropped': queue.dropped,
+            'avg_wait': queue.total_wait / queue.served if queue.served else 0.0,
+            'max_wait': queue.max_wait,
+        } for queue in self.queues.values()]
+
+    def format_stats(self) -> str:
+        """格式化调度统计，用于定期日志"""
+        parts = [
+            f"{s['group']}(P{s['priority']}/W{s['weight']:g}) 队列{s['depth']} "
+            f"平均等待{s['avg_wait']:.1f}s 最长{s['max_wait']:.1f}s 已发{s['served']}"
+            + (f" 丢弃{s['dropped']}" if s['dropped'] else "")
+            for s in sorted(self.stats(), key=lambda s: (-s['priority'], s['group']))
+        ]
+        return "⚖️ 群组调度: " + ("; ".join(parts) if parts else "无")
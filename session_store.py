@@ -0,0 +1,195 @@
+"""
+会话存储模块 - 内存缓存 + 批量落盘的 Telethon 会话后端
+
+默认的 SQLiteSession 在收到更新时逐条写入实体和更新状态，在小容量VPS磁盘上
+会产生大量 fsync。BufferedSQLiteSession 将实体和更新状态保存在内存中，
+按固定间隔（或关闭时）批量写入 WAL 模式的同一个 .session 文件，文件格式与默认会话兼容。
+"""
+import datetime
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from telethon import utils
+from telethon.sessions import SQLiteSession
+from telethon.tl import types
+from telethon.tl.types import PeerUser, PeerChat, PeerChannel
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 实体行: (id, hash, username, phone, name)
+EntityRow = Tuple[int, int, Optional[str], Optional[int], Optional[str]]
+
+
+class BufferedSQLiteSession(SQLiteSession):
+    """实体和更新状态常驻内存、定期批量写入 WAL 文件的会话"""
+
+    def __init__(self, session_id=None, flush_interval: float = 30):
+        # 父类构造函数会调用 _cursor()，这些属性需要提前准备好
+        self.flush_interval = flush_interval
+        self._entity_rows: Dict[int, EntityRow] = {}
+        self._by_username: Dict[str, int] = {}
+        self._by_phone: Dict[int, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._state_cache: Dict[int, types.updates.State] = {}
+        self._dirty_entities: Dict[int, EntityRow] = {}
+        self._dirty_states: Dict[int, types.updates.State] = {}
+        self._session_dirty = False
+        self._last_flush = time.monotonic()
+
+        # 刷盘统计
+        self.flush_count = 0
+        self.flush_total = 0.0
+        self.flush_max = 0.0
+        self.flush_last = 0.0
+
+        super().__init__(session_id)
+        self._load()
+
+    def _cursor(self):
+        """首次连接时切换到 WAL 模式：提交时只追加日志，崩溃后可自动恢复"""
+        first_connect = self._conn is None
+        cursor = super()._cursor()
+        if first_connect and self.filename != ':memory:':
+            cursor.execute('pragma journal_mode=wal')
+            cursor.execute('pragma synchronous=normal')
+        return cursor
+
+    def _load(self):
+        """启动时将已有实体和更新状态读入内存"""
+        c = self._cursor()
+        try:
+            for row in c.execute('select id, hash, username, phone, name from entities'):
+                self._index_entity(row)
+            for entity_id, pts, qts, date, seq in c.execute(
+                    'select id, pts, qts, date, seq from update_state'):
+                self._state_cache[entity_id] = types.updates.State(
+                    pts=pts, qts=qts,
+                    date=datetime.datetime.fromtimestamp(date, tz=datetime.timezone.utc),
+                    seq=seq, unread_count=0
+                )
+        finally:
+            c.close()
+        logger.debug(f"💾 会话已载入内存: {len(self._entity_rows)} 个实体, {len(self._state_cache)} 个更新状态")
+
+    def _index_entity(self, row: EntityRow):
+        entity_id, _, username, phone, name = row
+        self._entity_rows[entity_id] = row
+        if username:
+            self._by_username[username] = entity_id
+        if phone:
+            self._by_phone[phone] = entity_id
+        if name:
+            self._by_name[name] = entity_id
+
+    def _lookup(self, entity_id: Optional[int]):
+        row = self._entity_rows.get(entity_id) if entity_id is not None else None
+        return (row[0], row[1]) if row else None
+
+    # 会话表（DC、授权密钥）变更很少，但必须尽快持久化
+
+    def _update_session_table(self):
+        super()._update_session_table()
+        self._session_dirty = True
+
+    # 实体：写入内存并标记待刷盘
+
+    def process_entities(self, tlo):
+        if not self.save_entities:
+            return
+        for row in self._entities_to_rows(tlo):
+            if self._entity_rows.get(row[0]) != row:
+                self._index_entity(row)
+                self._dirty_entities[row[0]] = row
+
+    def get_entity_rows_by_phone(self, phone):
+        return self._lookup(self._by_phone.get(phone))
+
+    def get_entity_rows_by_username(self, username):
+        return self._lookup(self._by_username.get(username))
+
+    def get_entity_rows_by_name(self, name):
+        return self._lookup(self._by_name.get(name))
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        if exact:
+            return self._lookup(id)
+        for peer in (PeerUser(id), PeerChat(id), PeerChannel(id)):
+            row = self._lookup(utils.get_peer_id(peer))
+            if row:
+                return row
+        return None
+
+    # 更新状态
+
+    def get_update_state(self, entity_id):
+        return self._state_cache.get(entity_id)
+
+    def set_update_state(self, entity_id, state):
+        self._state_cache[entity_id] = state
+        self._dirty_states[entity_id] = state
+
+    def get_update_states(self):
+        return list(self._state_cache.items())
+
+    # 刷盘
+
+    def save(self):
+        """Telethon 在多处调用 save()：会话表变更立即提交，其余按间隔批量写入"""
+        if self._session_dirty or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """在一个事务中写入所有待刷盘的实体和更新状态"""
+        self._last_flush = time.monotonic()
+        if not (self._dirty_entities or self._dirty_states or self._session_dirty):
+            return
+
+        started = time.perf_counter()
+        entities, self._dirty_entities = self._dirty_entities, {}
+        states, self._dirty_states = self._dirty_states, {}
+
+        c = self._cursor()
+        try:
+            if entities:
+                now = int(time.time())
+                c.executemany('insert or replace into entities values (?,?,?,?,?,?)',
+                              [row + (now,) for row in entities.values()])
+            if states:
+                c.executemany('insert or replace into update_state values (?,?,?,?,?)',
+                              [(entity_id, state.pts, state.qts, state.date.timestamp(), state.seq)
+                               for entity_id, state in states.items()])
+        finally:
+            c.close()
+        self._conn.commit()
+        self._session_dirty = False
+
+        elapsed = time.perf_counter() - started
+        self.flush_count += 1
+        self.flush_total += elapsed
+        self.flush_max = max(self.flush_max, elapsed)
+        self.flush_last = elapsed
+        logger.debug(f"💾 会话刷盘: {len(entities)} 个实体, {len(states)} 个更新状态, "
+                     f"耗时 {elapsed*1000:.1f}ms")
+
+    def close(self):
+        if self.filename != ':memory:' and self._conn is not None:
+            self.flush()
+        super().close()
+
+    def format_stats(self) -> str:
+        """格式化刷盘延迟统计，用于定期日志"""
+        if not self.flush_count:
+            return f"💾 会话 {self.filename}: 尚未刷盘"
+        return (f"💾 会话 {self.filename}: 刷盘 {self.flush_count} 次, "
+                f"平均 {self.flush_total/self.flush_count*1000:.1f}ms, "
+                f"最近 {self.flush_last*1000:.1f}ms, 最大 {self.flush_max*1000:.1f}ms")
+
+
+def create_session(name: str):
+    """根据 SESSION_BACKEND 配置创建会话：sqlite 返回会话名（Telethon默认），buffered 返回批量写入会话"""
+    if Config.SESSION_BACKEND == 'buffered':
+        return BufferedSQLiteSession(name, flush_interval=Config.SESSION_FLUSH_INTERVAL)
+    return name
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+输出端模块 - 除了转发给机器人，把通过过滤的消息以 NDJSON（每行一个 JSON）推送给下游系统
+
+内置三种输出端（OUTPUT_SINKS 中逗号分隔，可同时启用多个）:
+    unix:/run/tg/messages.sock      连接到下游监听的 Unix socket，按行写入
+    file:messages.ndjson            追加写入本地文件，超过大小后轮转（.1 .2 ...）
+    http://127.0.0.1:8080/ingest    批量 POST（Content-Type: application/x-ndjson）
+
+每个输出端有独立的有界队列和后台发送任务：转发流程只把消息放入队列，不等待下游；
+下游变慢或不可用时，发送失败的批次按退避间隔重试，队列满后丢弃新消息并计数，不影响转发。
+
+直接运行本文件可启动本地的测试接收端:
+    python sinks.py http --port 8080 --delay 0.5
+    python sinks.py unix /tmp/tg-messages.sock
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# 发送失败后的重试间隔(秒)，每次翻倍，不超过上限
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+_STOP = object()
+
+
+class SinkError(Exception):
+    """下游拒绝了一批消息（如 HTTP 非 2xx 响应）"""
+
+
+def encode_record(record) -> bytes:
+    """消息记录编码为一行 JSON（所有输出端共用同一份编码结果）"""
+    return json.dumps({
+        'chat_id': record.chat_id,
+        'chat_title': record.chat_title,
+        'message_id': record.message_id,
+        'date': record.date.isoformat(),
+        'sender_id': record.sender_id,
+        'sender_name': record.sender_name,
+        'text': record.text,
+        'media': record.media_kind,
+        'file_name': record.file_name,
+        'file_size': record.media_size if record.has_file else None,
+        'grouped_id': record.grouped_id,
+        'is_forward': record.is_forward,
+        'notice': record.notice,
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+class OutputSink:
+    """输出端基类：有界队列 + 后台任务按批发送，子类实现 write/disconnect"""
+
+    kind = 'sink'
+
+    def __init__(self, target: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue_size: int = 10000, timeout: float = 10.0, max_retries: int = 3):
+        self.target = target
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+        # 队列和发送任务在第一条消息到达时于运行中的事件循环里创建
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # 下游不可用期间只在开始和恢复时记录日志
+        self._failing = False
+
+        self.sent = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.send_time = 0.0
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.target}"
+
+    def submit(self, line: bytes):
+        """放入发送队列（不阻塞）；队列已满时丢弃并计数"""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        try:
+            self._queue.put_nowait(line)
+        except asyncio.QueueFull:
+            if not self.dropped:
+                logger.warning(f"⚠️ 输出 {self.name} 的队列已满({self.max_queue_size})，开始丢弃新消息")
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            stop = await self._collect(batch)
+            await self._deliver(batch)
+            if stop:
+                break
+
+    async def _collect(self, batch: List[bytes]) -> bool:
+        """收集一批消息：直到达到批量大小或距第一条消息超过发送间隔。返回是否收到停止信号"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if self._queue.empty():
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    return False
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    return False
+            else:
+                item = self._queue.get_nowait()
+            if item is _STOP:
+                return True
+            batch.append(item)
+        return False
+
+    async def _deliver(self, batch: List[bytes]):
+        """发送一批消息，失败时断开连接并按退避间隔重试，超过重试次数后丢弃该批"""
+        data = b''.join(batch)
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(self.write(data, len(batch)), self.timeout)
+                self.sent += len(batch)
+                self.batches += 1
+                self.send_time += time.perf_counter() - started
+                if self._failing:
+                    self._failing = False
+                    logger.info(f"✅ 输出 {self.name} 已恢复")
+                return
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                await self._safe_disconnect()
+
+            if attempt == self.max_retries:
+                self.failed += len(batch)
+                logger.error(f"❌ 输出 {self.name} 发送失败，丢弃 {len(batch)} 条消息: {error}")
+                return
+            self.retries += 1
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)
+            if not self._failing:
+                self._failing = True
+                logger.warning(f"⚠️ 输出 {self.name} 发送失败，{delay:.0f}s 后重试: {error}")
+            await asyncio.sleep(delay)
+
+    async def _safe_disconnect(self):
+        try:
+            await self.disconnect()
+        except Exception as e:
+            logger.debug(f"断开输出 {self.name} 时出错: {e}")
+
+    async def write(self, data: bytes, count: int):
+        """发送一批已编码的消息（count 为其中的消息条数）"""
+        raise NotImplementedError
+
+    async def disconnect(self):
+        """关闭连接或文件（下次发送时重新建立）"""
+
+    async def close(self, timeout: float = 5.0):
+        """发送队列中剩余的消息并停止后台任务，超时后放弃剩余消息"""
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._queue.put(_STOP), timeout)
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ 输出 {self.name} 关闭超时，放弃 {self._queue.qsize()} 条未发送的消息")
+                self._task.cancel()
+            self._task = None
+        await self._safe_disconnect()
+
+    def format_stats(self) -> str:
+        """格式化输出端统计，用于定期日志"""
+        average = self.send_time / self.batches * 1000 if self.batches else 0.0
+        queued = self._queue.qsize() if self._queue else 0
+        return (f"📤 输出 {self.name}: 已发送 {self.sent} 条 ({self.batches} 批, 平均每批 {average:.1f}ms), "
+                f"队列 {queued}"
+                + (f", 重试 {self.retries}" if self.retries else "")
+                + (f", 丢弃 {self.dropped}" if self.dropped else "")
+                + (f", 失败 {self.failed}" if self.failed else ""))
+
+
+class UnixSocketSink(OutputSink):
+    """按行写入下游监听的 Unix socket（断开后下一批重新连接）"""
+
+    kind = 'unix'
+
+    def __init__(self, path: str, **options):
+        super().__init__(path, **options)
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def write(self, data: bytes, count: int):
+        if self._writer is None:
+            _, self._writer = await asyncio.open_unix_connection(self.target)
+        self._writer.write(data)
+        # 下游读取过慢时 drain 等待到超时，该批按失败重试，不阻塞转发
+        await self._writer.drain()
+
+    async def disconnect(self):
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+            await writer.wait_closed()
+
+
+class FileSink(OutputSink):
+    """追加写入本地文件，超过 max_bytes 时轮转为 .1 .2 ...（保留 backup_count 个）"""
+
+    kind = 'file'
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, backup_count: int = 5, **options):
+        super().__init__(path, **options)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.rotations = 0
+        self._file = None
+        # 所有文件操作在同一个专用线程中按顺序执行：写入超时后线程中的写入仍在进行，
+        # 之后的关闭/重新打开排在它后面，不会与它同时操作文件
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='file-sink')
+
+    async def write(self, data: bytes, count: int):
+        # 磁盘写入在线程中进行，不阻塞事件循环
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write_sync, data)
+
+    def _write_sync(self, data: bytes):
+        if self._file is None:
+            self._file = open(self.target, 'ab')
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count:
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.target}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.target}.{i + 1}")
+            os.replace(self.target, f"{self.target}.1")
+            self._file = open(self.target, 'ab')
+        else:
+            self._file = open(self.target, 'wb')
+        self.rotations += 1
+
+    async def disconnect(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close_sync)
+
+    def _close_sync(self):
+        file, self._file = self._file, None
+        if file is not None:
+            file.close()
+
+    async def close(self, timeout: float = 5.0):
+        await super().close(timeout)
+        self._executor.shutdown(wait=False)
+
+    def format_stats(self) -> str:
+        return super().format_stats() + (f", 轮转 {self.rotations} 次" if self.rotations else "")
+
+
+class HttpSink(OutputSink):
+    """每批消息一个 HTTP POST 请求（保持连接复用，非 2xx 响应按失败重试）"""
+
+    kind = 'http'
+
+    def __init__(self, url: str, **options):
+        super().__init__(url, **options)
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ValueError(f"无效的 HTTP 输出地址: {url}")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = parts.scheme == 'https'
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.host_header = parts.netloc.rpartition('@')[2]
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def name(self) -> str:
+        return self.target
+
+    async def write(self, data: bytes, count: int):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        head = (f"POST {self.path} HTTP/1.1\r\n"
+                f"Host: {self.host_header}\r\n"
+                f"Content-Type: application/x-ndjson\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"X-Message-Count: {count}\r\n"
+                f"Connection: keep-alive\r\n\r\n")
+        self._writer.write(head.encode('latin-1') + data)
+        await self._writer.drain()
+
+        status, keep_alive = await self._read_response()
+        if not keep_alive:
+            await self.disconnect()
+        if not 200 <= status < 300:
+            raise SinkError(f"HTTP {status}")
+
+    async def _read_response(self):
+        """读取响应，返回状态码和连接能否复用"""
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("连接已被对方关闭")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip().lower()
+
+        keep_alive = headers.get('connection') != 'close'
+        if 'content-length' in headers:
+            await self._reader.readexactly(int(headers['content-length']))
+        elif status not in (204, 304):
+            # 分块或未声明长度的响应体不解析，关闭连接
+            keep_alive = False
+        return status, keep_alive
+
+    async def disconnect(self):
+        writer, self._writer, self._reader = self._writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+def create_sinks(specs: Sequence[str], batch_size: int = 100, flush_interval: float = 1.0,
+                 max_queue_size: int = 10000, timeout: float = 10.0,
+                 file_max_bytes: int = 100 * 1024 * 1024, file_backups: int = 5) -> List[OutputSink]:
+    """按配置创建输出端，格式: unix:路径 / file:路径 / http(s)://地址"""
+    options = dict(batch_size=batch_size, flush_interval=flush_interval,
+                   max_queue_size=max_queue_size, timeout=timeout)
+    sinks = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        if spec.startswith(('http://', 'https://')):
+            sinks.append(HttpSink(spec, **options))
+        elif spec.startswith('unix:'):
+            sinks.append(UnixSocketSink(spec[len('unix:'):], **options))
+        elif spec.startswith('file:'):
+            sinks.append(FileSink(spec[len('file:'):], max_bytes=file_max_bytes,
+                                  backup_count=file_backups, **options))
+        else:
+            raise ValueError(f"无法识别的输出端配置: {spec}（应为 unix:路径、file:路径 或 http(s)://地址）")
+    return sinks
+
+
+class StubStats:
+    """测试接收端的计数"""
+
+    def __init__(self):
+        self.messages = 0
+        self.requests = 0
+        self.started = time.monotonic()
+
+    def add(self, count: int, label: str, quiet: bool):
+        self.messages += count
+        self.requests += 1
+        if not quiet:
+            rate = self.messages / max(time.monotonic() - self.started, 1e-9)
+            print(f"📥 {label}: {count} 条 (累计 {self.messages} 条, {rate:.1f} 条/秒)")
+
+
+async def serve_http(host: str, port: int, delay: float, status: int, quiet: bool):
+    """测试用 HTTP 接收端：接收 NDJSON 批量 POST，可模拟慢速下游和错误响应"""
+    stats = StubStats()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    key, _, value = line.decode('latin-1').partition(':')
+                    if key.strip().lower() == 'content-length':
+                        length = int(value)
+                body = await reader.readexactly(length)
+                if delay:
+                    await asyncio.sleep(delay)
+                count = body.count(b'\n')
+                stats.add(count, request_line.decode('latin-1').strip(), quiet)
+                writer.write(f"HTTP/1.1 {status} Stub\r\nContent-Length: 0\r\n\r\n".encode('latin-1'))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"🧪 HTTP 测试接收端: http://{host}:{port}/ (响应 {status}, 延迟 {delay}s)")
+    async with server:
+        await server.serve_forever()
+
+
+async def serve_unix(path: str, delay: float, quiet: bool):
+    """测试用 Unix socket 接收端：逐行读取 NDJSON，可模拟慢速下游"""
+    stats = StubStats()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if delay:
+                    await asyncio.sleep(delay)
+                message = json.loads(line)
+                stats.add(1, f"{message['chat_title']} #{message['message_id']}", quiet)
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(handle, path)
+    print(f"🧪 Unix socket 测试接收端: {path} (每行延迟 {delay}s)")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='输出端的本地测试接收端')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    http_parser = commands.add_parser('http', help='HTTP 接收端')
+    http_parser.add_argument('--host', default='127.0.0.1', help='监听地址 (默认: 127.0.0.1)')
+    http_parser.add_argument('--port', type=int, default=8080, help='监听端口 (默认: 8080)')
+    http_parser.add_argument('--status', type=int, default=200, help='响应状态码，用于测试失败重试 (默认: 200)')
+
+    unix_parser = commands.add_parser('unix', help='Unix socket 接收端')
+    unix_parser.add_argument('path', help='socket 路径')
+
+    for sub in (http_parser, unix_parser):
+        sub.add_argument('--delay', type=float, default=0.0, help='每次处理前的延迟(秒)，模拟慢速下游')
+        sub.add_argument('--quiet', action='store_true', help='不打印每次接收')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """测试接收端主函数"""
+    args = parse_args(argv)
+    try:
+        if args.command == 'http':
+            asyncio.run(serve_http(args.host, args.port, args.delay, args.status, args.quiet))
+        else:
+            asyncio.run(serve_unix(args.path, args.delay, args.quiet))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
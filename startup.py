@@ -0,0 +1,98 @@
+"""
+启动编排模块 - 按依赖关系并发执行启动阶段，并记录每个阶段的耗时
+
+每个阶段在其依赖全部完成后立即开始，没有依赖关系的阶段（如用户客户端和
+机器人客户端的登录）同时进行；依赖失败的阶段跳过，不影响其他分支
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class StartupPhase:
+    """一个启动阶段及其耗时"""
+
+    __slots__ = ('name', 'label', 'func', 'deps', 'task', 'started', 'finished', 'error', 'skipped')
+
+    def __init__(self, name: str, label: str, func: Callable[[], Awaitable], deps: Sequence[str]):
+        self.name = name
+        self.label = label
+        self.func = func
+        self.deps = tuple(deps)
+        self.task: Optional[asyncio.Task] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self.skipped = False
+
+    @property
+    def ok(self) -> bool:
+        return self.finished is not None and self.error is None and not self.skipped
+
+
+class StartupGraph:
+    """启动阶段的依赖图"""
+
+    def __init__(self):
+        self.phases: Dict[str, StartupPhase] = {}
+        self.started_at: Optional[float] = None
+
+    def add(self, name: str, label: str, func: Callable[[], Awaitable], deps: Sequence[str] = ()):
+        """添加阶段；依赖的阶段必须已经添加（保证没有循环依赖）"""
+        missing = [dep for dep in deps if dep not in self.phases]
+        if missing:
+            raise ValueError(f"启动阶段 {name} 依赖未定义的阶段: {', '.join(missing)}")
+        self.phases[name] = StartupPhase(name, label, func, deps)
+
+    async def run(self):
+        """并发执行所有阶段，等待全部完成（阶段失败不会抛出，通过 failed/error 查询）"""
+        self.started_at = time.perf_counter()
+        for phase in self.phases.values():
+            phase.task = asyncio.create_task(self._run_phase(phase))
+        await asyncio.gather(*(phase.task for phase in self.phases.values()))
+
+    async def _run_phase(self, phase: StartupPhase) -> bool:
+        for dep in phase.deps:
+            if not await self.phases[dep].task:
+                phase.skipped = True
+                return False
+
+        phase.started = time.perf_counter()
+        try:
+            await phase.func()
+            return True
+        except Exception as e:
+            phase.error = e
+            logger.error(f"❌ 启动阶段 [{phase.label}] 失败: {e}")
+            return False
+        finally:
+            phase.finished = time.perf_counter()
+
+    def failed(self, name: str) -> bool:
+        phase = self.phases.get(name)
+        return phase is not None and not phase.ok
+
+    def first_error(self, names: Sequence[str]) -> Optional[BaseException]:
+        """按给定顺序返回第一个失败阶段的异常"""
+        for name in names:
+            phase = self.phases.get(name)
+            if phase is not None and phase.error is not None:
+                return phase.error
+        return None
+
+    def format_report(self) -> str:
+        """各阶段的开始时刻和耗时（相对启动开始），用于启动日志"""
+        parts = []
+        finished = [phase.finished for phase in self.phases.values() if phase.finished is not None]
+        total = max(finished) - self.started_at if finished else 0.0
+        for phase in sorted(self.phases.values(), key=lambda p: p.started or float('inf')):
+            if phase.skipped:
+                parts.append(f"{phase.label} 跳过")
+                continue
+            offset = phase.started - self.started_at
+            status = " 失败" if phase.error is not None else ""
+            parts.append(f"{phase.label} {phase.finished - phase.started:.2f}s (+{offset:.2f}s){status}")
+        return f"🚀 启动耗时 {total:.2f}s: " + "; ".join(parts)
@@ -7,12 +7,29 @@ import time
 import hashlib
 from datetime import datetime
 from typing import Dict, Set, Optional, List
-from collections import defaultdict
+from collections import defaultdict, deque
 
 from telethon import TelegramClient, events
-from telethon.errors import SessionPasswordNeededError, FloodWaitError, PhoneCodeInvalidError
-from telethon.tl.types import User, Chat, Channel
+from telethon.errors import SessionPasswordNeededError, FloodWaitError, PhoneCodeInvalidError, RPCError
+from telethon.tl.types import Chat, Channel
 from config import Config
+from update_log import UpdateRecorder
+from diagnostics import Diagnostics
+from session_store import BufferedSQLiteSession, create_session
+from config_reload import ConfigReloader
+from renderer import MessageRenderer
+from scheduler import FairScheduler
+from forward_mode import AdaptiveModeSelector, DIRECT, REFERENCE, RESEND, MODE_NAMES
+from pipeline import StagePipeline, ResendJob
+from digest import DigestCollector, DigestEntry, GroupDigest, make_snippet, MEDIA_LABELS
+from event_loop import install_event_loop
+from archive import MessageArchive, FORWARDED, FILTERED, DIGESTED, SHED, FAILED
+from load_shedder import LoadShedder, DROP_STICKERS, MEDIA_DIRECT, TEXT_ONLY, DIGEST_ONLY
+from records import MessageRecord
+from startup import StartupGraph
+from dc_pool import MediaSenderPool
+from sinks import create_sinks, encode_record
+from analytics import TrafficAnalytics
 
 # 设置日志
 logging.basicConfig(
@@ -28,25 +45,100 @@ logger = logging.getLogger(__name__)
 class TelegramMessageReceiver:
     """Telegram消息接收器（集成群组转发功能）"""
     
-    def __init__(self):
-        """初始化客户端"""
+    # 启用诊断时统计耗时的流程函数
+    PIPELINE_STAGES = (
+        'is_monitored_group',
+        'handle_new_message',
+        'handle_forward_message',
+        'should_forward_message',
+        'forward_message_to_bot',
+        'download_and_resend_message',
+        'direct_forward_message',
+        'send_message_content_to_bot',
+    )
+    
+    def __init__(self, client=None, bot_client=None):
+        """初始化客户端
+        
+        client/bot_client 可传入替代客户端（如 replay.py 的本地回放客户端），
+        默认创建真实的 TelegramClient
+        """
         # 验证配置
         Config.validate()
         
         # 创建客户端
-        self.client = TelegramClient(
-            Config.SESSION_NAME,
+        self.client = client or TelegramClient(
+            create_session(Config.SESSION_NAME),
             Config.API_ID,
             Config.API_HASH
         )
         
+        # 诊断（未启用时不包装任何方法，没有额外开销）
+        # 在创建调度器等组件之前包装，组件保存的方法引用也是计时后的版本
+        self.diagnostics = None
+        if Config.ENABLE_DIAGNOSTICS:
+            self.diagnostics = Diagnostics(
+                slow_callback_ms=Config.SLOW_CALLBACK_MS,
+                profile_dir=Config.PROFILE_DIR,
+                profile_mode=Config.PROFILE_MODE,
+                profile_duration=Config.PROFILE_DURATION
+            )
+            self.diagnostics.instrument(self, self.PIPELINE_STAGES)
+        
         # 初始化转发功能
-        self.init_forward_feature()
+        self.init_forward_feature(bot_client)
+        
+        # 更新录制（用于回放压测）
+        self.recorder = None
+        if Config.RECORD_UPDATES:
+            self.recorder = UpdateRecorder(Config.RECORD_FILE, Config.RECORD_ANONYMIZE)
+        
+        # 消息归档（后台线程批量写入）
+        self.archive = None
+        if Config.ENABLE_ARCHIVE and self.forward_enabled:
+            self.archive = MessageArchive(
+                Config.ARCHIVE_FILE,
+                batch_size=Config.ARCHIVE_BATCH_SIZE,
+                flush_interval=Config.ARCHIVE_FLUSH_INTERVAL,
+                max_queue_size=Config.ARCHIVE_QUEUE_SIZE
+            )
+        
+        # 输出端（通过过滤的消息推送给下游系统，各自后台批量发送）
+        self.output_sinks = []
+        if Config.OUTPUT_SINKS and self.forward_enabled:
+            self.output_sinks = create_sinks(
+                Config.OUTPUT_SINKS,
+                batch_size=Config.SINK_BATCH_SIZE,
+                flush_interval=Config.SINK_FLUSH_INTERVAL,
+                max_queue_size=Config.SINK_QUEUE_SIZE,
+                timeout=Config.SINK_TIMEOUT,
+                file_max_bytes=int(Config.SINK_FILE_MAX_MB * 1024 * 1024),
+                file_backups=Config.SINK_FILE_BACKUPS
+            )
+            logger.info(f"📤 输出端已启用: {', '.join(sink.name for sink in self.output_sinks)}")
+        
+        # 流量分析（统计所有收到的消息，包括被过滤的）
+        self.analytics = None
+        if Config.ENABLE_ANALYTICS and self.forward_enabled:
+            self.analytics = TrafficAnalytics(
+                top_k=Config.ANALYTICS_TOP_K,
+                rate_window=Config.ANALYTICS_RATE_WINDOW,
+                dump_file=Config.ANALYTICS_DUMP_FILE
+            )
+        
+        # 媒体DC连接池（启动时创建）
+        self.dc_pool = None
+        
+        # 启动期间的消息缓冲区（None 表示不在启动过程中，消息直接处理）
+        self.startup_buffer: Optional[deque] = None
+        self.startup_dropped = 0
+        # 启动开始时刻，用于统计启动到首条消息转发的耗时
+        self.startup_started: Optional[float] = None
         
         # 注册事件处理器
         self.register_handlers()
         
-    def init_forward_feature(self):
+    def init_forward_feature(self, bot_client=None):
         """初始化群组转发功能"""
         # 检查是否启用转发功能
         if Config.ENABLE_GROUP_FORWARD:
@@ -55,8 +147,8 @@ class TelegramMessageReceiver:
                 Config.validate_forward_config()
                 
                 # 创建机器人客户端
-                self.bot_client = TelegramClient(
-                    'bot_session',
+                self.bot_client = bot_client or TelegramClient(
+                    create_session('bot_session'),
                     Config.API_ID,
                     Config.API_HASH
                 )
@@ -67,15 +159,61 @@ class TelegramMessageReceiver:
                 # 群组信息缓存
                 self.group_cache: Dict[str, str] = {}
                 
+                # 预编译的消息前缀渲染器
+                self.renderer = MessageRenderer.from_config()
+                
+                # 自适应转发模式选择器
+                self.mode_selector = None
+                if Config.ADAPTIVE_FORWARD:
+                    self.enable_adaptive_forward()
+                
+                # 摘要模式收集器（DIGEST_GROUPS 中的群组）
+                self.digest = DigestCollector(self.send_digest, self.render_digest_header)
+                
+                # 负载调节器
+                self.load_shedder = None
+                if Config.ENABLE_LOAD_SHEDDING:
+                    self.enable_load_shedding()
+                
+                # 下载重发流水线（首次使用时创建）
+                self.resend_pipeline = None
+                
+                # 群组ID -> @用户名（验证群组时记录，用于按用户名配置的群组参数）
+                self.group_usernames: Dict[str, str] = {}
+                
+                # 群组ID -> 所在DC（根据群组头像的存储位置，用于预热媒体DC连接）
+                self.group_dcs: Dict[str, int] = {}
+                
+                # 配置中的群组写法 -> 实际ID（热加载 MONITOR_GROUPS 时只解析新增的群组）
+                self.resolved_groups: Dict[str, str] = {}
+                self.group_reload_task: Optional[asyncio.Task] = None
+                
+                # 群组公平调度器
+                self.scheduler = None
+                if Config.ENABLE_FAIR_SCHEDULER:
+                    self.scheduler = FairScheduler(
+                        self.forward_message_to_bot,
+                        max_queue_size=Config.GROUP_QUEUE_SIZE
+                    )
+                    self.scheduler.configure(
+                        Config.GROUP_WEIGHTS, Config.GROUP_PRIORITIES, self.lookup_group_setting
+                    )
+                
                 # 统计信息
                 self.forward_stats = {
                     'messages_received': 0,
                     'messages_forwarded': 0,
                     'messages_filtered': 0,
+                    'messages_digested': 0,
+                    'messages_shed': 0,
                     'errors': 0
                 }
                 
                 self.forward_enabled = True
+                
+                # 监听群组匹配索引
+                self.rebuild_monitor_index()
+                
                 logger.info("✅ 群组转发功能初始化完成")
                 
             except Exception as e:
@@ -103,6 +241,10 @@ class TelegramMessageReceiver:
                 
                 is_monitored = await self.is_monitored_group(event)
                 if is_monitored:
+                    # 录制原始更新（在过滤之前，保证回放时流量构成一致）
+                    if self.recorder:
+                        await self.recorder.record(event)
+                    
                     # 只有监听的群组才处理和显示消息
                     await self.handle_new_message(event)
                     await self.handle_forward_message(event)
@@ -123,65 +265,142 @@ class TelegramMessageReceiver:
             else:
                 await self.handle_edited_message(event)
     
+    def enable_adaptive_forward(self):
+        """创建自适应转发模式选择器"""
+        self.mode_selector = AdaptiveModeSelector(
+            failure_threshold=Config.BREAKER_FAILURES,
+            cooldown=Config.BREAKER_COOLDOWN
+        )
+        self.mode_selector.install_flood_monitor()
+        logger.info("🧭 自适应转发模式已启用")
+    
+    def enable_load_shedding(self):
+        """创建负载调节器"""
+        self.load_shedder = LoadShedder(
+            Config.SHED_LAG_THRESHOLDS,
+            recovery_ratio=Config.SHED_RECOVERY_RATIO,
+            min_dwell=Config.SHED_MIN_DWELL
+        )
+        logger.info(f"🚦 负载调节已启用 (延迟阈值: {', '.join(f'{t:g}s' for t in Config.SHED_LAG_THRESHOLDS)})")
+    
+    def rebuild_monitor_index(self):
+        """根据当前 MONITOR_GROUPS 重建群组匹配索引，整体替换以保证匹配过程看到一致的索引"""
+        keys = set()
+        for monitor_group in Config.MONITOR_GROUPS:
+            monitor_group = str(monitor_group).strip()
+            if monitor_group.startswith('@'):
+                # 用户名格式（不区分大小写）
+                keys.add(monitor_group.lower())
+                continue
+            keys.add(monitor_group)
+            # 超级群组格式：同时登记去掉 -100 前缀的原始ID
+            if monitor_group.startswith('-100'):
+                keys.add(monitor_group[4:])
+        
+        self.monitor_index = frozenset(keys)
+        self.monitor_has_usernames = any(key.startswith('@') for key in keys)
+        logger.debug(f"🗂️ 群组匹配索引已更新: {sorted(self.monitor_index)}")
+    
     async def is_monitored_group(self, event):
         """检查是否为监听的群组"""
         if not self.forward_enabled:
             return False
             
         try:
-            # 获取聊天ID和群组信息
             chat_id = event.chat_id
-            chat = await event.get_chat()
-            
-            # 添加详细调试日志
-            chat_title = getattr(chat, 'title', 'Unknown')
-            logger.debug(f"🔍 检查群组匹配 - 当前: {chat_title} (ID: {chat_id}), 配置: {Config.MONITOR_GROUPS}")
-            
-            # 检查群组ID是否匹配（支持多种格式）
-            for monitor_group in Config.MONITOR_GROUPS:
-                monitor_group = str(monitor_group).strip()
-                
-                # 方式1: 直接匹配chat_id（最常见）
-                if str(monitor_group) == str(chat_id):
-                    logger.debug(f"✅ 群组ID直接匹配: {monitor_group} == {chat_id}")
-                    return True
-                
-                # 方式2: 匹配绝对值（处理正负号差异）
-                if str(monitor_group) == str(abs(chat_id)):
-                    logger.debug(f"✅ 群组ID绝对值匹配: {monitor_group} == {abs(chat_id)}")
-                    return True
-                
-                # 方式3: 超级群组格式匹配 (-100 前缀)
-                if str(chat_id).startswith('-100'):
-                    # 提取超级群组的原始ID (移除-100前缀)
-                    original_id = str(chat_id)[4:]  # 移除-100前缀
-                    if str(monitor_group) == original_id:
-                        logger.debug(f"✅ 超级群组ID匹配: {monitor_group} == {original_id} (来自 {chat_id})")
-                        return True
-                
-                # 方式4: 反向超级群组格式匹配
-                # 如果配置的是超级群组格式，提取原始ID进行匹配
-                if monitor_group.startswith('-100'):
-                    config_original_id = monitor_group[4:]  # 移除-100前缀
-                    if str(config_original_id) == str(abs(chat_id)):
-                        logger.debug(f"✅ 配置超级群组格式匹配: {monitor_group} -> {config_original_id} == {abs(chat_id)}")
-                        return True
-                
-                # 方式5: 匹配用户名格式
-                if (monitor_group.startswith('@') and 
-                    hasattr(chat, 'username') and 
-                    chat.username and 
-                    monitor_group == f"@{chat.username}"):
-                    logger.debug(f"✅ 群组用户名匹配: {monitor_group} == @{chat.username}")
+            chat_key = str(chat_id)
+            index = self.monitor_index
+            
+            # ID匹配（支持多种格式）：原始ID、绝对值（处理正负号差异）、去掉 -100 前缀的超级群组ID
+            if (chat_key in index or
+                    str(abs(chat_id)) in index or
+                    (chat_key.startswith('-100') and chat_key[4:] in index)):
+                return True
+            
+            # 用户名匹配：只有配置了@用户名时才需要获取群组信息
+            if self.monitor_has_usernames:
+                chat = await event.get_chat()
+                username = getattr(chat, 'username', None)
+                if username and f"@{username.lower()}" in index:
                     return True
             
-            logger.debug(f"❌ 群组不匹配: {chat_title} (ID: {chat_id}) 不在监听列表中")
+            logger.debug(f"❌ 群组不匹配: ID {chat_id} 不在监听列表中")
             return False
             
         except Exception as e:
             logger.error(f"检查监听群组时出错: {e}")
             return False
     
+    def group_aliases(self, chat_key: str) -> List[str]:
+        """群组在配置中可能使用的所有写法：原始ID、正负号、-100 超级群组前缀和@用户名"""
+        bare_id = chat_key[4:] if chat_key.startswith('-100') else chat_key.lstrip('-')
+        aliases = [chat_key, bare_id, f'-{bare_id}', f'-100{bare_id}']
+        username = self.group_usernames.get(bare_id)
+        if username:
+            aliases.append(username)
+        return aliases
+    
+    def group_username(self, chat_key: str) -> Optional[str]:
+        """群组的@用户名（验证群组时记录），没有时返回None"""
+        bare_id = chat_key[4:] if chat_key.startswith('-100') else chat_key.lstrip('-')
+        return self.group_usernames.get(bare_id)
+    
+    def lookup_group_setting(self, chat_key: str, mapping: Dict):
+        """按群组的任意写法查找按群组配置的值（如 GROUP_WEIGHTS），未配置时返回None"""
+        if not mapping:
+            return None
+        for alias in self.group_aliases(chat_key):
+            if alias in mapping:
+                return mapping[alias]
+        return None
+    
+    def validate_config(self, fresh):
+        """热加载前检查新配置，有误时抛出 ValueError（此时不修改任何配置项）"""
+        if (fresh.MESSAGE_PREFIX, fresh.SHOW_MESSAGE_TIME, fresh.TIME_FORMAT) != \
+                (Config.MESSAGE_PREFIX, Config.SHOW_MESSAGE_TIME, Config.TIME_FORMAT):
+            MessageRenderer(fresh.MESSAGE_PREFIX, fresh.SHOW_MESSAGE_TIME, fresh.TIME_FORMAT)
+    
+    def apply_config_changes(self, changed):
+        """配置热加载后，只重建受影响的派生结构；已连接的客户端和进行中的任务不受影响"""
+        if not self.forward_enabled:
+            return
+        
+        if 'MONITOR_GROUPS' in changed:
+            # 新增的群组需要联网解析，在后台完成后整体替换；连续热加载时以最后一次为准
+            if self.group_reload_task and not self.group_reload_task.done():
+                self.group_reload_task.cancel()
+            self.group_reload_task = asyncio.get_running_loop().create_task(self.reload_monitor_groups())
+        
+        if self.scheduler and changed & {'GROUP_WEIGHTS', 'GROUP_PRIORITIES', 'GROUP_QUEUE_SIZE'}:
+            self.scheduler.max_queue_size = Config.GROUP_QUEUE_SIZE
+            self.scheduler.configure(Config.GROUP_WEIGHTS, Config.GROUP_PRIORITIES)
+        
+        if 'ADAPTIVE_FORWARD' in changed:
+            if Config.ADAPTIVE_FORWARD:
+                self.enable_adaptive_forward()
+            else:
+                self.mode_selector = None
+        elif self.mode_selector and changed & {'BREAKER_FAILURES', 'BREAKER_COOLDOWN'}:
+            self.mode_selector.failure_threshold = Config.BREAKER_FAILURES
+            self.mode_selector.cooldown = Config.BREAKER_COOLDOWN
+        
+        if 'ENABLE_LOAD_SHEDDING' in changed:
+            if Config.ENABLE_LOAD_SHEDDING:
+                self.enable_load_shedding()
+            else:
+                self.load_shedder = None
+        elif self.load_shedder and changed & {'SHED_LAG_THRESHOLDS', 'SHED_RECOVERY_RATIO', 'SHED_MIN_DWELL'}:
+            self.load_shedder.set_thresholds(Config.SHED_LAG_THRESHOLDS)
+            self.load_shedder.recovery_ratio = Config.SHED_RECOVERY_RATIO
+            self.load_shedder.min_dwell = Config.SHED_MIN_DWELL
+        
+        if changed & {'MESSAGE_PREFIX', 'SHOW_MESSAGE_TIME', 'TIME_FORMAT'}:
+            try:
+                self.renderer = MessageRenderer.from_config()
+                logger.info("🔄 消息前缀模板已重新编译")
+            except ValueError as e:
+                logger.error(f"❌ 消息前缀模板无效，继续使用原模板: {e}")
+    
     async def handle_new_message(self, event):
         """处理新消息"""
         try:
@@ -243,27 +462,131 @@ class TelegramMessageReceiver:
             # 此函数调用前已经确认是监听的群组，直接处理转发
             self.forward_stats['messages_received'] += 1
             
-            # 应用过滤规则
-            if not await self.should_forward_message(event):
-                self.forward_stats['messages_filtered'] += 1
-                return
+            # 提取消息记录，之后的各个阶段只使用记录，不再持有事件对象
+            record = await self.build_record(event)
+            if self.analytics:
+                self.analytics.observe(record)
             
-            # 转发消息
-            await self.forward_message_to_bot(event)
+            # 启动期间转发尚未就绪：先放入缓冲区，就绪后按接收顺序处理
+            if self.startup_buffer is not None:
+                self.buffer_record(record)
+                return
             
+            await self.dispatch_record(record)
+        
         except Exception as e:
             logger.error(f"❌ 处理转发消息时出错: {e}")
             self.forward_stats['errors'] += 1
     
-    async def should_forward_message(self, event) -> bool:
+    async def dispatch_record(self, record: MessageRecord):
+        """过滤后按群组设置进入摘要、调度队列或直接转发"""
+        # 应用过滤规则
+        if not await self.should_forward_message(record):
+            self.forward_stats['messages_filtered'] += 1
+            self.archive_message(record, FILTERED)
+            return
+        
+        self.publish_record(record)
+        
+        # 摘要模式的群组：收集后定期合并为一条摘要发送
+        digest_interval = self.lookup_group_setting(str(record.chat_id), Config.DIGEST_GROUPS)
+        if digest_interval:
+            self.add_to_digest(record, digest_interval)
+            return
+        
+        # 转发消息（启用公平调度时进入所属群组的队列）
+        if self.scheduler:
+            self.scheduler.submit(str(record.chat_id), record)
+        else:
+            await self.forward_message_to_bot(record)
+    
+    def buffer_record(self, record: MessageRecord):
+        """启动期间缓冲消息；超过 STARTUP_BUFFER_SIZE 时丢弃最旧的消息"""
+        if len(self.startup_buffer) >= Config.STARTUP_BUFFER_SIZE:
+            self.startup_buffer.popleft()
+            if not self.startup_dropped:
+                logger.warning(f"⚠️ 启动缓冲区已满({Config.STARTUP_BUFFER_SIZE})，丢弃最旧的消息")
+            self.startup_dropped += 1
+        self.startup_buffer.append(record)
+    
+    async def drain_startup_buffer(self):
+        """按接收顺序处理启动期间缓冲的消息，处理完后新消息直接进入转发流程"""
+        buffer = self.startup_buffer
+        if buffer:
+            dropped = f"，另有 {self.startup_dropped} 条因缓冲区已满被丢弃" if self.startup_dropped else ""
+            logger.info(f"📥 处理启动期间缓冲的 {len(buffer)} 条消息{dropped}")
+        # 处理期间新到达的消息继续进入缓冲区，保证顺序
+        while buffer:
+            record = buffer.popleft()
+            try:
+                await self.dispatch_record(record)
+            except Exception as e:
+                logger.error(f"❌ 处理缓冲消息时出错: {e}")
+                self.forward_stats['errors'] += 1
+        self.startup_buffer = None
+    
+    async def build_record(self, event) -> MessageRecord:
+        """接收时提取消息记录（发送者和群组只在这里获取一次）"""
+        sender = await event.get_sender()
+        chat = await event.get_chat()
+        return MessageRecord.from_message(event.message, event.chat_id, sender, chat)
+    
+    def add_to_digest(self, record: MessageRecord, interval: float):
+        """将消息加入所属群组的摘要"""
+        entry = DigestEntry(
+            record.message_id, record.date, record.sender_name,
+            make_snippet(record.media_kind, record.text, Config.DIGEST_SNIPPET_LENGTH)
+        )
+        self.digest.add(
+            record.chat_id, record.chat_title, self.group_username(str(record.chat_id)),
+            entry, interval, Config.DIGEST_MAX_MESSAGES
+        )
+        self.forward_stats['messages_digested'] += 1
+        self.archive_message(record, DIGESTED)
+    
+    def archive_message(self, record: MessageRecord, status, mode=None):
+        """记录消息到归档（只放入写入队列，不等待磁盘）"""
+        if not self.archive:
+            return
+        self.archive.add((
+            record.chat_id, record.message_id, record.chat_title, record.sender_id, record.sender_name,
+            record.date.timestamp(), record.text, record.media_kind,
+            record.file_name, record.media_size if record.has_file else None,
+            status, mode
+        ))
+    
+    def publish_record(self, record: MessageRecord):
+        """推送消息到各输出端（只放入各自的发送队列，不等待下游）"""
+        if not self.output_sinks:
+            return
+        line = encode_record(record)
+        for sink in self.output_sinks:
+            sink.submit(line)
+    
+    def render_digest_header(self, group: GroupDigest, entries: List[DigestEntry]) -> str:
+        """摘要头部：沿用消息前缀模板，发送者位置显示消息条数"""
+        first = entries[0]
+        return self.renderer.render_prefix(
+            group.chat_id, group.chat_title, f"{len(entries)} 条消息摘要", first.date, first.message_id
+        )
+    
+    async def send_digest(self, text: str):
+        """发送摘要（超长时拆分，不解析格式、不显示链接预览）"""
+        await self.ensure_bot_entity()
+        for chunk_text, chunk_entities in self.renderer.split(text, None, Config.MAX_MESSAGE_LENGTH):
+            await self.client.send_message(
+                self.bot_entity, chunk_text,
+                formatting_entities=chunk_entities,
+                link_preview=False
+            )
+    
+    async def should_forward_message(self, record: MessageRecord) -> bool:
         """判断是否应该转发消息（简化版）"""
         try:
-            message = event.message
-            
             # 检查消息去重
             if Config.ENABLE_DEDUPLICATION:
                 message_hash = hashlib.md5(
-                    f"{event.chat_id}_{message.id}_{message.message or ''}".encode()
+                    f"{record.chat_id}_{record.message_id}_{record.text}".encode()
                 ).hexdigest()
                 
                 current_time = time.time()
@@ -275,151 +598,349 @@ class TelegramMessageReceiver:
                 self.message_cache[message_hash] = current_time
             
             # 检查是否为转发消息
-            if message.fwd_from and not Config.FORWARD_FORWARDED:
+            if record.is_forward and not Config.FORWARD_FORWARDED:
                 logger.debug("⏭️ 跳过转发消息")
                 return False
             
             # 检查是否为机器人消息
-            sender = await event.get_sender()
-            if isinstance(sender, User) and sender.bot and not Config.FORWARD_BOT_MESSAGES:
+            if record.is_bot and not Config.FORWARD_BOT_MESSAGES:
                 logger.debug("⏭️ 跳过机器人消息")
                 return False
             
             # 检查媒体类型
-            if message.media:
-                if message.photo and not Config.FORWARD_PHOTOS:
+            kind = record.media_kind
+            if kind:
+                if kind == 'photo' and not Config.FORWARD_PHOTOS:
                     logger.debug("⏭️ 跳过图片消息")
                     return False
                 
-                if message.video and not Config.FORWARD_VIDEOS:
+                if kind == 'video' and not Config.FORWARD_VIDEOS:
                     logger.debug("⏭️ 跳过视频消息")
                     return False
                 
-                if message.document and not Config.FORWARD_DOCUMENTS:
+                if record.is_document and not Config.FORWARD_DOCUMENTS:
                     logger.debug("⏭️ 跳过文档消息")
                     return False
                 
-                if (message.voice or message.audio) and not Config.FORWARD_AUDIO:
+                if kind in ('voice', 'audio') and not Config.FORWARD_AUDIO:
                     logger.debug("⏭️ 跳过音频消息")
                     return False
                 
-                if message.sticker and not Config.FORWARD_STICKERS:
+                if kind == 'sticker' and not Config.FORWARD_STICKERS:
                     logger.debug("⏭️ 跳过贴纸消息")
                     return False
             
             return True
-            
+        
         except Exception as e:
             logger.error(f"❌ 过滤消息时出错: {e}")
             return False
     
-    async def forward_message_to_bot(self, event):
+    async def forward_message_to_bot(self, record: MessageRecord):
         """转发消息到机器人（简化版：一个开关控制模式）"""
         try:
-            message = event.message
-            
-            # 获取发送者和群组信息
-            sender = await event.get_sender()
-            sender_name = "Unknown"
-            if isinstance(sender, User):
-                sender_name = sender.first_name or ""
-                if sender.last_name:
-                    sender_name += f" {sender.last_name}"
-                if not sender_name.strip():
-                    sender_name = sender.username or f"User_{sender.id}"
-            elif hasattr(sender, 'title'):
-                sender_name = sender.title
+            has_media = record.has_media
             
-            chat = await event.get_chat()
-            chat_title = getattr(chat, 'title', 'Unknown Group')
+            # 负载调节：延迟过大时按当前级别丢弃贴纸、转入摘要等
+            shed_level = self.load_shedder.current_level() if self.load_shedder else 0
+            if shed_level and self.shed_message(record, shed_level):
+                return
+            # 媒体改为直接转发（不下载重发）
+            media_direct = shed_level >= MEDIA_DIRECT and has_media
+            if media_direct and (Config.DOWNLOAD_AND_RESEND or self.mode_selector):
+                self.load_shedder.count('媒体直接转发')
+            
+            # 流水线重发：放入流水线后即返回，由流水线按顺序送达；
+            # 降级的消息也经过流水线，不会越过之前排队的消息
+            if Config.DOWNLOAD_AND_RESEND and Config.RESEND_PIPELINE and not self.mode_selector:
+                job = ResendJob(record)
+                job.fallback = media_direct
+                job.text_only = shed_level >= TEXT_ONLY and has_media
+                if job.text_only:
+                    self.load_shedder.count('仅发送文字')
+                await self.get_resend_pipeline().submit(job)
+                return
             
             # 确保机器人实体已初始化
             await self.ensure_bot_entity()
             
-            # 简单的模式选择：下载重发 vs 直接转发
-            if Config.DOWNLOAD_AND_RESEND:
+            # 模式选择：负载调节 / 自适应 / 下载重发 / 直接转发
+            if shed_level >= TEXT_ONLY and has_media:
+                mode = DIRECT
+                self.load_shedder.count('仅发送文字')
+                await self.send_text_only(record)
+            elif media_direct:
+                mode = DIRECT
+                await self.direct_forward_message(record)
+            elif self.mode_selector:
+                mode = await self.adaptive_forward_message(record)
+            elif Config.DOWNLOAD_AND_RESEND:
                 # 下载重发模式：自定义格式
-                success = await self.download_and_resend_message(event, sender_name, chat_title)
+                mode = RESEND
+                success = await self.download_and_resend_message(record)
                 if not success:
                     # 如果下载失败（如文件太大），回退到直接转发
-                    await self.direct_forward_message(event, sender_name, chat_title)
+                    mode = DIRECT
+                    await self.direct_forward_message(record)
             else:
                 # 直接转发模式：快速转发
-                await self.direct_forward_message(event, sender_name, chat_title)
+                mode = DIRECT
+                await self.direct_forward_message(record)
             
             # 记录成功转发
-            self.forward_stats['messages_forwarded'] += 1
-            
-            mode_text = "下载重发" if Config.DOWNLOAD_AND_RESEND else "直接转发"
-            logger.info(f"📤 {mode_text}: {chat_title} -> {sender_name}: {message.text[:50] if message.text else '[媒体消息]'}...")
+            self.record_forwarded(record, mode)
             
             # 转发延迟
             if Config.FORWARD_DELAY > 0:
                 await asyncio.sleep(Config.FORWARD_DELAY)
-                
+        
         except Exception as e:
             logger.error(f"❌ 转发消息失败: {e}")
             self.forward_stats['errors'] += 1
+            self.archive_message(record, FAILED)
+    
+    def shed_message(self, record: MessageRecord, level) -> bool:
+        """按负载调节级别处理消息，返回是否已处理（丢弃或转入摘要）"""
+        if level >= DIGEST_ONLY:
+            self.load_shedder.count('转入摘要')
+            self.add_to_digest(record, Config.DIGEST_INTERVAL)
+            return True
+        
+        if level >= DROP_STICKERS and record.media_kind == 'sticker':
+            action = '丢弃贴纸'
+        elif level >= TEXT_ONLY and record.has_media and not record.text:
+            action = '丢弃无文字媒体'
+        else:
+            return False
+        
+        self.load_shedder.count(action)
+        self.forward_stats['messages_shed'] += 1
+        self.archive_message(record, SHED)
+        return True
+    
+    async def send_text_only(self, record: MessageRecord):
+        """只发送前缀和文字（带媒体类型标记），不发送媒体"""
+        prefix = self.renderer.render_prefix(
+            record.chat_id, record.chat_title, record.sender_name, record.date, record.message_id
+        )
+        label = MEDIA_LABELS.get(record.media_kind, '[媒体]')
+        text, entities = self.renderer.compose(f"{prefix} {label}", record.text, record.entities)
+        for chunk_text, chunk_entities in self.renderer.split(text, entities, Config.MAX_MESSAGE_LENGTH):
+            await self.client.send_message(
+                self.bot_entity, chunk_text,
+                formatting_entities=chunk_entities,
+                link_preview=False
+            )
+    
+    def record_forwarded(self, record: MessageRecord, mode):
+        """记录一次成功转发"""
+        self.forward_stats['messages_forwarded'] += 1
+        self.archive_message(record, FORWARDED, mode)
+        if self.load_shedder:
+            # 端到端延迟：消息发出时间到送达
+            self.load_shedder.observe(time.time() - record.date.timestamp())
+        
+        if self.startup_started is not None:
+            logger.info(f"⏱️ 启动后首条消息转发: {time.perf_counter() - self.startup_started:.2f}s")
+            self.startup_started = None
+        
+        mode_text = MODE_NAMES[mode]
+        logger.info(f"📤 {mode_text}: {record.chat_title} -> {record.sender_name}: {record.text[:50] if record.text else '[媒体消息]'}...")
+    
+    def get_resend_pipeline(self) -> StagePipeline:
+        """返回下载重发流水线，首次使用时创建"""
+        if self.resend_pipeline is None:
+            self.resend_pipeline = StagePipeline([
+                ('准备', self.resend_prepare),
+                ('下载', self.resend_download),
+                ('上传', self.resend_upload),
+                ('发送', self.resend_deliver),
+            ], buffer_size=Config.PIPELINE_BUFFER_SIZE)
+            logger.info(f"🏭 下载重发流水线已启用 (阶段缓冲 {Config.PIPELINE_BUFFER_SIZE})")
+        return self.resend_pipeline
     
-    async def download_and_resend_message(self, event, sender_name, chat_title):
-        """下载重发模式：自定义格式，支持文件大小检查"""
+    async def adaptive_forward_message(self, record: MessageRecord) -> str:
+        """自适应模式：按预测送达延迟选择转发方式，重发失败或超时时回退到直接转发，返回实际使用的方式"""
+        text_only = not record.has_media
+        has_file = record.has_file
+        size = record.media_size if has_file else 0
+        
+        # 合并前缀时直接转发只需一次发送
+        mergeable = Config.MERGE_PREFIX and (text_only or (has_file and record.media_kind != 'sticker'))
+        direct_calls = 1 if mergeable else 2
+        
+        mode = self.mode_selector.choose(
+            size,
+            can_reference=has_file,
+            can_resend=text_only or (has_file and size <= Config.MAX_DOWNLOAD_SIZE * 1024 * 1024),
+            direct_calls=direct_calls
+        )
+        
+        if mode != DIRECT:
+            started = time.perf_counter()
+            job = ResendJob(record)
+            try:
+                if mode == REFERENCE:
+                    job.file, job.text, job.entities = record.input_media(), record.text, record.entities
+                    await self.resend_send(job)
+                    success = True
+                else:
+                    success = await self.download_and_resend_message(
+                        record, raise_errors=True, job=job, timeout=Config.RESEND_TIMEOUT
+                    )
+            except asyncio.TimeoutError:
+                logger.warning(f"⏱️ {MODE_NAMES[mode]}超时({Config.RESEND_TIMEOUT:g}秒)，回退到直接转发")
+                success = False
+            except Exception as e:
+                if job.delivered:
+                    # 已有部分内容送达，回退会重复发送
+                    self.mode_selector.record_result(mode, False)
+                    raise
+                logger.warning(f"⚠️ {MODE_NAMES[mode]}失败，回退到直接转发: {e}")
+                success = False
+            
+            self.mode_selector.record_result(mode, success)
+            if success:
+                if mode == REFERENCE:
+                    self.mode_selector.record_api_call(time.perf_counter() - started)
+                return mode
+        
+        started = time.perf_counter()
+        try:
+            await self.direct_forward_message(record)
+        except Exception:
+            self.mode_selector.record_result(DIRECT, False)
+            raise
+        self.mode_selector.record_api_call((time.perf_counter() - started) / direct_calls)
+        self.mode_selector.record_result(DIRECT, True)
+        return DIRECT
+    
+    async def download_and_resend_message(self, record: MessageRecord, raise_errors=False,
+                                          job: Optional[ResendJob] = None, timeout: Optional[float] = None):
+        """下载重发模式：自定义格式，支持文件大小检查
+        
+        返回False表示未重发（文件过大或下载结果为空），由调用方回退到直接转发；
+        raise_errors=True 时失败直接抛出；job 用于让调用方得知是否已有内容送达
+        """
         try:
-            message = event.message
-            
             # 检查文件大小（如果是媒体消息）
-            if message.media and hasattr(message.media, 'document') and message.media.document:
-                file_size_mb = message.media.document.size / (1024 * 1024)
-                if file_size_mb > Config.MAX_DOWNLOAD_SIZE:
-                    logger.info(f"📄 文件过大({file_size_mb:.1f}MB > {Config.MAX_DOWNLOAD_SIZE}MB)，使用直接转发")
-                    return False
-            
-            # 生成自定义前缀
-            message_time = ""
-            if Config.SHOW_MESSAGE_TIME:
-                message_time = event.date.strftime(Config.TIME_FORMAT)
-            
-            prefix = Config.format_message_prefix(
-                chat_title=chat_title,
-                sender_name=sender_name,
-                message_time=message_time,
-                chat_id=str(event.chat_id),
-                message_id=str(message.id)
-            )
-            
-            # 下载并重发消息内容
-            await self.send_message_content_to_bot(event, sender_name, chat_title)
-            return True
+            if self.exceeds_download_limit(record):
+                return False
             
+            # 下载并重发消息内容（纯净内容，不添加前缀）
+            job = job or ResendJob(record)
+            await self.send_message_content_to_bot(record, raise_errors, job, timeout)
+            # 下载结果为空时未发送，由调用方回退
+            return not job.fallback
+        
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"❌ 下载重发失败: {e}")
             return False
     
-    async def direct_forward_message(self, event, sender_name, chat_title):
+    def exceeds_download_limit(self, record: MessageRecord) -> bool:
+        """文件是否超过 MAX_DOWNLOAD_SIZE（超过时应使用直接转发）"""
+        if record.has_file and record.is_document:
+            file_size_mb = record.media_size / (1024 * 1024)
+            if file_size_mb > Config.MAX_DOWNLOAD_SIZE:
+                logger.info(f"📄 文件过大({file_size_mb:.1f}MB > {Config.MAX_DOWNLOAD_SIZE}MB)，使用直接转发")
+                return True
+        return False
+    
+    async def direct_forward_message(self, record: MessageRecord):
         """直接转发模式：快速转发，带简单前缀"""
         try:
             # 生成简单前缀
-            message_time = ""
-            if Config.SHOW_MESSAGE_TIME:
-                message_time = event.date.strftime(Config.TIME_FORMAT)
-            
-            prefix = Config.format_message_prefix(
-                chat_title=chat_title,
-                sender_name=sender_name,
-                message_time=message_time,
-                chat_id=str(event.chat_id),
-                message_id=str(event.message.id)
+            prefix = self.renderer.render_prefix(
+                record.chat_id, record.chat_title, record.sender_name, record.date, record.message_id
             )
             
+            # 合并模式：前缀与消息内容一次发送
+            if Config.MERGE_PREFIX and await self.send_merged_message(record, prefix):
+                return
+            
             # 先发送前缀信息
             await self.client.send_message(self.bot_entity, prefix)
             
             # 然后直接转发原消息
-            await self.client.forward_messages(self.bot_entity, event.message)
-            
+            await self.client.forward_messages(self.bot_entity, record.message_id, from_peer=record.chat_id)
+        
         except Exception as e:
             logger.error(f"❌ 直接转发失败: {e}")
             raise
     
+    async def send_merged_message(self, record: MessageRecord, prefix) -> bool:
+        """将前缀合并进消息正文/说明文字后一次发送，返回是否已处理
+        
+        文本直接发送；图片和文件通过原消息的媒体引用重发（无需下载）；
+        超长内容按实体安全的边界拆分。贴纸、投票、位置等无法携带文字的类型，
+        以及首条消息被拒绝（如文件引用过期、格式实体无效）时返回False，
+        由调用方回退到"前缀 + 转发"
+        """
+        if record.has_media and (record.media_kind == 'sticker' or not record.has_file):
+            return False
+        
+        text, entities = self.renderer.compose(prefix, record.text, record.entities)
+        
+        if record.has_media:
+            chunks = self.renderer.split(
+                text, entities, Config.MAX_MESSAGE_LENGTH, first_limit=Config.MAX_CAPTION_LENGTH
+            )
+            first = self.client.send_file(
+                self.bot_entity, record.input_media(),
+                caption=chunks[0][0], formatting_entities=chunks[0][1]
+            )
+            options = {}
+        else:
+            chunks = self.renderer.split(text, entities, Config.MAX_MESSAGE_LENGTH)
+            options = {'link_preview': record.web_preview}
+            first = self.client.send_message(
+                self.bot_entity, chunks[0][0], formatting_entities=chunks[0][1], **options
+            )
+        
+        # 只有首条消息失败时才回退，之后的失败照常抛出，避免重复发送已送达的部分
+        try:
+            await first
+        except RPCError as e:
+            logger.warning(f"⚠️ 合并发送失败，回退到前缀 + 转发: {e}")
+            return False
+        
+        for chunk_text, chunk_entities in chunks[1:]:
+            await self.client.send_message(
+                self.bot_entity, chunk_text, formatting_entities=chunk_entities, **options
+            )
+        return True
+    
+    async def download_media_bytes(self, record: MessageRecord) -> bytes:
+        """下载媒体到内存；自适应模式下记录下载吞吐量"""
+        started = time.perf_counter()
+        data = await self.client.download_file(
+            record.file_location(), bytes, file_size=record.media_size, dc_id=record.dc_id
+        )
+        if self.mode_selector and data:
+            self.mode_selector.record_transfer('download', len(data), time.perf_counter() - started)
+        return data
+    
+    async def send_file_with_text(self, file, text, entities, job: Optional[ResendJob] = None, **kwargs):
+        """发送文件，文字超出说明文字长度限制时，剩余部分拆分为后续消息
+        
+        传入 job 时，文件送达后标记 job.delivered
+        """
+        chunks = []
+        if text:
+            chunks = self.renderer.split(
+                text, entities, Config.MAX_MESSAGE_LENGTH, first_limit=Config.MAX_CAPTION_LENGTH
+            )
+            kwargs['caption'], kwargs['formatting_entities'] = chunks[0]
+        
+        await self.client.send_file(self.bot_entity, file, **kwargs)
+        if job is not None:
+            job.delivered = True
+        
+        for chunk_text, chunk_entities in chunks[1:]:
+            await self.client.send_message(self.bot_entity, chunk_text, formatting_entities=chunk_entities)
+    
     async def ensure_bot_entity(self):
         """确保机器人实体已初始化"""
         if not hasattr(self, 'bot_entity'):
@@ -441,135 +962,25 @@ class TelegramMessageReceiver:
                     logger.error(f"❌ 获取机器人实体失败: {e1}, {e2}")
                     raise Exception("无法获取机器人实体，请检查BOT_TOKEN配置")
     
-    async def send_message_content_to_bot(self, event, sender_name, chat_title):
-        """根据消息类型发送内容到机器人（下载重发模式 - 纯净内容）"""
+    async def send_message_content_to_bot(self, record: MessageRecord, raise_errors=False,
+                                          job: Optional[ResendJob] = None, timeout: Optional[float] = None):
+        """根据消息类型发送内容到机器人（下载重发模式 - 纯净内容）
+        
+        依次执行与重发流水线相同的各阶段；timeout 只限制下载和上传，
+        发送不会被中途取消（已送达一部分时再回退会重复发送）。
+        raise_errors=True 时失败直接抛出（由调用方回退），否则向机器人发送错误提示
+        """
+        job = job or ResendJob(record)
         try:
-            message = event.message
-            
-            # 下载重发模式：直接发送原始内容，不添加前缀
-            # 这样既没有转发标记，又保持内容的原始性
-            
-            # 文本消息 - 直接发送原文
-            if message.text and not message.media:
-                # 检查消息长度
-                text_content = message.text
-                if len(text_content) > Config.MAX_MESSAGE_LENGTH:
-                    text_content = text_content[:Config.MAX_MESSAGE_LENGTH-3] + "..."
-                
-                await self.client.send_message(self.bot_entity, text_content)
+            self.plan_resend(job)
+            await asyncio.wait_for(self.resend_transfer(job), timeout)
+            if job.fallback:
                 return
-            
-            # 图片消息 - 下载重发，保留原始说明文字
-            elif message.photo:
-                caption = message.text if message.text else None
-                if caption and len(caption) > 1024:  # Telegram caption limit
-                    caption = caption[:1021] + "..."
-                
-                # 下载并重新发送图片
-                photo_bytes = await message.download_media(bytes)
-                await self.client.send_file(
-                    self.bot_entity, 
-                    photo_bytes, 
-                    caption=caption
-                )
-            
-            # 文档/文件消息 - 下载重发
-            elif message.document:
-                caption = message.text if message.text else None
-                if caption and len(caption) > 1024:
-                    caption = caption[:1021] + "..."
-                
-                # 检查文件大小
-                file_size_mb = message.document.size / (1024 * 1024)
-                if file_size_mb > Config.MAX_DOWNLOAD_SIZE:
-                    # 文件太大，发送提示信息
-                    size_info = f"📄 文档过大({file_size_mb:.1f}MB)，无法下载"
-                    await self.client.send_message(self.bot_entity, size_info)
-                    return
-                
-                # 获取文件信息
-                file_name = "document"
-                if hasattr(message.document, 'attributes'):
-                    for attr in message.document.attributes:
-                        if hasattr(attr, 'file_name') and attr.file_name:
-                            file_name = attr.file_name
-                            break
-                
-                # 下载并重新发送文档
-                file_bytes = await message.download_media(bytes)
-                await self.client.send_file(
-                    self.bot_entity,
-                    file_bytes,
-                    caption=caption,
-                    file_name=file_name
-                )
-            
-            # 视频消息 - 下载重发
-            elif message.video:
-                caption = message.text if message.text else None
-                if caption and len(caption) > 1024:
-                    caption = caption[:1021] + "..."
-                
-                # 检查文件大小
-                file_size_mb = message.video.size / (1024 * 1024)
-                if file_size_mb > Config.MAX_DOWNLOAD_SIZE:
-                    size_info = f"🎥 视频过大({file_size_mb:.1f}MB)，无法下载"
-                    await self.client.send_message(self.bot_entity, size_info)
-                    return
-                
-                # 下载并重新发送视频
-                video_bytes = await message.download_media(bytes)
-                await self.client.send_file(
-                    self.bot_entity,
-                    video_bytes,
-                    caption=caption
-                )
-            
-            # 音频/语音消息 - 下载重发
-            elif message.voice or message.audio:
-                caption = message.text if message.text else None
-                if caption and len(caption) > 1024:
-                    caption = caption[:1021] + "..."
-                
-                # 下载并重新发送音频
-                audio_bytes = await message.download_media(bytes)
-                await self.client.send_file(
-                    self.bot_entity,
-                    audio_bytes,
-                    caption=caption
-                )
-            
-            # 贴纸 - 下载重发
-            elif message.sticker:
-                # 下载并重新发送贴纸，不添加任何文字说明
-                sticker_bytes = await message.download_media(bytes)
-                await self.client.send_file(self.bot_entity, sticker_bytes)
-            
-            # 位置消息 - 转换为简洁文本
-            elif message.geo:
-                location_text = f"📍 位置: {message.geo.lat}, {message.geo.long}"
-                await self.client.send_message(self.bot_entity, location_text)
-            
-            # 联系人信息 - 转换为简洁文本
-            elif message.contact:
-                contact = message.contact
-                contact_text = f"👤 {contact.first_name} {contact.last_name or ''} {contact.phone_number}"
-                await self.client.send_message(self.bot_entity, contact_text)
-            
-            # 投票 - 转换为简洁文本
-            elif message.poll:
-                poll = message.poll
-                poll_text = f"📊 {poll.question}\n"
-                for i, answer in enumerate(poll.answers, 1):
-                    poll_text += f"{i}. {answer.text}\n"
-                await self.client.send_message(self.bot_entity, poll_text)
-            
-            # 其他类型消息
-            else:
-                # 发送简单提示
-                await self.client.send_message(self.bot_entity, "[不支持的消息类型]")
-                
+            await self.resend_send(job)
+        
         except Exception as e:
+            if raise_errors:
+                raise
             logger.error(f"❌ 下载重发失败: {e}")
             # 发送错误提示
             try:
@@ -577,93 +988,155 @@ class TelegramMessageReceiver:
             except:
                 pass  # 避免二次错误
     
+    def plan_resend(self, job: ResendJob):
+        """按消息类型确定下载重发的内容（不发起网络请求）
+        
+        下载重发模式：直接发送原始内容，不添加前缀，
+        这样既没有转发标记，又保持内容的原始性
+        """
+        record = job.record
+        
+        # 原始文本及格式实体（说明文字超长时拆分为后续消息，不再截断）
+        job.text = record.text
+        job.entities = record.entities
+        
+        # 文本消息（含网页预览）- 直接发送原文，超长时按实体安全的边界拆分
+        if job.text and not record.has_media:
+            return
+        
+        # 图片、文档、视频、音频/语音、贴纸 - 下载重发，保留原始说明文字
+        if record.has_file:
+            job.download = True
+            # 文件名的扩展名决定重新上传后作为图片还是文件发送
+            job.file_name = record.upload_name()
+            if record.media_kind == 'sticker':
+                # 贴纸不添加任何文字说明
+                job.text, job.entities = '', None
+            return
+        
+        # 位置、联系人、投票等 - 转换为简洁文本，其他类型消息发送简单提示
+        job.text, job.entities = '', None
+        job.notice = record.notice or "[不支持的消息类型]"
+    
+    async def resend_prepare(self, job: ResendJob):
+        """流水线阶段：检查文件大小并确定重发内容"""
+        await self.ensure_bot_entity()
+        
+        # 负载调节已决定只发文字或直接转发时不再下载
+        if job.text_only or job.fallback:
+            return
+        
+        # 文件过大时在发送阶段回退到直接转发
+        job.fallback = self.exceeds_download_limit(job.record)
+        if not job.fallback:
+            self.plan_resend(job)
+    
+    async def resend_transfer(self, job: ResendJob):
+        """下载并上传媒体（流水线之外的下载重发使用）"""
+        await self.resend_download(job)
+        await self.resend_upload(job)
+    
+    async def resend_download(self, job: ResendJob):
+        """流水线阶段：下载媒体到内存"""
+        if job.download:
+            job.data = await self.download_media_bytes(job.record)
+            if not job.data:
+                # 没有可重发的内容，发送阶段回退到直接转发
+                logger.warning("⚠️ 媒体下载结果为空，改为直接转发")
+                job.fallback = True
+    
+    async def resend_upload(self, job: ResendJob):
+        """流水线阶段：上传文件，得到可直接发送的文件句柄"""
+        if not job.data:
+            return
+        
+        started = time.perf_counter()
+        job.file = await self.client.upload_file(job.data, file_name=job.file_name)
+        if self.mode_selector:
+            self.mode_selector.record_transfer('upload', len(job.data), time.perf_counter() - started)
+        # 上传完成后释放内存中的文件内容
+        job.data = None
+    
+    async def resend_send(self, job: ResendJob):
+        """流水线阶段：发送到机器人"""
+        if job.notice:
+            await self.client.send_message(self.bot_entity, job.notice)
+            job.delivered = True
+        elif job.file is not None:
+            await self.send_file_with_text(job.file, job.text, job.entities, job=job)
+        else:
+            for chunk_text, chunk_entities in self.renderer.split(job.text, job.entities, Config.MAX_MESSAGE_LENGTH):
+                await self.client.send_message(
+                    self.bot_entity, chunk_text, formatting_entities=chunk_entities
+                )
+                job.delivered = True
+    
+    async def resend_deliver(self, job: ResendJob):
+        """流水线最后阶段：按顺序送达（或回退到直接转发），记录统计并等待转发间隔"""
+        if job.error is not None:
+            logger.error(f"❌ 下载重发失败: {job.error}")
+            self.forward_stats['errors'] += 1
+            self.archive_message(job.record, FAILED, RESEND)
+            # 发送错误提示
+            try:
+                await self.client.send_message(self.bot_entity, f"❌ 消息处理失败: {str(job.error)}")
+            except:
+                pass  # 避免二次错误
+            return
+        
+        try:
+            if job.text_only:
+                mode = DIRECT
+                await self.send_text_only(job.record)
+            elif job.fallback:
+                mode = DIRECT
+                await self.direct_forward_message(job.record)
+            else:
+                mode = RESEND
+                await self.resend_send(job)
+            self.record_forwarded(job.record, mode)
+        except Exception as e:
+            logger.error(f"❌ 转发消息失败: {e}")
+            self.forward_stats['errors'] += 1
+            self.archive_message(job.record, FAILED, mode)
+        
+        # 转发延迟
+        if Config.FORWARD_DELAY > 0:
+            await asyncio.sleep(Config.FORWARD_DELAY)
+    
     async def validate_forward_groups(self):
-        """验证群组转发配置"""
+        """验证群组转发配置（各群组并发解析）"""
         if not self.forward_enabled:
             return
-            
+        
         logger.info("🔍 验证群组转发配置...")
         
+        groups = [group_id.strip() for group_id in Config.MONITOR_GROUPS]
+        entities = await asyncio.gather(*(self.resolve_group(group_id) for group_id in groups))
+        
         valid_groups = []
-        for group_id in Config.MONITOR_GROUPS:
-            group_id = group_id.strip()
-            logger.info(f"🔍 验证群组: {group_id}")
-            
-            try:
-                entity = None
-                tested_formats = []
+        for group_id, entity in zip(groups, entities):
+            # 验证是否为群组/频道
+            if entity and isinstance(entity, (Chat, Channel)):
+                group_title = entity.title
+                actual_id = entity.id
                 
-                # 准备要尝试的ID格式列表
-                id_formats_to_try = []
+                valid_groups.append(actual_id)  # 使用实际的ID
+                self.remember_group(group_id, entity)
                 
-                if group_id.startswith('@'):
-                    # 用户名格式，直接尝试
-                    id_formats_to_try.append(('username', group_id))
-                else:
-                    # 数字ID，尝试多种格式
-                    base_id = group_id.strip('-')  # 移除可能的负号
-                    
-                    # 尝试所有可能的格式
-                    id_formats_to_try.extend([
-                        ('original', group_id),
-                        ('positive', base_id),
-                        ('negative', f'-{base_id}'),
-                        ('bot_api_super', f'-100{base_id}'),
-                    ])
-                    
-                    # 如果原始ID是Bot API格式，也尝试移除前缀
-                    if group_id.startswith('-100'):
-                        client_api_id = group_id[4:]
-                        id_formats_to_try.extend([
-                            ('client_api', client_api_id),
-                            ('client_api_neg', f'-{client_api_id}')
-                        ])
-                
-                # 逐一尝试每种格式
-                for format_name, test_id in id_formats_to_try:
-                    try:
-                        tested_formats.append(f"{format_name}({test_id})")
-                        
-                        if test_id.startswith('@'):
-                            entity = await self.client.get_entity(test_id)
-                            logger.info(f"✅ 通过{format_name}格式获取成功: @{entity.username}")
-                        else:
-                            entity = await self.client.get_entity(int(test_id))
-                            logger.info(f"✅ 通过{format_name}格式获取成功: {entity.title} (ID: {entity.id})")
-                        
-                        break  # 成功获取，跳出循环
-                        
-                    except Exception as e:
-                        logger.debug(f"{format_name}格式({test_id})失败: {e}")
-                        continue
-                
-                # 验证是否为群组/频道
-                if entity and isinstance(entity, (Chat, Channel)):
-                    group_title = entity.title
-                    actual_id = entity.id
-                    
-                    valid_groups.append(actual_id)  # 使用实际的ID
-                    self.group_cache[str(actual_id)] = group_title
-                    
-                    logger.info(f"✅ 群组验证成功: {group_title} (实际ID: {actual_id})")
-                    
-                    # 如果配置的ID与实际ID不同，给出提示
-                    if str(actual_id) != group_id:
-                        logger.info(f"💡 建议配置使用实际ID: {actual_id} 而不是 {group_id}")
-                        
-                elif entity:
-                    logger.warning(f"⚠️ {group_id} 不是群组/频道类型，跳过")
-                else:
-                    logger.error(f"❌ 无法获取群组实体: {group_id}")
-                    logger.info(f"� 已尝试的格式: {', '.join(tested_formats)}")
-                    logger.info(f"�💡 可能的原因: 1)未加入此群组 2)群组ID错误 3)群组已删除")
-                    
-            except Exception as e:
-                logger.error(f"❌ 验证群组 {group_id} 时出错: {e}")
+                logger.info(f"✅ 群组验证成功: {group_title} (实际ID: {actual_id})")
+                
+                # 如果配置的ID与实际ID不同，给出提示
+                if str(actual_id) != group_id:
+                    logger.info(f"💡 建议配置使用实际ID: {actual_id} 而不是 {group_id}")
+            
+            elif entity:
+                logger.warning(f"⚠️ {group_id} 不是群组/频道类型，跳过")
         
         if valid_groups:
             # 更新配置为实际有效的ID
             Config.MONITOR_GROUPS = [str(gid) for gid in valid_groups]
+            self.rebuild_monitor_index()
             logger.info(f"📊 共验证了 {len(valid_groups)} 个有效群组")
             logger.info(f"📋 有效群组ID: {Config.MONITOR_GROUPS}")
         else:
@@ -674,6 +1147,101 @@ class TelegramMessageReceiver:
             logger.info("   3. 尝试使用群组用户名（@username）代替ID")
             self.forward_enabled = False
     
+    def remember_group(self, group_id: str, entity):
+        """记录已验证群组的实际ID、标题、@用户名和所在DC"""
+        actual_id = str(entity.id)
+        self.resolved_groups[group_id] = actual_id
+        self.group_cache[actual_id] = entity.title
+        if getattr(entity, 'username', None):
+            self.group_usernames[actual_id] = f"@{entity.username.lower()}"
+        if getattr(entity.photo, 'dc_id', None):
+            self.group_dcs[actual_id] = entity.photo.dc_id
+    
+    async def reload_monitor_groups(self):
+        """热加载 MONITOR_GROUPS：已验证的群组沿用实际ID，只解析新增的群组，完成后整体替换"""
+        raw_groups = [group_id.strip() for group_id in Config.MONITOR_GROUPS_RAW]
+        added = [group_id for group_id in raw_groups if group_id not in self.resolved_groups]
+        entities = await asyncio.gather(*(self.resolve_group(group_id) for group_id in added))
+        
+        new_dcs = []
+        for group_id, entity in zip(added, entities):
+            if entity and isinstance(entity, (Chat, Channel)):
+                self.remember_group(group_id, entity)
+                new_dcs.append(self.group_dcs.get(str(entity.id)))
+                logger.info(f"✅ 新增监听群组: {entity.title} (实际ID: {entity.id})")
+            else:
+                logger.warning(f"⚠️ 新增的群组 {group_id} 无法访问，跳过")
+        
+        groups = [self.resolved_groups[group_id] for group_id in raw_groups if group_id in self.resolved_groups]
+        Config.MONITOR_GROUPS = list(dict.fromkeys(groups))
+        self.rebuild_monitor_index()
+        logger.info(f"📋 监听群组已更新: {Config.MONITOR_GROUPS}")
+        
+        if self.dc_pool and any(new_dcs):
+            await self.dc_pool.warm_up(dc_id for dc_id in new_dcs if dc_id)
+    
+    async def resolve_group(self, group_id: str):
+        """按多种ID格式依次尝试获取群组实体，无法获取时返回None"""
+        logger.info(f"🔍 验证群组: {group_id}")
+        
+        try:
+            entity = None
+            tested_formats = []
+            
+            # 准备要尝试的ID格式列表
+            id_formats_to_try = []
+            
+            if group_id.startswith('@'):
+                # 用户名格式，直接尝试
+                id_formats_to_try.append(('username', group_id))
+            else:
+                # 数字ID，尝试多种格式
+                base_id = group_id.strip('-')  # 移除可能的负号
+                
+                # 尝试所有可能的格式
+                id_formats_to_try.extend([
+                    ('original', group_id),
+                    ('positive', base_id),
+                    ('negative', f'-{base_id}'),
+                    ('bot_api_super', f'-100{base_id}'),
+                ])
+                
+                # 如果原始ID是Bot API格式，也尝试移除前缀
+                if group_id.startswith('-100'):
+                    client_api_id = group_id[4:]
+                    id_formats_to_try.extend([
+                        ('client_api', client_api_id),
+                        ('client_api_neg', f'-{client_api_id}')
+                    ])
+            
+            # 逐一尝试每种格式
+            for format_name, test_id in id_formats_to_try:
+                try:
+                    tested_formats.append(f"{format_name}({test_id})")
+                    
+                    if test_id.startswith('@'):
+                        entity = await self.client.get_entity(test_id)
+                        logger.info(f"✅ 通过{format_name}格式获取成功: @{entity.username}")
+                    else:
+                        entity = await self.client.get_entity(int(test_id))
+                        logger.info(f"✅ 通过{format_name}格式获取成功: {entity.title} (ID: {entity.id})")
+                    
+                    break  # 成功获取，跳出循环
+                
+                except Exception as e:
+                    logger.debug(f"{format_name}格式({test_id})失败: {e}")
+                    continue
+            
+            if not entity:
+                logger.error(f"❌ 无法获取群组实体: {group_id}")
+                logger.info(f"� 已尝试的格式: {', '.join(tested_formats)}")
+                logger.info(f"�💡 可能的原因: 1)未加入此群组 2)群组ID错误 3)群组已删除")
+            return entity
+        
+        except Exception as e:
+            logger.error(f"❌ 验证群组 {group_id} 时出错: {e}")
+            return None
+    
     async def start_forward_cleanup_task(self):
         """启动转发功能的定期清理任务"""
         if not self.forward_enabled:
@@ -695,15 +1263,93 @@ class TelegramMessageReceiver:
                         del self.message_cache[key]
                     
                     # 输出统计信息
-                    logger.info(f"📊 转发统计: 接收 {self.forward_stats['messages_received']}, "
-                              f"转发 {self.forward_stats['messages_forwarded']}, "
-                              f"过滤 {self.forward_stats['messages_filtered']}, "
-                              f"错误 {self.forward_stats['errors']}")
+                    for line in self.format_stats_report():
+                        logger.info(line)
                     
                 except Exception as e:
                     logger.error(f"❌ 定期清理出错: {e}")
         
         asyncio.create_task(cleanup_task())
+    
+    async def start_dc_pool(self):
+        """启用媒体DC连接池，并在后台预热监听群组所在的DC"""
+        if not Config.ENABLE_DC_POOL or not self.forward_enabled:
+            return
+        if not MediaSenderPool.supported(self.client):
+            logger.info("ℹ️ 当前客户端不支持导出连接，跳过媒体DC连接池")
+            return
+        
+        self.dc_pool = MediaSenderPool(self.client, size=Config.DC_POOL_SIZE, keepalive=Config.DC_POOL_KEEPALIVE)
+        self.dc_pool.install()
+        asyncio.create_task(self.dc_pool.warm_up(self.group_dcs.values()))
+    
+    def format_stats_report(self) -> List[str]:
+        """汇总各模块的统计信息，用于定期日志和回放报告"""
+        lines = [f"📊 转发统计: 接收 {self.forward_stats['messages_received']}, "
+                 f"转发 {self.forward_stats['messages_forwarded']}, "
+                 f"过滤 {self.forward_stats['messages_filtered']}, "
+                 f"错误 {self.forward_stats['errors']}"]
+        
+        if self.scheduler:
+            lines.append(self.scheduler.format_stats())
+        
+        if self.mode_selector:
+            lines.append(self.mode_selector.format_stats())
+        
+        if self.resend_pipeline:
+            lines.append(self.resend_pipeline.format_stats())
+        
+        if self.load_shedder:
+            lines.append(self.load_shedder.format_stats())
+        
+        if self.digest.collected:
+            lines.append(self.digest.format_stats())
+        
+        if self.archive:
+            lines.append(self.archive.format_stats())
+        
+        for sink in self.output_sinks:
+            lines.append(sink.format_stats())
+        
+        if self.analytics:
+            lines.append(self.analytics.format_stats())
+        
+        if self.dc_pool:
+            lines.append(self.dc_pool.format_stats())
+        
+        if self.diagnostics:
+            lines.append(self.diagnostics.format_report())
+        
+        for session in self.buffered_sessions():
+            lines.append(session.format_stats())
+        
+        return lines
+    
+    def buffered_sessions(self) -> List[BufferedSQLiteSession]:
+        """返回使用批量写入后端的会话"""
+        clients = [self.client]
+        if hasattr(self, 'bot_client'):
+            clients.append(self.bot_client)
+        return [c.session for c in clients
+                if isinstance(getattr(c, 'session', None), BufferedSQLiteSession)]
+    
+    async def start_session_flush_task(self):
+        """按 SESSION_FLUSH_INTERVAL 定期将缓冲的会话数据写盘"""
+        sessions = self.buffered_sessions()
+        if not sessions:
+            return
+        
+        async def flush_task():
+            while True:
+                try:
+                    await asyncio.sleep(Config.SESSION_FLUSH_INTERVAL)
+                    for session in sessions:
+                        session.save()
+                except Exception as e:
+                    logger.error(f"❌ 会话刷盘出错: {e}")
+        
+        asyncio.create_task(flush_task())
+    
     async def handle_edited_message(self, event):
         """处理编辑的消息"""
         try:
@@ -778,42 +1424,55 @@ class TelegramMessageReceiver:
                 raise RuntimeError("需要两步验证密码但无法在非交互式环境中获取")
     
     async def start(self):
-        """启动客户端"""
+        """启动客户端
+        
+        启动阶段按依赖关系并发执行：用户客户端与机器人客户端同时登录，群组并发解析；
+        转发就绪之前收到的监听群组消息先进入缓冲区，就绪后按接收顺序处理
+        """
         try:
             print("正在连接到Telegram...")
+            self.startup_started = time.perf_counter()
             
-            # 自定义启动流程，支持环境变量验证码
-            await self._custom_start()
+            if self.diagnostics:
+                self.diagnostics.install(asyncio.get_running_loop())
+            
+            if self.analytics:
+                self.analytics.install(asyncio.get_running_loop())
             
-            # 获取当前用户信息
-            me = await self.client.get_me()
-            print(f"成功登录! 用户: {me.first_name} {me.last_name or ''}")
-            print(f"用户名: @{me.username or 'None'}")
-            print(f"电话: {me.phone}")
+            # 配置热加载（SIGHUP / .env 文件监视）
+            self.config_reloader = ConfigReloader(self.apply_config_changes, self.validate_config)
+            self.config_reloader.install(asyncio.get_running_loop())
             
-            # 如果启用了转发功能，启动机器人客户端
+            # 用户客户端连接后即开始接收消息，转发就绪前先缓冲
             if self.forward_enabled:
-                print("\n🤖 启动群组转发功能...")
-                try:
-                    await self.bot_client.start(bot_token=Config.BOT_TOKEN)
-                    bot_me = await self.bot_client.get_me()
-                    print(f"✅ 机器人登录成功: {bot_me.first_name} (@{bot_me.username})")
-                    
-                    # 初始化机器人实体
-                    await self.ensure_bot_entity()
-                    
-                    # 验证群组配置
-                    await self.validate_forward_groups()
-                    
-                    if self.forward_enabled:
-                        print(f"📡 开始监听 {len(Config.MONITOR_GROUPS)} 个群组的消息转发...")
-                        # 启动定期清理任务
-                        await self.start_forward_cleanup_task()
-                    
-                except Exception as e:
-                    logger.error(f"❌ 机器人启动失败: {e}")
-                    self.forward_enabled = False
-                    print("⚠️ 转发功能已禁用，仅运行消息接收功能")
+                self.startup_buffer = deque()
+            
+            graph = StartupGraph()
+            # 自定义启动流程，支持环境变量验证码
+            graph.add('user_login', '用户登录', self._custom_start)
+            # 缓冲会话的定期刷盘
+            graph.add('session_flush', '会话刷盘任务', self.start_session_flush_task, deps=('user_login',))
+            graph.add('user_info', '用户信息', self.show_user_info, deps=('user_login',))
+            if self.forward_enabled:
+                # 如果启用了转发功能，同时启动机器人客户端
+                graph.add('bot_login', '机器人登录', self.start_bot_client)
+                graph.add('bot_entity', '机器人实体', self.ensure_bot_entity, deps=('user_login', 'bot_login'))
+                graph.add('groups', '群组解析', self.validate_forward_groups, deps=('user_login',))
+                graph.add('forward_ready', '转发就绪', self.finish_forward_startup, deps=('bot_entity', 'groups'))
+                # 缓冲消息的处理单独计时，不计入转发就绪的耗时
+                graph.add('startup_backlog', '处理缓冲消息', self.drain_startup_buffer, deps=('forward_ready',))
+            await graph.run()
+            logger.info(graph.format_report())
+            
+            if graph.failed('user_login'):
+                raise graph.first_error(['user_login']) or RuntimeError("用户登录失败")
+            
+            if self.forward_enabled and graph.failed('forward_ready'):
+                error = graph.first_error(['bot_login', 'bot_entity', 'groups', 'forward_ready'])
+                logger.error(f"❌ 机器人启动失败: {error}")
+                self.forward_enabled = False
+                self.startup_buffer = None
+                print("⚠️ 转发功能已禁用，仅运行消息接收功能")
             
             print(f"\n开始监听消息... (按 Ctrl+C 退出)")
             if self.forward_enabled:
@@ -821,13 +1480,66 @@ class TelegramMessageReceiver:
             
             # 保持客户端运行
             await self.client.run_until_disconnected()
-            
+        
         except Exception as e:
             logger.error(f"启动客户端时出错: {e}")
             raise
     
+    async def show_user_info(self):
+        """获取并显示当前用户信息"""
+        me = await self.client.get_me()
+        print(f"成功登录! 用户: {me.first_name} {me.last_name or ''}")
+        print(f"用户名: @{me.username or 'None'}")
+        print(f"电话: {me.phone}")
+    
+    async def start_bot_client(self):
+        """登录机器人客户端"""
+        print("\n🤖 启动群组转发功能...")
+        await self.bot_client.start(bot_token=Config.BOT_TOKEN)
+        bot_me = await self.bot_client.get_me()
+        print(f"✅ 机器人登录成功: {bot_me.first_name} (@{bot_me.username})")
+    
+    async def finish_forward_startup(self):
+        """机器人和群组都已就绪：启动转发相关任务（启动期间缓冲的消息随后由 drain_startup_buffer 处理）"""
+        if not self.forward_enabled:
+            # 没有可访问的群组
+            self.startup_buffer = None
+            return
+        
+        # 媒体DC连接池
+        await self.start_dc_pool()
+        
+        print(f"📡 开始监听 {len(Config.MONITOR_GROUPS)} 个群组的消息转发...")
+        # 启动定期清理任务
+        await self.start_forward_cleanup_task()
+    
     async def stop(self):
         """停止客户端"""
+        if self.recorder:
+            self.recorder.close()
+        
+        if self.diagnostics:
+            self.diagnostics.stop_profile()
+        
+        if self.forward_enabled:
+            # 先转发调度队列和流水线中已接受的消息（有超时，超时后丢弃并记录条数）
+            if self.scheduler:
+                await self.scheduler.stop()
+            if self.resend_pipeline:
+                await self.resend_pipeline.stop()
+            # 发送已收集但未到时间的摘要
+            await self.digest.flush_all()
+        
+        # 转发结束后再关闭归档，最后一批消息的转发状态也能写入
+        if self.archive:
+            self.archive.close()
+        
+        for sink in self.output_sinks:
+            await sink.close()
+        
+        if self.dc_pool:
+            await self.dc_pool.close()
+        
         if self.client.is_connected():
             await self.client.disconnect()
             print("客户端已断开连接")
@@ -851,5 +1563,7 @@ async def main():
             await receiver.stop()
 
 if __name__ == "__main__":
-    # 运行客户端
+    # 选择事件循环实现后运行客户端
+    loop_name = install_event_loop(Config.EVENT_LOOP)
+    logger.info(f"🔁 事件循环: {loop_name}")
     asyncio.run(main())
@@ -0,0 +1,128 @@
+"""流量分析的概率结构（HyperLogLog / Count-Min Sketch / TopK）和群组统计的测试"""
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from analytics import CountMinSketch, HyperLogLog, RateMeter, TopK, TrafficAnalytics, extract_keywords
+
+
+def make_record(chat_id=-100, sender_id=1, text='', media_kind=None):
+    return SimpleNamespace(chat_id=chat_id, chat_title=f'Group {chat_id}', sender_id=sender_id,
+                           sender_name=f'User{sender_id}', text=text, media_kind=media_kind)
+
+
+@pytest.mark.parametrize('n', [0, 1, 50, 1000, 50000])
+def test_hyperloglog_estimate(n):
+    hll = HyperLogLog()
+    for i in range(n):
+        hll.add(i)
+        hll.add(i)  # 重复元素不影响计数
+    assert hll.count() == pytest.approx(n, rel=0.05, abs=2)
+
+
+def test_hyperloglog_string_keys():
+    hll = HyperLogLog()
+    for i in range(2000):
+        hll.add(f'user-{i}')
+    assert hll.count() == pytest.approx(2000, rel=0.05)
+
+
+def test_hyperloglog_merge_is_union():
+    a, b = HyperLogLog(), HyperLogLog()
+    for i in range(3000):
+        a.add(i)
+    for i in range(2000, 5000):
+        b.add(i)
+    a.merge(b)
+    assert a.count() == pytest.approx(5000, rel=0.05)
+
+
+def test_count_min_never_underestimates():
+    sketch = CountMinSketch(width=64, depth=4)
+    rng = random.Random(1)
+    counts = {}
+    for _ in range(5000):
+        key = f'k{rng.randrange(500)}'
+        counts[key] = counts.get(key, 0) + 1
+        sketch.add(key)
+    assert all(sketch.estimate(key) >= count for key, count in counts.items())
+    # 误差上限约为 总数 × e / 宽度
+    assert sketch.estimate('missing') <= 5000 * 2.72 / 64
+
+
+def test_count_min_exact_without_collisions():
+    sketch = CountMinSketch()
+    for i in range(10):
+        for _ in range(i + 1):
+            sketch.add(i)
+    assert [sketch.estimate(i) for i in range(10)] == list(range(1, 11))
+
+
+def test_topk_finds_heavy_hitters():
+    rng = random.Random(2)
+    top = TopK(5)
+    stream = [f'heavy{i}' for i in range(5) for _ in range(200 - i * 20)]
+    stream += [f'tail{rng.randrange(5000)}' for _ in range(5000)]
+    rng.shuffle(stream)
+    for key in stream:
+        top.add(key, label=key.upper())
+
+    ranked = top.top()
+    assert [key for key, _, _ in ranked] == [f'heavy{i}' for i in range(5)]
+    assert ranked[0][1] == 'HEAVY0'
+    assert ranked[0][2] >= 200
+
+
+def test_topk_evicts_labels_with_items():
+    top = TopK(2)
+    for key in ['a', 'a', 'b', 'b', 'c', 'c', 'c']:
+        top.add(key, label=key)
+    assert len(top.items) == 2
+    assert set(top.labels) == set(top.items)
+    assert top.top(1)[0][0] == 'c'
+
+
+def test_rate_meter_decays():
+    meter = RateMeter(window=60)
+    for second in range(600):
+        meter.add(float(second))
+    # 每秒一条，稳定后速率接近 1 条/秒
+    assert meter.current(599.0) == pytest.approx(1.0, rel=0.01)
+    assert meter.current(599.0 + 60) == pytest.approx(meter.current(599.0) / 2.718281828, rel=0.01)
+    assert RateMeter(60).current(100.0) == 0.0
+
+
+def test_extract_keywords():
+    words = extract_keywords('The Bitcoin price and the #ETH update 2025 价格上涨了')
+    assert 'bitcoin' in words and 'price' in words and '#eth' in words
+    assert 'the' not in words and 'and' not in words and '2025' not in words
+    assert '价格' in words and '上涨' in words
+    # 含停用字的二元组被跳过
+    assert '涨了' not in words
+    assert len(extract_keywords(' '.join(f'word{i}' for i in range(100)), limit=5)) == 5
+
+
+def test_traffic_snapshot_and_dump(tmp_path):
+    analytics = TrafficAnalytics(top_k=3, rate_window=60, dump_file=str(tmp_path / 'analytics.json'))
+    for i in range(30):
+        analytics.observe(make_record(-100, sender_id=i % 3, text='market update today'))
+    for i in range(10):
+        analytics.observe(make_record(-200, sender_id=i + 100, media_kind='photo'))
+
+    snapshot = analytics.snapshot()
+    assert snapshot['messages'] == 40
+    assert snapshot['unique_senders'] == 13
+    busiest = snapshot['groups'][0]
+    assert busiest['chat_id'] == -100
+    assert busiest['unique_senders'] == 3
+    assert busiest['media_mix'] == {'text': 30}
+    assert {s['messages'] for s in busiest['top_senders']} == {10}
+    assert {k['keyword'] for k in busiest['keywords']} == {'market', 'update', 'today'}
+    assert snapshot['groups'][1]['media_mix'] == {'photo': 10}
+
+    path = analytics.dump()
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)['messages'] == 40
+    assert 'Group -100' in analytics.format_stats()
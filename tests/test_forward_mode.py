@@ -0,0 +1,114 @@
+"""AdaptiveModeSelector 方式选择和重发熔断器的测试"""
+import pytest
+
+import forward_mode
+from forward_mode import AdaptiveModeSelector, DIRECT, REFERENCE, RESEND
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(forward_mode.time, 'monotonic', clock)
+    return clock
+
+
+def choose_photo(selector):
+    return selector.choose(200 * 1024, can_reference=True, can_resend=True)
+
+
+def test_prefers_reference_for_files(clock):
+    selector = AdaptiveModeSelector()
+    # 引用重发一次调用，前缀 + 转发需要两次
+    assert choose_photo(selector) == REFERENCE
+
+
+def test_large_file_not_resent(clock):
+    selector = AdaptiveModeSelector()
+    assert selector.choose(50 * 1024 * 1024, can_reference=False, can_resend=True) == DIRECT
+
+
+def test_failures_steer_away_from_mode(clock):
+    selector = AdaptiveModeSelector(failure_threshold=100)
+    for _ in range(10):
+        selector.record_result(REFERENCE, False)
+    assert selector.choose(0, can_reference=True, can_resend=False) == DIRECT
+
+
+def test_breaker_trips_after_consecutive_failures(clock):
+    selector = AdaptiveModeSelector(failure_threshold=3, cooldown=300)
+    for _ in range(2):
+        selector.record_result(RESEND, False)
+    assert not selector.breaker_open
+
+    selector.record_result(RESEND, False)
+    assert selector.breaker_open
+    assert selector.breaker_trips == 1
+    # 熔断期间即使重发更快也只用直接转发
+    selector.failure_rate[REFERENCE].value = 0.0
+    assert choose_photo(selector) == DIRECT
+
+
+def test_success_resets_failure_count(clock):
+    selector = AdaptiveModeSelector(failure_threshold=3)
+    selector.record_result(RESEND, False)
+    selector.record_result(RESEND, False)
+    selector.record_result(REFERENCE, True)
+    selector.record_result(RESEND, False)
+    assert not selector.breaker_open
+    assert selector.consecutive_failures == 1
+
+
+def test_direct_failures_do_not_trip_breaker(clock):
+    selector = AdaptiveModeSelector(failure_threshold=2)
+    for _ in range(5):
+        selector.record_result(DIRECT, False)
+    assert not selector.breaker_open
+    assert selector.consecutive_failures == 0
+
+
+def test_half_open_failure_restarts_cooldown(clock):
+    selector = AdaptiveModeSelector(failure_threshold=2, cooldown=300)
+    selector.record_result(REFERENCE, False)
+    selector.record_result(REFERENCE, False)
+
+    clock.now += 301
+    assert not selector.breaker_open
+    selector.failure_rate[REFERENCE].value = 0.0
+    assert choose_photo(selector) == REFERENCE
+
+    # 试探仍然失败：重新计时，不计为新的一次熔断
+    selector.record_result(REFERENCE, False)
+    assert selector.breaker_open
+    assert selector.breaker_open_until == clock.now + 300
+    assert selector.breaker_trips == 1
+
+
+def test_half_open_success_closes_breaker(clock):
+    selector = AdaptiveModeSelector(failure_threshold=2, cooldown=300)
+    selector.record_result(RESEND, False)
+    selector.record_result(RESEND, False)
+
+    clock.now += 301
+    selector.record_result(RESEND, True)
+    assert not selector.breaker_open
+    assert selector.consecutive_failures == 0
+
+    # 关闭后需要重新累计到阈值才会再次熔断
+    selector.record_result(RESEND, False)
+    assert not selector.breaker_open
+
+
+def test_flood_pressure_decays(clock):
+    selector = AdaptiveModeSelector(flood_decay=60)
+    selector.record_flood_wait(40)
+    clock.now += 60
+    selector._decay_flood()
+    assert selector.flood_pressure == pytest.approx(20)
@@ -0,0 +1,108 @@
+"""MessageRenderer 前缀渲染和长消息拆分的测试"""
+from datetime import datetime, timezone
+
+import pytest
+from telethon.helpers import add_surrogate
+from telethon.tl.types import MessageEntityBold, MessageEntityTextUrl
+
+from renderer import MessageRenderer, MAX_ENTITIES
+
+DATE = datetime(2025, 10, 1, 12, 30, 45, tzinfo=timezone.utc)
+
+
+def utf16_len(text):
+    return len(add_surrogate(text))
+
+
+def joined(chunks):
+    return ''.join(text for text, _ in chunks)
+
+
+def entity_text(text, entity):
+    return add_surrogate(text)[entity.offset:entity.offset + entity.length]
+
+
+def test_render_prefix_fields():
+    renderer = MessageRenderer('[{chat_title}] {sender_name} #{message_id} {message_time}', True, '%H:%M:%S')
+    assert renderer.render_prefix(-100, 'Group', 'Alice', DATE, 42) == '[Group] Alice #42 12:30:45'
+    # 缓存的片段按群组/发送者区分
+    assert renderer.render_prefix(-100, 'Group', 'Bob', DATE, 43) == '[Group] Bob #43 12:30:45'
+
+
+def test_render_prefix_without_time():
+    renderer = MessageRenderer('{chat_title}{message_time}', False, '%H:%M')
+    assert renderer.render_prefix(-100, 'Group', 'Alice', DATE, 1) == 'Group'
+
+
+@pytest.mark.parametrize('template', ['{unknown}', '{chat_title:>d}', '{chat_title', '{message_id!x}'])
+def test_invalid_template_rejected(template):
+    with pytest.raises(ValueError):
+        MessageRenderer(template, True, '%H:%M')
+
+
+def test_compose_shifts_entities():
+    text, entities = MessageRenderer.compose('😀 P', 'bold', [MessageEntityBold(0, 4)])
+    assert text == '😀 P\nbold'
+    # emoji 在 UTF-16 中占两个单位
+    assert entity_text(text, entities[0]) == add_surrogate('bold')
+
+
+def test_short_text_not_split():
+    assert MessageRenderer.split('hello', None, 10) == [('hello', [])]
+
+
+def test_split_prefers_newline():
+    text = 'a' * 6 + '\n' + 'b b b b'
+    chunks = MessageRenderer.split(text, None, 10)
+    assert [t for t, _ in chunks] == ['a' * 6 + '\n', 'b b b b']
+
+
+def test_split_respects_limit_and_keeps_text():
+    text = ' '.join(f'word{i}' for i in range(200))
+    chunks = MessageRenderer.split(text, None, 50)
+    assert joined(chunks) == text
+    assert all(utf16_len(t) <= 50 for t, _ in chunks)
+
+
+def test_split_does_not_break_surrogate_pairs():
+    text = '😀' * 30
+    chunks = MessageRenderer.split(text, None, 11)
+    assert joined(chunks) == text
+    assert all(utf16_len(t) <= 11 for t, _ in chunks)
+    assert all(set(t) == {'😀'} for t, _ in chunks)
+
+
+def test_split_avoids_cutting_inside_entity():
+    text = 'intro text ' + 'see link here' + ' tail'
+    link = MessageEntityTextUrl(11, 13, 'https://example.com')
+    chunks = MessageRenderer.split(text, [link], 20)
+    assert joined(chunks) == text
+    for chunk_text, chunk_entities in chunks:
+        for entity in chunk_entities:
+            assert entity_text(chunk_text, entity) == add_surrogate('see link here')
+
+
+def test_split_entity_spanning_cut_is_divided():
+    text = 'x' * 30
+    chunks = MessageRenderer.split(text, [MessageEntityBold(5, 20)], 10)
+    assert joined(chunks) == text
+    spans = [(e.offset, e.length) for _, entities in chunks for e in entities]
+    assert spans == [(5, 5), (0, 10), (0, 5)]
+    assert all(isinstance(e, MessageEntityBold) for _, entities in chunks for e in entities)
+
+
+def test_split_first_limit():
+    text = ' '.join('word' for _ in range(40))
+    chunks = MessageRenderer.split(text, None, 100, first_limit=20)
+    assert utf16_len(chunks[0][0]) <= 20
+    assert all(utf16_len(t) <= 100 for t, _ in chunks[1:])
+    assert joined(chunks) == text
+
+
+def test_split_limits_entity_count():
+    text = 'ab' * (MAX_ENTITIES + 20)
+    entities = [MessageEntityBold(i * 2, 1) for i in range(MAX_ENTITIES + 20)]
+    chunks = MessageRenderer.split(text, entities, 10000)
+    assert len(chunks) == 2
+    assert all(len(e) <= MAX_ENTITIES for _, e in chunks)
+    assert joined(chunks) == text
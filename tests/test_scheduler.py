@@ -0,0 +1,117 @@
+"""FairScheduler 调度顺序、队列上限和停止时排空的测试"""
+import asyncio
+
+from scheduler import FairScheduler
+
+
+def run_scheduler(submissions, weights=None, priorities=None, **options):
+    """提交全部任务后（工作协程尚未运行）再开始处理，返回处理顺序"""
+    async def main():
+        served = []
+
+        async def handler(item):
+            served.append(item)
+
+        scheduler = FairScheduler(handler, **options)
+        scheduler.configure(weights or {}, priorities or {})
+        for key, item in submissions:
+            scheduler.submit(key, item)
+        await scheduler.stop()
+        return served
+
+    return asyncio.run(main())
+
+
+def test_round_robin_between_groups():
+    submissions = [('a', f'a{i}') for i in range(3)] + [('b', f'b{i}') for i in range(3)]
+    served = run_scheduler(submissions)
+    assert served == ['a0', 'b0', 'a1', 'b1', 'a2', 'b2']
+
+
+def test_flooding_group_does_not_starve_others():
+    submissions = [('flood', f'f{i}') for i in range(50)] + [('quiet', 'q0')]
+    served = run_scheduler(submissions)
+    assert served.index('q0') == 1
+
+
+def test_weights_share_turns():
+    submissions = [('a', f'a{i}') for i in range(6)] + [('b', f'b{i}') for i in range(6)]
+    served = run_scheduler(submissions, weights={'a': 2, 'b': 1})
+    # a 的权重是 b 的两倍：每轮 a 发两条、b 发一条，a 清空后只剩 b
+    assert served == ['a0', 'a1', 'b0', 'a2', 'a3', 'b1', 'a4', 'a5', 'b2', 'b3', 'b4', 'b5']
+
+
+def test_higher_priority_first():
+    submissions = [('low', f'l{i}') for i in range(3)] + [('high', f'h{i}') for i in range(3)]
+    served = run_scheduler(submissions, priorities={'high': 1})
+    assert served == ['h0', 'h1', 'h2', 'l0', 'l1', 'l2']
+
+
+def test_full_queue_drops_oldest():
+    async def main():
+        served = []
+
+        async def handler(item):
+            served.append(item)
+
+        scheduler = FairScheduler(handler, max_queue_size=2)
+        dropped = [scheduler.submit('a', i) for i in range(5)]
+        await scheduler.stop()
+        return served, dropped, scheduler.stats()[0]
+
+    served, dropped, stats = asyncio.run(main())
+    # 队列中只保留最新的两条
+    assert served == [3, 4]
+    assert dropped == [False, False, True, True, True]
+    assert stats['dropped'] == 3
+
+
+def test_stop_drains_pending_work():
+    async def main():
+        served = []
+
+        async def handler(item):
+            await asyncio.sleep(0.001)
+            served.append(item)
+
+        scheduler = FairScheduler(handler)
+        for i in range(10):
+            scheduler.submit(str(i % 3), i)
+        await scheduler.stop()
+        return served, scheduler.depth()
+
+    served, depth = asyncio.run(main())
+    assert sorted(served) == list(range(10))
+    assert depth == 0
+
+
+def test_stop_timeout_gives_up():
+    async def main():
+        async def handler(item):
+            await asyncio.sleep(10)
+
+        scheduler = FairScheduler(handler)
+        scheduler.submit('a', 1)
+        scheduler.submit('a', 2)
+        await scheduler.stop(timeout=0.05)
+        return scheduler._worker
+
+    assert asyncio.run(main()) is None
+
+
+def test_handler_error_does_not_stop_worker():
+    async def main():
+        served = []
+
+        async def handler(item):
+            if item == 1:
+                raise RuntimeError('boom')
+            served.append(item)
+
+        scheduler = FairScheduler(handler)
+        for i in range(3):
+            scheduler.submit('a', i)
+        await scheduler.stop()
+        return served
+
+    assert asyncio.run(main()) == [0, 2]
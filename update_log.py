@@ -0,0 +1,153 @@
+"""
+更新录制模块 - 将监听群组收到的消息序列化为紧凑的磁盘日志，供 replay.py 回放压测
+"""
+import gzip
+import hashlib
+import json
+import logging
+import time
+from typing import Dict, Iterator, Optional
+
+from telethon.tl.types import User
+
+logger = logging.getLogger(__name__)
+
+# 录制缓冲区刷新间隔(秒)
+FLUSH_INTERVAL = 1.0
+
+
+def media_kind(message) -> Optional[str]:
+    """返回消息的媒体类型名称，无媒体时返回None"""
+    if not message.media:
+        return None
+    if message.photo:
+        return 'photo'
+    if message.sticker:
+        return 'sticker'
+    if message.voice:
+        return 'voice'
+    if message.video:
+        return 'video'
+    if message.audio:
+        return 'audio'
+    if message.document:
+        return 'document'
+    if message.geo:
+        return 'geo'
+    if message.contact:
+        return 'contact'
+    if message.poll:
+        return 'poll'
+    return 'other'
+
+
+def anonymize_text(text: str) -> str:
+    """匿名化文本：保留长度和空白结构，其他字符替换为占位符"""
+    return ''.join(ch if ch.isspace() else 'x' for ch in text)
+
+
+def anonymize_name(value: str, prefix: str = 'User') -> str:
+    """匿名化名称：同一名称始终映射为同一个短哈希，便于回放时保持发送者分布"""
+    if not value:
+        return value
+    return f"{prefix}_{hashlib.md5(value.encode()).hexdigest()[:8]}"
+
+
+class UpdateRecorder:
+    """将收到的消息以 gzip 压缩的 JSON Lines 格式追加写入日志文件"""
+
+    def __init__(self, path: str, anonymize: bool = False):
+        self.path = path
+        self.anonymize = anonymize
+        self.records_written = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._last_flush = time.monotonic()
+        logger.info(f"🎬 更新录制已启用: {path} (匿名化: {'是' if anonymize else '否'})")
+
+    async def record(self, event):
+        """录制一条新消息事件"""
+        try:
+            chat = await event.get_chat()
+            sender = await event.get_sender()
+            entry = self.build_record(event, chat, sender)
+            self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')))
+            self._file.write('\n')
+            self.records_written += 1
+
+            now = time.monotonic()
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+        except Exception as e:
+            logger.error(f"❌ 录制消息失败: {e}")
+
+    def build_record(self, event, chat, sender) -> Dict:
+        """提取回放所需的最小字段，键名使用短名称以压缩体积"""
+        message = event.message
+        text = message.message or ''
+
+        entry = {
+            't': event.date.timestamp(),
+            'c': event.chat_id,
+            'ct': getattr(chat, 'title', None),
+            'cu': getattr(chat, 'username', None),
+            'i': message.id,
+        }
+        if text:
+            entry['m'] = anonymize_text(text) if self.anonymize else text
+
+        if sender is not None:
+            entry['s'] = sender.id
+            if isinstance(sender, User):
+                first_name = sender.first_name or ''
+                last_name = sender.last_name or ''
+                username = sender.username or ''
+                if self.anonymize:
+                    first_name = anonymize_name(f"{first_name} {last_name}".strip() or str(sender.id))
+                    last_name = ''
+                    username = anonymize_name(username, 'u') if username else ''
+                if first_name:
+                    entry['sf'] = first_name
+                if last_name:
+                    entry['sl'] = last_name
+                if username:
+                    entry['su'] = username
+                if sender.bot:
+                    entry['sb'] = 1
+            elif getattr(sender, 'title', None):
+                entry['st'] = anonymize_name(sender.title, 'Channel') if self.anonymize else sender.title
+
+        kind = media_kind(message)
+        if kind:
+            entry['md'] = kind
+            file = message.file
+            if file is not None:
+                if file.size:
+                    entry['sz'] = file.size
+                if file.name:
+                    entry['fn'] = anonymize_name(file.name, 'file') if self.anonymize else file.name
+
+        if message.fwd_from:
+            entry['f'] = 1
+        if message.grouped_id:
+            entry['g'] = message.grouped_id
+        return entry
+
+    def close(self):
+        """刷新并关闭日志文件"""
+        if self._file and not self._file.closed:
+            self._file.close()
+            logger.info(f"🎬 更新录制已保存: {self.records_written} 条 -> {self.path}")
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    """按顺序读取录制日志中的记录"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        except (EOFError, json.JSONDecodeError) as e:
+            # 进程异常退出时最后一段可能不完整，保留已读取的部分
+            logger.warning(f"⚠️ 录制日志末尾不完整，已忽略: {e}")